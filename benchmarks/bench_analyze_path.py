@@ -0,0 +1,106 @@
+"""DeepSeek分析路径离线基准测试
+
+在进程内启动本地替身服务器（mock_deepseek_server），把 DEEPSEEK_BASE_URL 指向它，
+然后多次调用 analyze_with_deepseek_with_retry，统计各场景下的端到端耗时分位数、
+备用信号比例以及每次分析实际发出的请求数（含JSON修复重试、429重试和对冲请求）。
+提示词使用固定的合成行情数据，不访问交易所；相同 --seed 下结果可复现。
+
+用法: python benchmarks/bench_analyze_path.py [--runs 30] [--seed 1]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_deepseek_server import MockDeepSeekServer  # noqa: E402
+
+# 场景: (名称, 服务器参数, 是否流式)
+SCENARIOS = [
+    ('正常 fixed:0.2', {'latency': 'fixed:0.2'}, True),
+    ('正常 非流式', {'latency': 'fixed:0.2'}, False),
+    ('长尾 lognormal', {'latency': 'lognormal:-1.5,0.8'}, True),
+    ('20%格式错误', {'latency': 'fixed:0.2', 'malformed_rate': 0.2}, True),
+    ('10%限流', {'latency': 'fixed:0.2', 'rate_limit_rate': 0.1, 'retry_after_ms': 50}, True),
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def fetch_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=30, help='每个场景的分析次数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    # 必须在导入 bot 之前设置，deepseek_client 在导入时创建
+    server = MockDeepSeekServer(seed=args.seed)
+    os.environ['DEEPSEEK_BASE_URL'] = server.start()
+    os.environ.setdefault('DEEPSEEK_API_KEY', 'mock')
+
+    from bench_prompt_builder import SYSTEM_CONFIG, make_coin, user_args
+    from bot import ai_analyzer
+    from bot.config import TRADE_CONFIG, deepseek_client
+    from bot.prompts import PromptBuilder
+
+    # 基准测试不按K线周期运行：放宽周期截止时间，避免整点附近剩余预算不足
+    TRADE_CONFIG['interval_minutes'] = 24 * 60
+    builder = PromptBuilder(compact=True)
+    coin = make_coin('BTC', random.Random(args.seed))
+    prompts = (builder.build_system_prompt(SYSTEM_CONFIG), builder.build_user_prompt(**user_args([coin])))
+    ai_analyzer._build_analysis_prompts = lambda *_args, **_kwargs: prompts
+    price_data = {'price': coin['current_price'], 'timestamp': 'bench', 'price_change': 0.0}
+    # 429由OpenAI客户端按 retry-after-ms 自动重试
+    deepseek_client.max_retries = 2
+
+    print("=" * 86)
+    print(f"DeepSeek分析路径（本地替身服务器 {os.environ['DEEPSEEK_BASE_URL']}，每场景 {args.runs} 次）")
+    print("=" * 86)
+    print(f"{'场景':<18} | {'p50':>7} | {'p90':>7} | {'p99':>7} | {'备用信号':>8} | {'请求/次':>7} | {'格式错误':>8} | {'限流':>4}")
+    print("-" * 86)
+    try:
+        for name, options, stream in SCENARIOS:
+            server.rng.seed(args.seed)
+            server.latency = type(server.latency)(options.get('latency', 'fixed:0'), server.rng)
+            server.malformed_rate = options.get('malformed_rate', 0.0)
+            server.rate_limit_rate = options.get('rate_limit_rate', 0.0)
+            server.retry_after_ms = options.get('retry_after_ms', 100)
+            TRADE_CONFIG['llm_stream']['enabled'] = stream
+            before = fetch_stats(server.base_url)
+
+            latencies = []
+            fallbacks = 0
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    signal_data = ai_analyzer.analyze_with_deepseek_with_retry(price_data)
+                latencies.append(time.perf_counter() - started)
+                fallbacks += signal_data.get('is_fallback', False)
+
+            after = fetch_stats(server.base_url)
+            delta = {key: after[key] - before[key] for key in after}
+            print(f"{name:<18} | {percentile(latencies, 50):6.2f}s | {percentile(latencies, 90):6.2f}s | "
+                  f"{percentile(latencies, 99):6.2f}s | {fallbacks / args.runs:>8.0%} | "
+                  f"{delta['requests'] / args.runs:>7.2f} | {delta['malformed']:>8} | {delta['rate_limited']:>4}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
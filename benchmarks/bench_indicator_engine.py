@@ -0,0 +1,115 @@
+"""增量指标引擎基准测试
+
+对比每个周期的指标计算开销：
+- pandas: calculate_technical_indicators 在全部K线上重新计算
+- 增量引擎: 一根K线收盘后的O(1)更新 + 未收盘K线试算
+并校验两者在相同K线上的结果一致。
+
+用法: python benchmarks/bench_indicator_engine.py [--sizes 96,10000,1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.indicator_engine import IndicatorEngine, IndicatorSet, INDICATOR_COLUMNS  # noqa: E402
+from bot.technical_analysis import calculate_technical_indicators  # noqa: E402
+
+TF_MS = 3 * 60 * 1000
+
+
+def make_ohlcv(n, seed=42):
+    """生成随机游走K线"""
+    rng = np.random.default_rng(seed)
+    close = 60000 + np.cumsum(rng.normal(0, 50, n))
+    high = close + rng.random(n) * 30
+    low = close - rng.random(n) * 30
+    volume = rng.random(n) * 100 + 1
+    ts = np.arange(n, dtype=np.int64) * TF_MS
+    return [[int(ts[i]), float(close[i]), float(high[i]), float(low[i]), float(close[i]), float(volume[i])]
+            for i in range(n)]
+
+
+def to_df(ohlcv):
+    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def check_equivalence(ohlcv):
+    """增量引擎与pandas在相同K线上的最大误差"""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = IndicatorEngine(checkpoint_path=os.path.join(tmp, 'state.json'), history_size=len(ohlcv))
+        ours = engine.compute('BENCH', '3m', to_df(ohlcv), ohlcv)[INDICATOR_COLUMNS]
+    ref = calculate_technical_indicators(to_df(ohlcv))[INDICATOR_COLUMNS]
+    abs_diff = (ours - ref).abs().max().max()
+    rel_diff = ((ours - ref).abs() / ref.abs().clip(lower=1e-12)).max().max()
+    return abs_diff, rel_diff
+
+
+def bench(n, repeat):
+    ohlcv = make_ohlcv(n + 1)
+    closed, last = ohlcv[:n], ohlcv[n]
+
+    # pandas：每周期全量重算
+    df = to_df(closed)
+    pandas_time = best_of(lambda: calculate_technical_indicators(df.copy()), repeat)
+
+    # 增量引擎：冷启动（在全部K线上预热一次）
+    def cold():
+        indicator_set = IndicatorSet()
+        for _, _, high, low, close, volume in closed:
+            indicator_set.update(high, low, close, volume)
+        return indicator_set
+    cold_time = best_of(cold, 1 if n > 100000 else repeat)
+
+    # 增量引擎：一根K线收盘 + 未收盘K线试算
+    indicator_set = cold()
+    steps = 1000
+    started = time.perf_counter()
+    for i in range(steps):
+        indicator_set.peek(last[2], last[3], last[4] + i, last[5])
+        indicator_set.update(last[2], last[3], last[4] + i, last[5])
+    step_time = (time.perf_counter() - started) / steps
+
+    print(f"{n:>9} 根K线 | pandas全量 {pandas_time * 1000:9.3f} ms | "
+          f"增量单步 {step_time * 1e6:7.2f} µs | 冷启动 {cold_time * 1000:9.2f} ms | "
+          f"加速 {pandas_time / step_time:10.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='96,10000,1000000', help='K线数量，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数（取最优）')
+    args = parser.parse_args()
+
+    print("=" * 90)
+    print("增量指标引擎 vs pandas 全量计算")
+    print("=" * 90)
+
+    abs_diff, rel_diff = check_equivalence(make_ohlcv(2000, seed=7))
+    status = "✅" if abs_diff < 1e-6 else "❌"
+    print(f"{status} 结果一致性（2000根K线）: 最大绝对误差 {abs_diff:.3e}, 最大相对误差 {rel_diff:.3e}")
+    print("-" * 90)
+
+    for n in [int(s) for s in args.sizes.split(',')]:
+        bench(n, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""NumPy指标内核基准测试
+
+对比 indicator_kernels 与原pandas实现（calculate_rsi_series / calculate_ema_series /
+calculate_macd_series / calculate_atr_series 的算法）在不同序列长度下的耗时，
+以及多个交易对作为二维数组一次计算与逐个pandas计算的耗时，并校验结果一致。
+
+用法: python benchmarks/bench_kernels.py [--sizes 96,1000,10000,100000,1000000] [--symbols 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import indicator_kernels as kernels  # noqa: E402
+
+
+# ========== 原pandas实现（参考基准） ==========
+
+def pandas_rsi(df, period=14):
+    delta = df['close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
+    rs = gain / loss
+    return (100 - (100 / (1 + rs))).to_numpy()
+
+
+def pandas_ema(df, period=20):
+    return df['close'].ewm(span=period, adjust=False).mean().to_numpy()
+
+
+def pandas_macd(df):
+    return (df['close'].ewm(span=12).mean() - df['close'].ewm(span=26).mean()).to_numpy()
+
+
+def pandas_atr(df, period=14):
+    high_low = df['high'] - df['low']
+    high_close = abs(df['high'] - df['close'].shift())
+    low_close = abs(df['low'] - df['close'].shift())
+    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+    return tr.rolling(period).mean().to_numpy()
+
+
+CASES = [
+    ('rsi14', pandas_rsi, lambda a: kernels.rsi(a['close'], 14)),
+    ('ema20', pandas_ema, lambda a: kernels.ema(a['close'], 20, adjust=False)),
+    ('macd', pandas_macd, lambda a: kernels.macd(a['close'])),
+    ('atr14', pandas_atr, lambda a: kernels.atr(a['high'], a['low'], a['close'], 14)),
+]
+
+
+def make_arrays(symbols, n, seed=42):
+    """生成随机游走K线（symbols行 x n列）"""
+    rng = np.random.default_rng(seed)
+    close = 60000 + np.cumsum(rng.normal(0, 50, (symbols, n)), axis=1)
+    return {
+        'close': close,
+        'high': close + rng.random((symbols, n)) * 30,
+        'low': close - rng.random((symbols, n)) * 30,
+    }
+
+
+def to_frame(arrays, row):
+    return pd.DataFrame({name: values[row] for name, values in arrays.items()})
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def max_rel_diff(expected, actual):
+    """最大误差（相对于序列量级，避免MACD等零附近的指标放大相对误差）"""
+    if not np.array_equal(np.isnan(expected), np.isnan(actual)):
+        return float('inf')
+    mask = ~np.isnan(expected)
+    if not mask.any():
+        return 0.0
+    scale = max(float(np.max(np.abs(expected[mask]))), 1e-12)
+    return float(np.max(np.abs(expected[mask] - actual[mask])) / scale)
+
+
+def bench_lengths(sizes, repeat):
+    print(f"{'长度':>9} | {'指标':<6} | {'pandas':>10} | {'numpy':>10} | {'加速':>7} | 最大相对误差")
+    print("-" * 72)
+    for n in sizes:
+        arrays = make_arrays(1, n)
+        single = {name: values[0] for name, values in arrays.items()}
+        df = to_frame(arrays, 0)
+        runs = repeat if n <= 100000 else max(1, repeat // 3)
+        for name, reference, kernel in CASES:
+            diff = max_rel_diff(reference(df), kernel(single))
+            pandas_time = best_of(lambda: reference(df), runs)
+            numpy_time = best_of(lambda: kernel(single), runs)
+            status = "✅" if diff < 1e-9 else "❌"
+            print(f"{n:>9} | {name:<6} | {pandas_time * 1000:8.3f}ms | {numpy_time * 1000:8.3f}ms | "
+                  f"{pandas_time / numpy_time:6.1f}x | {status} {diff:.2e}")
+
+
+def bench_batch(symbols, n, repeat):
+    print(f"\n多交易对批量计算: {symbols} 个交易对 x {n} 根K线（二维数组一次计算 vs 逐个pandas计算）")
+    print("-" * 72)
+    arrays = make_arrays(symbols, n, seed=7)
+    frames = [to_frame(arrays, row) for row in range(symbols)]
+    for name, reference, kernel in CASES:
+        batch = kernel(arrays)
+        diff = max(max_rel_diff(reference(frames[row]), batch[row]) for row in range(symbols))
+        pandas_time = best_of(lambda: [reference(df) for df in frames], repeat)
+        numpy_time = best_of(lambda: kernel(arrays), repeat)
+        status = "✅" if diff < 1e-9 else "❌"
+        print(f"{name:<6} | pandas {pandas_time * 1000:8.3f}ms | numpy {numpy_time * 1000:8.3f}ms | "
+              f"{pandas_time / numpy_time:6.1f}x | {status} {diff:.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='96,1000,10000,100000,1000000', help='序列长度，逗号分隔')
+    parser.add_argument('--symbols', type=int, default=20, help='批量测试的交易对数量')
+    parser.add_argument('--batch-length', type=int, default=96, help='批量测试的序列长度')
+    parser.add_argument('--repeat', type=int, default=7, help='每项重复次数（取最优）')
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print("NumPy指标内核 vs pandas")
+    print("=" * 72)
+    bench_lengths([int(s) for s in args.sizes.split(',')], args.repeat)
+    bench_batch(args.symbols, args.batch_length, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""提示词构建基准测试
+
+对比预编译模板引擎（template_engine）与原正则替换实现（PromptBuilder._replace_placeholders）
+构建系统提示词和多币种用户提示词的耗时，并逐字节校验两者输出一致（golden对比），
+以及模板文件修改后自动重新编译。
+
+用法: python benchmarks/bench_prompt_builder.py [--symbols 1,5,20] [--repeat 2000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.prompts import PromptBuilder  # noqa: E402
+
+
+class RegexRenderer:
+    """原实现：每次渲染都用正则扫描整个模板并逐个回调替换"""
+
+    def __init__(self, builder):
+        self._builder = builder
+        self._loader = builder._templates
+        self._sources = {name: self._loader.get(name).source for name in PromptBuilder._TEMPLATE_FILES.values()}
+
+    def get(self, filename):
+        return self._loader.get(filename)
+
+    def render(self, filename, values):
+        return self._builder._replace_placeholders(self._sources[filename], values)
+
+
+def make_builders(prompts_dir=None, **kwargs):
+    compiled = PromptBuilder(prompts_dir, **kwargs)
+    legacy = PromptBuilder(prompts_dir, **kwargs)
+    legacy._templates = RegexRenderer(legacy)
+    return compiled, legacy
+
+
+def make_coin(symbol, rng, length=10):
+    price = rng.uniform(1, 100000)
+    series = lambda scale, base=0.0: [base + rng.uniform(-scale, scale) for _ in range(length)]  # noqa: E731
+    return {
+        'symbol': symbol,
+        'tick_size': 0.1,
+        'current_price': price,
+        'current_ema20': price * 0.999,
+        'current_macd': rng.uniform(-50, 50),
+        'current_rsi7': rng.uniform(0, 100),
+        'oi_latest': rng.uniform(1e5, 1e9),
+        'oi_avg': rng.uniform(1e5, 1e9),
+        'funding_rate': rng.uniform(-1e-3, 1e-3),
+        'mid_prices': series(price * 0.01, price),
+        'ema20_series': series(price * 0.01, price),
+        'macd_series': series(50),
+        'rsi7_series': series(50, 50),
+        'rsi14_series': series(50, 50),
+        'ema20_4h': price * 0.99,
+        'ema50_4h': price * 0.98,
+        'atr3_4h': price * 0.01,
+        'atr14_4h': price * 0.012,
+        'current_volume_4h': rng.uniform(1e3, 1e6),
+        'avg_volume_4h': rng.uniform(1e3, 1e6),
+        'macd_4h': series(100),
+        'rsi14_4h': series(50, 50),
+    }
+
+
+SYSTEM_CONFIG = {
+    'exchange': 'OKX',
+    'model_name': 'DeepSeek-v1',
+    'asset_universe': 'BTC, ETH, SOL',
+    'starting_capital': 12345.678,
+    'decision_frequency': 'Every 3 minutes',
+    'leverage_range': '1-10x',
+}
+
+
+def user_args(coins):
+    return {
+        'minutes_elapsed': 1234,
+        'current_time': '2025-01-01 00:00:00',
+        'invocation_count': 411,
+        'coins_data': coins,
+        'current_total_return_percent': 3.21,
+        'available_cash': 876.54,
+        'current_account_value': 1032.1,
+        'positions': [{'symbol': 'BTC', 'quantity': 0.01, 'entry_price': 94000.5, 'note': '中文'}],
+    }
+
+
+def best_of(func, repeat, rounds=5):
+    """取多轮中的最优平均耗时（秒/次）"""
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+
+def check_golden(seed=0):
+    """原实现与预编译实现逐字节对比（含紧凑编码、缺失占位符和多币种区块）"""
+    rng = random.Random(seed)
+    failures = 0
+    for compact in (False, True):
+        compiled, legacy = make_builders(compact=compact)
+        cases = [
+            ('system', lambda b: b.build_system_prompt(SYSTEM_CONFIG)),
+            ('system(缺省配置)', lambda b: b.build_system_prompt({})),
+            ('universe', lambda b: b.build_universe_section(['BTC', 'ETH', 'SOL'])),
+        ]
+        for symbols in (0, 1, 3, 10):
+            coins = [make_coin(f"C{i}", rng) for i in range(symbols)]
+            cases.append((f"user x{symbols}", lambda b, coins=coins: b.build_user_prompt(**user_args(coins))))
+        for name, build in cases:
+            ok = build(compiled) == build(legacy)
+            failures += not ok
+            print(f"  {'✅' if ok else '❌'} compact={compact!s:<5} {name}")
+
+    # 模板中找不到替换值的占位符原样保留
+    loader = PromptBuilder()._templates
+    source = loader.get('coin.md').source
+    partial = {'Symbol': 'BTC', 'MidPrices': [1, 2.5]}
+    ok = loader.get('coin.md').render(partial) == PromptBuilder()._replace_placeholders(source, partial)
+    failures += not ok
+    print(f"  {'✅' if ok else '❌'} 缺失替换值的占位符原样保留")
+    return failures
+
+
+def check_reload():
+    """模板文件修改后自动重新编译"""
+    prompts_dir = os.path.dirname(os.path.abspath(sys.modules[PromptBuilder.__module__].__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in PromptBuilder._TEMPLATE_FILES.values():
+            shutil.copy(os.path.join(prompts_dir, name), tmp)
+        builder = PromptBuilder(tmp)
+        before = builder.build_universe_section(['BTC'])
+        path = os.path.join(tmp, 'universe.md')
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('\n<!-- reload check: {{.Coins}} -->')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        after = builder.build_universe_section(['BTC'])
+        ok = after == before + '\n<!-- reload check: BTC -->'
+        print(f"  {'✅' if ok else '❌'} 修改 universe.md 后自动重新编译")
+        return 0 if ok else 1
+
+
+def bench(symbol_counts, repeat):
+    print(f"{'场景':<18} | {'正则替换':>10} | {'预编译':>10} | {'加速':>6}")
+    print("-" * 56)
+    rng = random.Random(1)
+    compiled, legacy = make_builders()
+    # (场景, 币种数量, 构建函数)：重复次数按币种数量等比减少，每个场景的总工作量相近
+    rows = [('系统提示词', 1, lambda b: b.build_system_prompt(SYSTEM_CONFIG))]
+    for count in symbol_counts:
+        coins = [make_coin(f"C{i}", rng) for i in range(count)]
+        rows.append((f"用户提示词 x{count}币种", count, lambda b, coins=coins: b.build_user_prompt(**user_args(coins))))
+    for name, count, build in rows:
+        runs = max(1, repeat // max(1, count))
+        legacy_time = best_of(lambda: build(legacy), runs)
+        compiled_time = best_of(lambda: build(compiled), runs)
+        print(f"{name:<18} | {legacy_time * 1e6:8.1f}µs | {compiled_time * 1e6:8.1f}µs | "
+              f"{legacy_time / compiled_time:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', default='1,5,20', help='用户提示词中的币种数量，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=2000, help='每轮重复次数（用户提示词场景按币种数量等比减少）')
+    args = parser.parse_args()
+
+    print("=" * 56)
+    print("提示词构建: 预编译模板 vs 正则替换")
+    print("=" * 56)
+    print("一致性校验:")
+    failures = check_golden() + check_reload()
+    print()
+    bench([int(s) for s in args.symbols.split(',')], args.repeat)
+    if failures:
+        print(f"\n❌ {failures} 项一致性校验失败")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""交易信号解析基准测试
+
+对比原实现（find/rfind 截取 + 全局替换单引号/正则给键加引号 + 手工字段检查）与
+signal_parser（首个可解析JSON + 字符串外修复 + schema校验）在一组AI回复上的
+JSON解析率、有效信号率、理由文本是否被改动以及每条回复的解析耗时。
+
+语料：数据库中保存的 ai_response（实盘与模拟AI分析历史），加上内置的典型不规范回复。
+
+用法: python benchmarks/bench_signal_parser.py [--db data/trading_data.db] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.signal_parser import extract_json, validate_signal  # noqa: E402
+
+REQUIRED_FIELDS = ['signal', 'reason', 'stop_loss', 'take_profit', 'confidence']
+
+# 内置语料：常见的规范与不规范回复
+BUILTIN_CORPUS = [
+    '{"signal": "BUY", "reason": "突破EMA20，MACD金叉", "stop_loss": 94000, "take_profit": 98000, '
+    '"confidence": "HIGH", "quantity": 0.01, "leverage": 5}',
+    '```json\n{"signal": "hold", "justification": "等待 12:30 数据公布", "stop_loss": 94000, '
+    '"profit_target": 98000, "confidence": 0.3}\n```',
+    '分析完成。\n{"signal": "sell_to_enter", "justification": "见 https://www.okx.com/trade 资金费率", '
+    '"stop_loss": 98000, "profit_target": 93000, "confidence": 0.75, "quantity": 0.02, "leverage": 3}\n'
+    '以上仅供参考 {备注}',
+    "{'signal': 'HOLD', 'reason': \"it's 08:00 UTC, 观望\", 'stop_loss': 94000, 'take_profit': 98000, "
+    "'confidence': 'LOW',}",
+    '{signal: "CLOSE", reason: "止盈 at 10:15", stop_loss: 94000, take_profit: 98000, confidence: "MEDIUM"}',
+    '{"signal": "BUY", "reason": "放量", "stop_loss": "94,000", "take_profit": "98,000", '
+    '"confidence": "high", "quantity": "0.01", "leverage": 5.0}',
+    '[deepseek-chat] {"signal": "BUY", "reason": "a", "stop_loss": 94000, "take_profit": 98000, '
+    '"confidence": "HIGH"}\n\n[local] {"signal": "HOLD", "reason": "b", "stop_loss": 94000, '
+    '"take_profit": 98000, "confidence": "LOW"}',
+    '{"signal": "LONG", "reason": "未知信号", "stop_loss": 94000, "take_profit": 98000, "confidence": "HIGH"}',
+    '{"signal": "BUY", "reason": "杠杆过高", "stop_loss": 94000, "take_profit": 98000, '
+    '"confidence": "HIGH", "quantity": 0.01, "leverage": 50}',
+    '抱歉，当前无法给出建议。',
+]
+
+
+def legacy_safe_json_parse(json_str):
+    """原 utils.safe_json_parse"""
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        try:
+            json_str = json_str.replace("'", '"')
+            json_str = re.sub(r'(\w+):', r'"\1":', json_str)
+            json_str = re.sub(r',\s*}', '}', json_str)
+            json_str = re.sub(r',\s*]', ']', json_str)
+            return json.loads(json_str)
+        except json.JSONDecodeError:
+            return None
+
+
+def legacy_parse(text):
+    """原实现：find/rfind 截取后解析，字段名映射后检查必需字段
+
+    Returns:
+        tuple: (解析出的字典或None, 是否为有效信号)
+    """
+    start, end = text.find('{'), text.rfind('}') + 1
+    if start == -1 or end == 0:
+        return None, False
+    data = legacy_safe_json_parse(text[start:end])
+    if not isinstance(data, dict):
+        return None, False
+    if 'justification' in data and 'reason' not in data:
+        data['reason'] = data['justification']
+    if 'profit_target' in data and 'take_profit' not in data:
+        data['take_profit'] = data['profit_target']
+    valid = all(field in data for field in REQUIRED_FIELDS)
+    if valid:
+        try:
+            float(data['stop_loss'])
+            float(data['take_profit'])
+        except (TypeError, ValueError):
+            valid = False
+    return data, valid
+
+
+def new_parse(text):
+    """signal_parser：首个可解析JSON + schema校验"""
+    data = extract_json(text)
+    if not isinstance(data, dict):
+        return None, False
+    signal, errors, _ = validate_signal(data)
+    return signal, not errors
+
+
+def load_corpus(db_path):
+    """读取数据库中保存的AI回复（数据库不存在或没有记录时返回空列表）"""
+    if not os.path.exists(db_path):
+        return []
+    responses = []
+    conn = sqlite3.connect(db_path)
+    try:
+        for table in ('ai_analysis_history', 'sim_ai_analysis_history'):
+            try:
+                rows = conn.execute(f"SELECT ai_response FROM {table} WHERE ai_response != ''").fetchall()
+            except sqlite3.OperationalError:
+                continue
+            responses.extend(row[0] for row in rows if row[0])
+    finally:
+        conn.close()
+    return responses
+
+
+def reason_of(data):
+    if not isinstance(data, dict):
+        return None
+    return data.get('reason', data.get('justification'))
+
+
+def measure(parse, corpus, repeat):
+    """返回 (JSON解析率, 有效信号率, 每条耗时µs, 解析结果)"""
+    results = [parse(text) for text in corpus]
+    best = float('inf')
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for text in corpus:
+                parse(text)
+        best = min(best, (time.perf_counter() - started) / (repeat * len(corpus)))
+    parsed = sum(data is not None for data, _ in results) / len(corpus)
+    valid = sum(ok for _, ok in results) / len(corpus)
+    return parsed, valid, best * 1e6, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='data/trading_data.db', help='保存AI分析历史的SQLite数据库')
+    parser.add_argument('--repeat', type=int, default=200, help='每轮重复次数')
+    args = parser.parse_args()
+
+    stored = load_corpus(args.db)
+    corpus = stored + BUILTIN_CORPUS
+    print("=" * 64)
+    print("信号解析: signal_parser vs find/rfind + 正则修复")
+    print(f"语料: 数据库 {len(stored)} 条 + 内置 {len(BUILTIN_CORPUS)} 条")
+    print("=" * 64)
+    print(f"{'实现':<16} | {'JSON解析率':>10} | {'有效信号率':>10} | {'耗时/条':>10}")
+    print("-" * 64)
+    legacy = measure(legacy_parse, corpus, args.repeat)
+    new = measure(new_parse, corpus, args.repeat)
+    for name, (parsed, valid, micros, _) in (('原实现', legacy), ('signal_parser', new)):
+        print(f"{name:<16} | {parsed:>10.1%} | {valid:>10.1%} | {micros:8.1f}µs")
+
+    # 理由文本被修复逻辑改动（如URL、时间戳中的冒号被加上引号）
+    altered = 0
+    for text, (legacy_data, _), (new_data, _) in zip(corpus, legacy[3], new[3]):
+        legacy_reason, new_reason = reason_of(legacy_data), reason_of(new_data)
+        if legacy_reason is not None and new_reason is not None and legacy_reason != new_reason:
+            altered += 1
+            print(f"\n理由文本不一致:\n  原实现:        {legacy_reason!r}\n  signal_parser: {new_reason!r}")
+    print(f"\n两种实现解析出的理由文本不一致: {altered} 条")
+
+
+if __name__ == '__main__':
+    main()
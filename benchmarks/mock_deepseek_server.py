@@ -0,0 +1,332 @@
+"""本地DeepSeek替身服务器 - OpenAI兼容的 chat.completions 接口，用于离线延迟测试
+
+把 DEEPSEEK_BASE_URL 指向本服务器，即可在没有网络的机器上确定性地测试
+请求 → 重试 → 解析 → 执行 的完整路径：
+- 可配置的延迟分布（首token前等待），流式回复按块发送；
+- 按比例返回格式错误的JSON（单引号、截断、纯文本）和 429 限流错误；
+- 从 ai_analysis_history 中按顺序回放保存的AI回复；
+- 未回放时根据用户提示词中的 current_price 生成HOLD决策（多币种时返回 decisions 数组）；
+- usage 中模拟前缀缓存命中（同一系统提示词第二次出现时计为命中）。
+
+用法:
+    python benchmarks/mock_deepseek_server.py --port 8001 --latency lognormal:-0.5,0.4 \\
+        --malformed-rate 0.1 --rate-limit-rate 0.05 --replay data/trading_data.db
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8001 python deepseekok2.py
+
+也可在进程内使用:
+    server = MockDeepSeekServer(latency='fixed:0.2', seed=1)
+    base_url = server.start()
+    ...
+    server.stop()
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CURRENT_PRICE_PATTERN = re.compile(r'### ALL (\S+) DATA\s+- current_price: \*\*([-\d.eE+]+)\*\*')
+MALFORMED_KINDS = ('single_quotes', 'truncated', 'prose')
+
+
+class LatencyModel:
+    """延迟分布：fixed:秒 / uniform:最小,最大 / normal:均值,标准差 / lognormal:mu,sigma"""
+
+    def __init__(self, spec, rng):
+        kind, _, params = spec.partition(':')
+        self.kind = kind
+        self.params = [float(value) for value in params.split(',') if value]
+        self.rng = rng
+        expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"无效的延迟分布: {spec}（示例: fixed:0.5 / uniform:0.2,1.5 / "
+                             f"normal:0.8,0.2 / lognormal:-0.5,0.4）")
+
+    def sample(self):
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return self.rng.uniform(*self.params)
+        if self.kind == 'normal':
+            return max(0.0, self.rng.gauss(*self.params))
+        return self.rng.lognormvariate(*self.params)
+
+
+def load_replay(db_path):
+    """按保存顺序读取 ai_analysis_history（及模拟历史）中的AI回复"""
+    conn = sqlite3.connect(db_path)
+    try:
+        responses = []
+        for table in ('ai_analysis_history', 'sim_ai_analysis_history'):
+            try:
+                rows = conn.execute(f"SELECT ai_response FROM {table} WHERE ai_response != '' ORDER BY id").fetchall()
+            except sqlite3.OperationalError:
+                continue
+            responses.extend(row[0] for row in rows if row[0])
+        return responses
+    finally:
+        conn.close()
+
+
+def default_answer(messages):
+    """根据用户提示词生成合法的HOLD决策（多币种时返回 {"decisions": [...]}）"""
+    user_prompt = next((m.get('content') or '' for m in messages if m.get('role') == 'user'), '')
+    coins = CURRENT_PRICE_PATTERN.findall(user_prompt) or [('BTC', '100')]
+    decisions = []
+    for coin, price in coins:
+        price = float(price)
+        decisions.append({
+            'coin': coin,
+            'signal': 'hold',
+            'justification': 'mock: 无明确信号，保持观望',
+            'stop_loss': round(price * 0.98, 8),
+            'profit_target': round(price * 1.02, 8),
+            'confidence': 0.5,
+        })
+    answer = decisions[0] if len(decisions) == 1 else {'decisions': decisions}
+    return json.dumps(answer, ensure_ascii=False)
+
+
+def malform(answer, kind):
+    """把合法回复变成格式错误的回复"""
+    if kind == 'single_quotes':
+        return answer.replace('"', "'")
+    if kind == 'truncated':
+        return answer[:max(1, len(answer) // 2)]
+    return "根据当前市场情况，我建议暂时观望，等待更明确的信号。"
+
+
+class MockDeepSeekServer:
+    """OpenAI兼容的本地替身服务器"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency='fixed:0', chunk_chars=8, chunk_delay=0.01,
+                 malformed_rate=0.0, malformed_kinds=MALFORMED_KINDS, rate_limit_rate=0.0,
+                 retry_after_ms=100, replay=None, seed=None):
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_delay = chunk_delay
+        self.malformed_rate = malformed_rate
+        self.malformed_kinds = tuple(malformed_kinds)
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_ms = retry_after_ms
+        self.replay = list(replay or [])
+        self._replay_index = 0
+        self._seen_system_prompts = set()
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'stream': 0, 'rate_limited': 0, 'malformed': 0, 'replayed': 0,
+                      'repair_followups': 0, 'client_disconnects': 0}
+        self._httpd = None
+        self._thread = None
+
+    # ========== 生命周期 ==========
+
+    def start(self):
+        """在后台线程启动服务器，返回 base_url"""
+        handler = type('Handler', (_Handler,), {'mock': self})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='mock-deepseek', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # ========== 决策 ==========
+
+    def plan(self, messages):
+        """决定本次请求的结果
+
+        Returns:
+            tuple: (结果类型 ok/malformed/rate_limited, 回复文本, 首token前延迟)
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            # 同一随机数生成器按固定顺序抽样，保证相同seed下结果可复现
+            latency = self.latency.sample()
+            if self.rng.random() < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return 'rate_limited', None, latency
+            is_repair = len(messages) > 2 and messages[-2].get('role') == 'assistant'
+            if is_repair:
+                self.stats['repair_followups'] += 1
+            if self.replay and not is_repair:
+                answer = self.replay[self._replay_index % len(self.replay)]
+                self._replay_index += 1
+                self.stats['replayed'] += 1
+            else:
+                answer = default_answer(messages)
+            if self.rng.random() < self.malformed_rate and not is_repair:
+                self.stats['malformed'] += 1
+                return 'malformed', malform(answer, self.rng.choice(self.malformed_kinds)), latency
+            return 'ok', answer, latency
+
+    def usage(self, messages, answer):
+        """模拟token用量和前缀缓存命中（系统提示词第二次出现时计为命中）"""
+        system_prompt = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+        prompt_tokens = sum(len(m.get('content') or '') for m in messages) // 4
+        system_tokens = len(system_prompt) // 4
+        digest = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            hit = system_tokens if digest in self._seen_system_prompts else 0
+            self._seen_system_prompts.add(digest)
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(answer) // 4,
+            'total_tokens': prompt_tokens + len(answer) // 4,
+            'prompt_cache_hit_tokens': hit,
+            'prompt_cache_miss_tokens': prompt_tokens - hit,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock: MockDeepSeekServer = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path in ('/models', '/v1/models'):
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': 'deepseek-chat', 'object': 'model', 'owned_by': 'mock'},
+                {'id': 'deepseek-reasoner', 'object': 'model', 'owned_by': 'mock'},
+            ]})
+        elif path == '/stats':
+            self._send_json(200, dict(self.mock.stats))
+        else:
+            self._send_json(404, {'error': {'message': f'未知路径: {self.path}', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') not in ('/chat/completions', '/v1/chat/completions'):
+            self._send_json(404, {'error': {'message': f'未知路径: {self.path}', 'type': 'invalid_request_error'}})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        messages = request.get('messages', [])
+        model = request.get('model', 'deepseek-chat')
+
+        outcome, answer, latency = self.mock.plan(messages)
+        time.sleep(latency)
+        if outcome == 'rate_limited':
+            self._send_json(429, {'error': {'message': 'Rate limit reached (mock)', 'type': 'rate_limit_error'}},
+                            headers={'retry-after-ms': str(self.mock.retry_after_ms)})
+            return
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = self.mock.usage(messages, answer)
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer},
+                             'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+            return
+
+        with self.mock._lock:
+            self.mock.stats['stream'] += 1
+        include_usage = (request.get('stream_options') or {}).get('include_usage', False)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, chunk_usage=None):
+            payload = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                       'choices': [] if delta is None else
+                       [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            if chunk_usage is not None:
+                payload['usage'] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        try:
+            event({'role': 'assistant', 'content': ''})
+            size = self.mock.chunk_chars
+            for start in range(0, len(answer), size):
+                event({'content': answer[start:start + size]})
+                if self.mock.chunk_delay:
+                    time.sleep(self.mock.chunk_delay)
+            event({}, finish_reason='stop')
+            if include_usage:
+                event(None, chunk_usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端在JSON完整后提前关闭连接
+            with self.mock._lock:
+                self.mock.stats['client_disconnects'] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', default='fixed:0.5',
+                        help='首token前延迟分布: fixed:秒 / uniform:最小,最大 / normal:均值,标准差 / lognormal:mu,sigma')
+    parser.add_argument('--chunk-chars', type=int, default=8, help='流式回复每块字符数')
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help='流式回复块间隔（秒）')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='返回格式错误JSON的比例')
+    parser.add_argument('--malformed-kinds', default=','.join(MALFORMED_KINDS),
+                        help=f"格式错误类型，逗号分隔（{'/'.join(MALFORMED_KINDS)}）")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429限流错误的比例')
+    parser.add_argument('--retry-after-ms', type=int, default=100, help='429回复中的 retry-after-ms')
+    parser.add_argument('--replay', help='回放该SQLite数据库 ai_analysis_history 中保存的AI回复')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子（相同种子结果可复现）')
+    args = parser.parse_args()
+
+    replay = load_replay(args.replay) if args.replay else None
+    server = MockDeepSeekServer(
+        host=args.host, port=args.port, latency=args.latency, chunk_chars=args.chunk_chars,
+        chunk_delay=args.chunk_delay, malformed_rate=args.malformed_rate,
+        malformed_kinds=[kind for kind in args.malformed_kinds.split(',') if kind],
+        rate_limit_rate=args.rate_limit_rate, retry_after_ms=args.retry_after_ms, replay=replay, seed=args.seed,
+    )
+    base_url = server.start()
+    print(f"🧪 DeepSeek替身服务器已启动: {base_url}（延迟 {args.latency}）")
+    if replay is not None:
+        print(f"🧪 回放 {len(replay)} 条保存的AI回复")
+    print(f"   使用: DEEPSEEK_BASE_URL={base_url} python deepseekok2.py")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"\n🧪 请求统计: {json.dumps(server.stats, ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
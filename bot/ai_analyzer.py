@@ -1,14 +1,19 @@
 """AI分析模块 - DeepSeek分析"""
 from .config import deepseek_client, TRADE_CONFIG, signal_history, exchange
 from .prompts import PromptBuilder
+from .prompts.compact_encoding import estimate_tokens
 from .technical_analysis import (
     calculate_rsi_series,
     calculate_ema_series,
-    calculate_macd_series,
-    calculate_atr_series
+    calculate_macd_series
 )
-from .position_manager import get_current_position
-from .utils import safe_json_parse, create_fallback_signal
+from .position_manager import get_current_position, get_contract_spec
+from .timeframe_cache import timeframe_cache
+from .cycle_context import cycle_context
+from .llm_stream import stream_completion, stream_settings, prompt_cache_stats
+from .llm_caller import llm_caller
+from .signal_parser import extract_json, is_decision, validate_signal
+from .utils import create_fallback_signal
 from datetime import datetime
 import pandas as pd
 import os
@@ -17,7 +22,30 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # 初始化提示词构建器（模块级，避免重复初始化）
-_builder = PromptBuilder()
+_encoding = TRADE_CONFIG.get('prompt_encoding', {})
+_builder = PromptBuilder(
+    compact=_encoding.get('compact', False),
+    token_budget=_encoding.get('token_budget'),
+    min_series_length=_encoding.get('min_series_length', 3),
+)
+
+# 已渲染的系统提示词：(模板, 配置) -> 提示词
+_system_prompt_cache = {}
+
+# 稳定模式下系统提示词中的起始资金（实际账户数值在用户提示词的账户信息中）
+STABLE_STARTING_CAPITAL = "See ACCOUNT INFORMATION & PERFORMANCE in each market snapshot"
+
+# 重试时的JSON修复请求（复用已构建的提示词，只追加这一条消息）
+JSON_REPAIR_PROMPT = (
+    "上一条回复无法解析为有效的交易决策。请严格按照系统提示词要求的JSON格式重新输出，"
+    "包含全部必需字段，只输出JSON，不要包含任何其他文字。"
+)
+
+# 重试时的字段修正请求（回复是有效JSON，但部分字段未通过校验）
+FIELD_REPAIR_PROMPT = (
+    "上一条回复中以下字段无效：{fields}。请修正这些字段后按系统提示词要求的JSON格式重新输出完整的交易决策，"
+    "只输出JSON，不要包含任何其他文字。"
+)
 
 # 交易开始时间计数器（用于计算minutes_elapsed）
 _start_time = None
@@ -28,12 +56,12 @@ def _get_oi_and_funding_rate(symbol):
     """获取Open Interest和Funding Rate"""
     try:
         # OKX获取持仓量
-        ticker = exchange.fetch_ticker(symbol)
+        ticker = cycle_context.fetch_ticker(symbol)
         oi_latest = ticker.get('openInterest', 0) or 0
         
         # 获取资金费率（需要调用特定API）
         try:
-            funding_rate_info = exchange.fetch_funding_rate(symbol)
+            funding_rate_info = cycle_context.fetch_funding_rate(symbol)
             funding_rate = funding_rate_info.get('fundingRate', 0) if funding_rate_info else 0
         except:
             # 如果API不支持，尝试从ticker获取
@@ -56,52 +84,16 @@ def _get_oi_and_funding_rate(symbol):
         }
 
 
-def _get_4h_data(symbol):
-    """获取4小时时间框架的数据"""
+def _get_4h_data(symbol, base_df=None):
+    """获取4小时时间框架的数据
+    
+    Args:
+        symbol: 交易对
+        base_df: 基础周期K线（如3m），用于本地重采样未收盘的4小时K线
+    """
     try:
-        # 获取4小时K线数据
-        ohlcv_4h = exchange.fetch_ohlcv(symbol, '4h', limit=60)
-        df_4h = pd.DataFrame(ohlcv_4h, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        
-        # 计算技术指标
-        df_4h['ema_20'] = df_4h['close'].ewm(span=20, adjust=False).mean()
-        df_4h['ema_50'] = df_4h['close'].ewm(span=50, adjust=False).mean()
-        
-        # MACD
-        ema_12_4h = df_4h['close'].ewm(span=12).mean()
-        ema_26_4h = df_4h['close'].ewm(span=26).mean()
-        df_4h['macd_4h'] = ema_12_4h - ema_26_4h
-        
-        # RSI14
-        delta_4h = df_4h['close'].diff()
-        gain_4h = (delta_4h.where(delta_4h > 0, 0)).rolling(14).mean()
-        loss_4h = (-delta_4h.where(delta_4h < 0, 0)).rolling(14).mean()
-        rs_4h = gain_4h / loss_4h
-        df_4h['rsi14_4h'] = 100 - (100 / (1 + rs_4h))
-        
-        # ATR
-        high_low_4h = df_4h['high'] - df_4h['low']
-        high_close_4h = abs(df_4h['high'] - df_4h['close'].shift())
-        low_close_4h = abs(df_4h['low'] - df_4h['close'].shift())
-        tr_4h = pd.concat([high_low_4h, high_close_4h, low_close_4h], axis=1).max(axis=1)
-        df_4h['atr3_4h'] = tr_4h.rolling(3).mean()
-        df_4h['atr14_4h'] = tr_4h.rolling(14).mean()
-        
-        # 填充NaN
-        df_4h = df_4h.bfill().ffill().fillna(0)
-        
-        current = df_4h.iloc[-1]
-        
-        return {
-            'ema20_4h': float(current['ema_20']),
-            'ema50_4h': float(current['ema_50']),
-            'atr3_4h': float(current['atr3_4h']),
-            'atr14_4h': float(current['atr14_4h']),
-            'current_volume_4h': float(current['volume']),
-            'avg_volume_4h': float(df_4h['volume'].tail(20).mean()),
-            'macd_4h': df_4h['macd_4h'].tail(10).fillna(0).tolist(),
-            'rsi14_4h': df_4h['rsi14_4h'].tail(10).fillna(50).tolist(),
-        }
+        # 已收盘的4小时K线及指标从缓存读取，只有未收盘K线在本地刷新
+        return timeframe_cache.get_context(exchange, symbol, '4h', limit=60, base_df=base_df)
     except Exception as e:
         print(f"获取4小时数据失败: {e}")
         return {
@@ -123,45 +115,37 @@ def _convert_price_data_to_coin_data(price_data):
         if df is None or df.empty:
             raise ValueError("full_data不可用")
         
-        # 获取最新数据（最后10根K线用于序列）
+        # 序列取最后10根K线；指标在完整K线上计算（经指标注册表，同一版本K线只计算一次）
         recent_count = min(10, len(df))
         df_recent = df.tail(recent_count)
         
         # 计算序列数据
         mid_prices = ((df_recent['high'] + df_recent['low']) / 2).tolist()
-        ema20_series = calculate_ema_series(df_recent, 20)[-recent_count:]
-        macd_series = calculate_macd_series(df_recent)[-recent_count:]
-        rsi7_series = calculate_rsi_series(df_recent, 7)[-recent_count:]
-        rsi14_series = calculate_rsi_series(df_recent, 14)[-recent_count:]
+        ema20_full = calculate_ema_series(df, 20)
+        rsi7_full = calculate_rsi_series(df, 7)
+        ema20_series = ema20_full[-recent_count:]
+        macd_series = calculate_macd_series(df)[-recent_count:]
+        rsi7_series = rsi7_full[-recent_count:]
+        rsi14_series = calculate_rsi_series(df, 14)[-recent_count:]
         
         # 当前值
-        current = df.iloc[-1]
         tech = price_data.get('technical_data', {})
+        current_ema20 = float(ema20_full[-1])
+        current_rsi7 = rsi7_full[-1]
         
-        # 计算EMA20（如果不存在）
-        if 'ema_20' not in df.columns:
-            df['ema_20'] = df['close'].ewm(span=20, adjust=False).mean()
-        current_ema20 = float(df['ema_20'].iloc[-1])
-        
-        # 计算RSI7（如果不存在）
-        if 'rsi_7' not in df.columns:
-            rsi7_series_full = calculate_rsi_series(df, 7)
-            current_rsi7 = rsi7_series_full[-1]
-        else:
-            current_rsi7 = float(df['rsi_7'].iloc[-1])
-        
-        # 获取OI和Funding Rate
-        symbol = TRADE_CONFIG['symbol']
-        oi_data = _get_oi_and_funding_rate(symbol)
+        # 获取OI和Funding Rate（市场快照已并发获取时直接复用）
+        symbol = price_data.get('symbol', TRADE_CONFIG['symbol'])
+        oi_data = price_data.get('oi_data') or _get_oi_and_funding_rate(symbol)
         
-        # 获取4小时数据
-        data_4h = _get_4h_data(symbol)
+        # 获取4小时数据（用3m K线重采样未收盘的4小时K线）
+        data_4h = price_data.get('data_4h') or _get_4h_data(symbol, base_df=df)
         
         # 从symbol中提取币种名称（BTC/USDT:USDT -> BTC）
         coin_symbol = symbol.split('/')[0]
         
         coin_data = {
             'symbol': coin_symbol,
+            'tick_size': TRADE_CONFIG.get('contract_specs', {}).get(symbol, {}).get('tick_size'),
             'current_price': float(price_data['price']),
             'current_ema20': current_ema20,
             'current_macd': float(tech.get('macd', 0)),
@@ -191,7 +175,7 @@ def _convert_price_data_to_coin_data(price_data):
         traceback.print_exc()
         # 返回最小可用数据
         return {
-            'symbol': 'BTC',
+            'symbol': price_data.get('symbol', TRADE_CONFIG['symbol']).split('/')[0],
             'current_price': float(price_data.get('price', 0)),
             'current_ema20': 0.0,
             'current_macd': 0.0,
@@ -215,19 +199,29 @@ def _convert_price_data_to_coin_data(price_data):
         }
 
 
-def _prepare_system_config(account_balance=None):
+def _stable_system_prompt():
+    """是否使用字节稳定的系统提示词（易变数值只出现在用户提示词中，以命中DeepSeek前缀缓存）"""
+    return TRADE_CONFIG.get('prompt_cache', {}).get('stable_system_prompt', False)
+
+
+def _prepare_system_config(account_balance=None, symbols=None):
     """准备系统提示词配置
     
     Args:
         account_balance: 账户余额（USDT），如果提供则使用此值作为起始资金
+        symbols: 交易对列表（多币种模式），默认只有TRADE_CONFIG['symbol']
     """
-    symbol = TRADE_CONFIG['symbol']
-    asset_universe = symbol.split('/')[0]  # 提取BTC
+    symbols = symbols or [TRADE_CONFIG['symbol']]
+    asset_universe = ', '.join(symbol.split('/')[0] for symbol in symbols)  # 提取BTC, ETH...
     
-    # 如果没有提供账户余额，尝试从交易所获取
-    if account_balance is None:
+    if _stable_system_prompt():
+        # 稳定模式：起始资金使用固定配置值，未配置时指向用户提示词中的账户信息
+        starting_capital = TRADE_CONFIG['prompt_cache'].get('starting_capital')
+        account_balance = STABLE_STARTING_CAPITAL if starting_capital is None else starting_capital
+    elif account_balance is None:
+        # 如果没有提供账户余额，尝试从交易所获取
         try:
-            balance = exchange.fetch_balance()
+            balance = cycle_context.fetch_balance()
             account_balance = float(balance['USDT'].get('total', 0))  # 使用total作为账户总值
             print(f"📊 从交易所获取账户余额: {account_balance:.2f} USDT")
         except Exception as e:
@@ -248,19 +242,48 @@ def _prepare_system_config(account_balance=None):
     }
 
 
-def _prepare_user_prompt_params(price_data, coin_data, position_data=None, account_data=None):
-    """准备用户提示词参数
+def _build_system_prompt(account_data=None, symbols=None):
+    """构建系统提示词
     
     Args:
-        price_data: 价格数据
-        coin_data: 币种数据
-        position_data: 可选的持仓数据（用于模拟模式），如果提供则使用此数据而不是调用get_current_position()
-        account_data: 可选的账户数据（用于模拟模式），如果提供则使用此数据而不是调用exchange.fetch_balance()
+        account_data: 可选的账户数据（用于模拟模式），否则从交易所获取余额
+        symbols: 交易对列表（多币种模式）
     """
-    global _start_time, _invocation_count
+    account_balance_for_system = None
+    if _stable_system_prompt():
+        # 稳定模式：系统提示词不含余额，不需要获取
+        pass
+    elif account_data is not None:
+        # 模拟模式：使用提供的账户数据
+        account_balance_for_system = float(account_data.get('balance', account_data.get('equity', 0)))
+    else:
+        # 真实模式：从交易所获取
+        try:
+            balance = cycle_context.fetch_balance()
+            account_balance_for_system = float(balance['USDT'].get('total', 0))
+        except Exception as e:
+            print(f"⚠️ 获取账户余额用于系统提示词失败: {e}")
     
-    # 判断是模拟模式还是真实模式（通过检查TEST_MODE环境变量或position_data参数）
-    is_simulation = os.getenv('TEST_MODE', 'false').lower() == 'true' or position_data is not None
+    system_config = _prepare_system_config(account_balance_for_system, symbols)
+    
+    # 配置和模板都未变化时复用已渲染的结果（预构建阶段会提前渲染）
+    key = (_builder.system_template, tuple(sorted(system_config.items())))
+    system_prompt = _system_prompt_cache.get(key)
+    if system_prompt is None:
+        if len(_system_prompt_cache) >= 16:
+            _system_prompt_cache.clear()
+        system_prompt = _builder.build_system_prompt(system_config)
+        _system_prompt_cache[key] = system_prompt
+    return system_prompt
+
+
+def _update_invocation_stats(is_simulation):
+    """更新并返回累计运行分钟数和调用次数（从数据库读取，失败时使用会话级统计）
+    
+    Returns:
+        tuple: (elapsed, invocation_count) - 累计分钟数、累计调用次数
+    """
+    global _start_time, _invocation_count
     
     # 从数据库获取统计数据
     try:
@@ -323,38 +346,43 @@ def _prepare_user_prompt_params(price_data, coin_data, position_data=None, accou
         elapsed = (datetime.now() - _start_time).total_seconds() / 60
         _invocation_count += 1
     
-    # 获取持仓信息
-    if position_data is not None:
-        # 使用提供的持仓数据（模拟模式）
-        current_pos = position_data
-    else:
-        # 从真实交易所获取持仓（真实交易模式）
-        current_pos = get_current_position()
+    return elapsed, _invocation_count
+
+
+def _format_position(current_pos, current_price):
+    """将持仓转换为提示词中的持仓格式（quantity为币数量）"""
+    # 从完整交易对中提取币种名称（如 BTC/USDT:USDT -> BTC）
+    raw_symbol = current_pos.get('symbol', 'BTC/USDT:USDT')
+    symbol_parts = raw_symbol.split('/')
+    coin_symbol = symbol_parts[0] if len(symbol_parts) > 0 else 'BTC'
     
-    positions = []
-    if current_pos:
-        # 从完整交易对中提取币种名称（如 BTC/USDT:USDT -> BTC）
-        raw_symbol = current_pos.get('symbol', 'BTC/USDT:USDT')
-        symbol_parts = raw_symbol.split('/')
-        coin_symbol = symbol_parts[0] if len(symbol_parts) > 0 else 'BTC'
-        
-        # 将合约张数转换为币数量（AI期望的quantity单位）
-        # 合约张数存储在current_pos['size']中，需要转换为币数量
-        contract_size_value = TRADE_CONFIG.get('contract_size', 0.01)  # 合约乘数（1张=0.01 BTC）
-        size_in_contracts = current_pos.get('size', 0)  # 合约张数
-        quantity_in_coins = size_in_contracts * contract_size_value  # 币数量
-        
-        positions = [{
-            'symbol': coin_symbol,  # 使用币种名称（如BTC），而不是完整交易对
-            'side': current_pos.get('side', 'long'),
-            'quantity': quantity_in_coins,  # 使用币数量，与AI返回的quantity单位一致
-            'size': size_in_contracts,  # 保留原始合约张数（向后兼容）
-            'entry_price': current_pos.get('entry_price', 0),
-            'current_price': float(price_data['price']),
-            'unrealized_pnl': current_pos.get('unrealized_pnl', 0),
-            'leverage': current_pos.get('leverage', TRADE_CONFIG['leverage']),
-        }]
+    # 将合约张数转换为币数量（AI期望的quantity单位）
+    # 合约张数存储在current_pos['size']中，需要转换为币数量
+    contract_size_value, _ = get_contract_spec(raw_symbol)  # 合约乘数（1张=0.01 BTC）
+    size_in_contracts = current_pos.get('size', 0)  # 合约张数
+    quantity_in_coins = size_in_contracts * contract_size_value  # 币数量
+    
+    return {
+        'symbol': coin_symbol,  # 使用币种名称（如BTC），而不是完整交易对
+        'side': current_pos.get('side', 'long'),
+        'quantity': quantity_in_coins,  # 使用币数量，与AI返回的quantity单位一致
+        'size': size_in_contracts,  # 保留原始合约张数（向后兼容）
+        'entry_price': current_pos.get('entry_price', 0),
+        'current_price': float(current_price),
+        'unrealized_pnl': current_pos.get('unrealized_pnl', 0),
+        'leverage': current_pos.get('leverage', TRADE_CONFIG['leverage']),
+    }
+
+
+def _get_account_summary(account_data=None):
+    """获取提示词中的账户信息
+    
+    Args:
+        account_data: 可选的账户数据（用于模拟模式），如果提供则使用此数据而不是调用exchange.fetch_balance()
     
+    Returns:
+        tuple: (available_cash, current_account_value, current_total_return_percent)
+    """
     # 获取账户信息
     if account_data is not None:
         # 使用提供的账户数据（模拟模式）
@@ -366,7 +394,7 @@ def _prepare_user_prompt_params(price_data, coin_data, position_data=None, accou
     else:
         # 从真实交易所获取账户信息（真实交易模式）
         try:
-            balance = exchange.fetch_balance()
+            balance = cycle_context.fetch_balance()
             available_cash = float(balance['USDT'].get('free', 0))
             total_value = float(balance['USDT'].get('total', 0))
             
@@ -378,10 +406,41 @@ def _prepare_user_prompt_params(price_data, coin_data, position_data=None, accou
             current_account_value = 0.0
             current_total_return_percent = 0.0
     
+    return available_cash, current_account_value, current_total_return_percent
+
+
+def _prepare_user_prompt_params(price_data, coin_data, position_data=None, account_data=None):
+    """准备用户提示词参数
+    
+    Args:
+        price_data: 价格数据
+        coin_data: 币种数据
+        position_data: 可选的持仓数据（用于模拟模式），如果提供则使用此数据而不是调用get_current_position()
+        account_data: 可选的账户数据（用于模拟模式），如果提供则使用此数据而不是调用exchange.fetch_balance()
+    """
+    # 判断是模拟模式还是真实模式（通过检查TEST_MODE环境变量或position_data参数）
+    is_simulation = os.getenv('TEST_MODE', 'false').lower() == 'true' or position_data is not None
+    
+    # 从数据库获取并更新统计数据
+    elapsed, invocation_count = _update_invocation_stats(is_simulation)
+    
+    # 获取持仓信息
+    if position_data is not None:
+        # 使用提供的持仓数据（模拟模式）
+        current_pos = position_data
+    else:
+        # 从真实交易所获取持仓（真实交易模式）
+        current_pos = get_current_position()
+    
+    positions = [_format_position(current_pos, price_data['price'])] if current_pos else []
+    
+    # 获取账户信息
+    available_cash, current_account_value, current_total_return_percent = _get_account_summary(account_data)
+    
     return {
         'minutes_elapsed': int(elapsed),  # 累计分钟数（从首次启动开始）
         'current_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'invocation_count': _invocation_count,  # 累计调用次数（从首次启动开始）
+        'invocation_count': invocation_count,  # 累计调用次数（从首次启动开始）
         'coins_data': [coin_data],
         'current_total_return_percent': current_total_return_percent,
         'available_cash': available_cash,
@@ -390,211 +449,420 @@ def _prepare_user_prompt_params(price_data, coin_data, position_data=None, accou
     }
 
 
-def analyze_with_deepseek(price_data, position_data=None, account_data=None):
-    """使用DeepSeek分析市场并生成交易信号（使用新模板系统）
+def _log_prompt_tokens(system_prompt):
+    """打印本次构建的提示词估算token数（用户提示词超出预算时序列已被缩短）"""
+    system_tokens = estimate_tokens(system_prompt)
+    user_tokens = _builder.last_token_count
+    budget = f"（预算 {_builder.token_budget}）" if _builder.token_budget else ""
+    print(f"🧮 提示词估算: 系统 {system_tokens} + 用户 {user_tokens}{budget} = {system_tokens + user_tokens} tokens"
+          f"，序列长度 {_builder.last_series_length}")
+
+
+def _build_analysis_prompts(price_data, position_data=None, account_data=None):
+    """构建系统提示词和用户提示词（数据准备阶段，不调用LLM）
     
     Args:
         price_data: 价格数据
         position_data: 可选的持仓数据（用于模拟模式）
         account_data: 可选的账户数据（用于模拟模式）
+    
+    Returns:
+        tuple: (system_prompt, user_prompt)
     """
-    # 在函数开始时初始化提示词变量（用于异常时保存）
-    system_prompt = ''
-    user_prompt = ''
-    ai_response = ''
+    # 1-2. 准备系统提示词（稳定模式下不含余额）
+    system_prompt = _build_system_prompt(account_data)
     
-    try:
-        # 1. 获取账户余额用于系统提示词
-        account_balance_for_system = None
-        if account_data is not None:
-            # 模拟模式：使用提供的账户数据
-            account_balance_for_system = float(account_data.get('balance', account_data.get('equity', 0)))
-        else:
-            # 真实模式：从交易所获取
-            try:
-                balance = exchange.fetch_balance()
-                account_balance_for_system = float(balance['USDT'].get('total', 0))
-            except Exception as e:
-                print(f"⚠️ 获取账户余额用于系统提示词失败: {e}")
-        
-        # 2. 准备系统提示词
-        system_config = _prepare_system_config(account_balance_for_system)
-        system_prompt = _builder.build_system_prompt(system_config)
-        
-        # 3. 转换币种数据
-        coin_data = _convert_price_data_to_coin_data(price_data)
-        
-        # 4. 准备用户提示词参数（传递模拟模式的数据）
-        user_params = _prepare_user_prompt_params(price_data, coin_data, position_data, account_data)
-        
-        # 4. 构建用户提示词
-        user_prompt = _builder.build_user_prompt(**user_params)
-        
-        # 5. 调用DeepSeek API
+    # 3. 转换币种数据
+    coin_data = _convert_price_data_to_coin_data(price_data)
+    
+    # 4. 准备用户提示词参数（传递模拟模式的数据）
+    user_params = _prepare_user_prompt_params(price_data, coin_data, position_data, account_data)
+    
+    # 4. 构建用户提示词
+    user_prompt = _builder.build_user_prompt(**user_params)
+    _log_prompt_tokens(system_prompt)
+    
+    return system_prompt, user_prompt
+
+
+def _json_repair_messages(ai_response):
+    """上一次回复无法解析时的追加消息：带上原回复，请求只输出修正后的JSON"""
+    return [
+        {"role": "assistant", "content": ai_response},
+        {"role": "user", "content": JSON_REPAIR_PROMPT},
+    ]
+
+
+def _retry_followup(ai_response, signals):
+    """根据失败原因生成重试时的追加消息
+
+    只有回复中没有可解析的JSON时才追加JSON修复请求；JSON可解析但字段未通过校验时
+    指出无效字段请求修正；没有具体原因时不追加消息，原样重试。
+
+    Args:
+        ai_response: 上一次回复
+        signals: 上一次回复解析出的信号列表
+    """
+    if any(signal.get('parse_failed') for signal in signals):
+        return _json_repair_messages(ai_response)
+    invalid_fields = [field for signal in signals for field in signal.get('invalid_fields', [])]
+    if invalid_fields:
+        return [
+            {"role": "assistant", "content": ai_response},
+            {"role": "user", "content": FIELD_REPAIR_PROMPT.format(fields='；'.join(invalid_fields))},
+        ]
+    return None
+
+
+def _request_completion(system_prompt, user_prompt, openers='{', followup=None):
+    """调用DeepSeek并返回回复文本
+    
+    请求经LLM调用器发出：超过对冲阈值时发出对冲请求，并以本周期截止时间为硬性预算。
+    启用流式模式（TRADE_CONFIG['llm_stream']）时边接收边解析，决策JSON完整后立即停止读取；
+    超过时间/token预算且没有得到完整JSON时抛出异常。
+    
+    Args:
+        openers: 决策JSON的起始字符（单币种为'{'，多币种为'{['）
+        followup: 追加在用户提示词之后的消息（重试时的JSON修复请求）
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ] + (followup or [])
+    
+    def request(cancel_event, timeout):
+        if stream_settings()['enabled']:
+            result = stream_completion(
+                deepseek_client, messages, openers=openers, timeout=timeout, cancel_event=cancel_event
+            )
+            if result.json_text is None and result.stop_reason in ('time_budget', 'token_budget'):
+                raise RuntimeError(f"流式回复已中止（{result.stop_reason}），未得到完整决策: {result.text[-200:]}")
+            return result.text
+        
+        # 非流式请求发出后无法中断：对冲落败时会在后台运行到返回或timeout为止
         response = deepseek_client.chat.completions.create(
             model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=messages,
             stream=False,
-            temperature=0.1
+            temperature=0.1,
+            timeout=timeout
         )
-        
-        # 6. 解析响应
-        result = response.choices[0].message.content
-        ai_response = result  # 保存响应
-        print(f"DeepSeek原始回复: {result}")
-        
-        # 提取JSON部分
-        start_idx = result.find('{')
-        end_idx = result.rfind('}') + 1
-        
-        # 解析后的信号数据
-        parsed_signal_data = None
-        
-        if start_idx != -1 and end_idx != 0:
-            json_str = result[start_idx:end_idx]
-            parsed_signal_data = safe_json_parse(json_str)
-            
-            if parsed_signal_data is None:
-                parsed_signal_data = create_fallback_signal(price_data)
-        else:
-            parsed_signal_data = create_fallback_signal(price_data)
-        
-        # 在解析后的数据中添加提示词和响应（用于后续存储）
-        parsed_signal_data['system_prompt'] = system_prompt
-        parsed_signal_data['user_prompt'] = user_prompt
-        parsed_signal_data['ai_response'] = ai_response
-        
-        signal_data = parsed_signal_data
-        
-        # 保存原始信号类型（用于验证止损止盈）
-        original_signal_type = signal_data.get('signal', '').upper() if signal_data else ''
-        
-        # 7. 适配输出格式（新格式→旧格式）
-        if signal_data:
-            # 7.1 适配signal字段：新格式可能是 "buy_to_enter" | "sell_to_enter" | "hold" | "close"
-            # 需要转换为 "BUY" | "SELL" | "HOLD" | "CLOSE"
-            if 'signal' in signal_data:
-                signal_mapping = {
-                    'buy_to_enter': 'BUY',
-                    'sell_to_enter': 'SELL',
-                    'hold': 'HOLD',
-                    'close': 'CLOSE'  # close信号需要平掉当前持仓
-                }
-                original_signal = signal_data['signal']
-                signal_data['signal'] = signal_mapping.get(original_signal.lower(), original_signal.upper())
-            
-            # 7.2 适配confidence格式：新格式是0-1浮点数，需要转换为HIGH|MEDIUM|LOW
-            if 'confidence' in signal_data:
-                conf = signal_data['confidence']
-                if isinstance(conf, (int, float)):
-                    if conf >= 0.7:
-                        signal_data['confidence'] = 'HIGH'
-                    elif conf >= 0.4:
-                        signal_data['confidence'] = 'MEDIUM'
-                    else:
-                        signal_data['confidence'] = 'LOW'
-            
-            # 7.3 适配字段名称映射（新格式→旧格式）
-            # justification → reason
-            if 'justification' in signal_data and 'reason' not in signal_data:
-                signal_data['reason'] = signal_data['justification']
-            
-            # profit_target → take_profit
-            if 'profit_target' in signal_data and 'take_profit' not in signal_data:
-                signal_data['take_profit'] = signal_data['profit_target']
+        prompt_cache_stats.record(getattr(response, 'usage', None))
+        return response.choices[0].message.content
+    
+    return llm_caller.call(request)
+
+
+def _parse_ai_response(result, price_data, system_prompt, user_prompt, record=True):
+    """解析AI回复并生成交易信号（解析阶段）
+    
+    Args:
+        result: AI回复的原始文本
+        price_data: 价格数据
+        system_prompt: 本次使用的系统提示词（随信号保存）
+        user_prompt: 本次使用的用户提示词（随信号保存）
+        record: 是否写入信号历史
+    
+    Returns:
+        dict: 交易信号数据（无法解析时为fallback信号，并带有 parse_failed=True）
+    """
+    ai_response = result
+    print(f"DeepSeek原始回复: {result}")
+    
+    # 提取第一个可解析的JSON对象
+    parsed_signal_data = extract_json(result, accept=is_decision)
+    if not isinstance(parsed_signal_data, dict):
+        print("⚠️ AI回复中没有可解析的JSON对象，使用fallback信号")
+        signal_data = _normalize_signal(create_fallback_signal(price_data), price_data, system_prompt, user_prompt,
+                                        ai_response, record)
+        signal_data['parse_failed'] = True
+        return signal_data
+    
+    return _normalize_signal(parsed_signal_data, price_data, system_prompt, user_prompt, ai_response, record)
+
+
+def _normalize_signal(parsed_signal_data, price_data, system_prompt, user_prompt, ai_response, record=True):
+    """适配信号格式、校验止损止盈并记录信号历史（单币种和多币种共用）
+    
+    Args:
+        parsed_signal_data: 从AI回复中解析出的信号字典
+        price_data: 该信号对应币种的价格数据
+        system_prompt: 本次使用的系统提示词（随信号保存）
+        user_prompt: 本次使用的用户提示词（随信号保存）
+        ai_response: AI回复的原始文本（随信号保存）
+        record: 是否写入信号历史（多模型集成时由调用方在投票后统一记录）
+    
+    Returns:
+        dict: 交易信号数据（校验失败时为fallback信号，invalid_fields 列出无效字段）
+    """
+    # 7-8. 统一新旧字段名并按schema校验（signal枚举、止损止盈数值、quantity/leverage范围）
+    signal_data, errors, warnings = validate_signal(parsed_signal_data)
+    for warning in warnings:
+        print(f"⚠️ 信号字段无效，已忽略: {warning}")
+    invalid_fields = []
+    if errors:
+        print(f"⚠️ 信号数据校验失败: {'; '.join(errors)}，使用fallback信号")
+        signal_data = create_fallback_signal(price_data)
+        invalid_fields = list(errors)
+    
+    # 8.1 验证止损和止盈价格是否合理
+    current_price = price_data['price']
+    stop_loss = signal_data.get('stop_loss')
+    take_profit = signal_data.get('take_profit')
+    
+    # 检查止损和止盈是否相同或无效
+    if stop_loss is not None and take_profit is not None:
+        # 转换为浮点数进行比较
+        try:
+            stop_loss = float(stop_loss)
+            take_profit = float(take_profit)
             
-            # 保留新格式的额外字段（quantity, leverage, coin, risk_usd, invalidation_condition）
-            # 这些字段可能在后续的交易执行逻辑中使用，所以保留它们
-            # 如果新格式有这些字段，保留在原位置
-            # 如果旧代码需要，可以从这些字段获取
-        
-        # 8. 验证必需字段（旧格式要求的字段）
-        required_fields = ['signal', 'reason', 'stop_loss', 'take_profit', 'confidence']
-        missing_fields = [f for f in required_fields if f not in signal_data]
-        
-        if missing_fields:
-            print(f"⚠️ 信号数据缺少必需字段: {missing_fields}，使用fallback信号")
-            signal_data = create_fallback_signal(price_data)
-        
-        # 8.1 验证止损和止盈价格是否合理
-        current_price = price_data['price']
-        stop_loss = signal_data.get('stop_loss')
-        take_profit = signal_data.get('take_profit')
-        
-        # 检查止损和止盈是否相同或无效
-        if stop_loss is not None and take_profit is not None:
-            # 转换为浮点数进行比较
-            try:
-                stop_loss = float(stop_loss)
-                take_profit = float(take_profit)
-                
-                # 如果止损和止盈相同，或者都等于当前价格，需要修正
-                if abs(stop_loss - take_profit) < 0.01 or abs(stop_loss - current_price) < 0.01 or abs(take_profit - current_price) < 0.01:
-                    # 使用原始信号类型（在映射之前保存的）
-                    if original_signal_type in ['CLOSE', 'CLOSE_POSITION']:
-                        # CLOSE信号：修正止损和止盈，但保留原始信号意图
-                        print(f"⚠️ CLOSE信号的止损({stop_loss})和止盈({take_profit})价格相同，修正为合理值")
-                        signal_data['stop_loss'] = current_price * 0.98  # -2%
-                        signal_data['take_profit'] = current_price * 1.02  # +2%
-                        print(f"✅ 已修正：止损={signal_data['stop_loss']:.2f}, 止盈={signal_data['take_profit']:.2f}（保留CLOSE信号意图）")
-                    else:
-                        # 其他信号：使用fallback逻辑
-                        print(f"⚠️ 止损({stop_loss})和止盈({take_profit})价格相同或等于当前价格({current_price})，使用fallback逻辑")
-                        signal_data = create_fallback_signal(price_data)
+            # 如果止损和止盈相同，或者都等于当前价格，需要修正
+            if abs(stop_loss - take_profit) < 0.01 or abs(stop_loss - current_price) < 0.01 or abs(take_profit - current_price) < 0.01:
+                if signal_data['signal'] == 'CLOSE':
+                    # CLOSE信号：修正止损和止盈，但保留原始信号意图
+                    print(f"⚠️ CLOSE信号的止损({stop_loss})和止盈({take_profit})价格相同，修正为合理值")
+                    signal_data['stop_loss'] = current_price * 0.98  # -2%
+                    signal_data['take_profit'] = current_price * 1.02  # +2%
+                    print(f"✅ 已修正：止损={signal_data['stop_loss']:.2f}, 止盈={signal_data['take_profit']:.2f}（保留CLOSE信号意图）")
                 else:
-                    # 确保止损和止盈相对于当前价格的方向正确
-                    # 对于做多：止损应该低于当前价格，止盈应该高于当前价格
-                    # 对于做空：止损应该高于当前价格，止盈应该低于当前价格
-                    signal_type = signal_data.get('signal', '').upper()
-                    if signal_type in ['BUY', 'BUY_TO_ENTER']:
-                        # 做多信号：止损应该 < 当前价格 < 止盈
-                        if stop_loss >= current_price or take_profit <= current_price:
-                            print(f"⚠️ 做多信号的止损/止盈方向不正确，调整中...")
-                            # 修正止损（当前价格的-2%）
-                            signal_data['stop_loss'] = current_price * 0.98
-                            # 修正止盈（当前价格的+2%）
-                            signal_data['take_profit'] = current_price * 1.02
-                            print(f"✅ 已修正：止损={signal_data['stop_loss']:.2f}, 止盈={signal_data['take_profit']:.2f}")
-                    elif signal_type in ['SELL', 'SELL_TO_ENTER']:
-                        # 做空信号：止损应该 > 当前价格 > 止盈
-                        if stop_loss <= current_price or take_profit >= current_price:
-                            print(f"⚠️ 做空信号的止损/止盈方向不正确，调整中...")
-                            # 修正止损（当前价格的+2%）
-                            signal_data['stop_loss'] = current_price * 1.02
-                            # 修正止盈（当前价格的-2%）
-                            signal_data['take_profit'] = current_price * 0.98
-                            print(f"✅ 已修正：止损={signal_data['stop_loss']:.2f}, 止盈={signal_data['take_profit']:.2f}")
-                    else:
-                        # HOLD或CLOSE信号：对于HOLD/CLOSE，止损止盈可能不需要，但确保它们不同
-                        if abs(stop_loss - take_profit) < 0.01:
-                            # 如果HOLD/CLOSE信号中止损止盈相同，使用fallback逻辑生成合理的值
-                            print(f"⚠️ HOLD/CLOSE信号的止损和止盈相同，使用fallback逻辑")
-                            signal_data = create_fallback_signal(price_data)
-            except (ValueError, TypeError) as e:
-                print(f"⚠️ 止损/止盈价格格式错误: {e}，使用fallback信号")
-                signal_data = create_fallback_signal(price_data)
-        
-        # 9. 保存信号到历史记录
-        signal_data['timestamp'] = price_data['timestamp']
-        signal_history.append(signal_data)
-        if len(signal_history) > 30:
-            signal_history.pop(0)
+                    # 其他信号：使用fallback逻辑
+                    print(f"⚠️ 止损({stop_loss})和止盈({take_profit})价格相同或等于当前价格({current_price})，使用fallback逻辑")
+                    signal_data = create_fallback_signal(price_data)
+                    invalid_fields.append(f"stop_loss/take_profit: 止损({stop_loss})和止盈({take_profit})"
+                                          f"不能相同或等于当前价格({current_price})")
+            else:
+                # 确保止损和止盈相对于当前价格的方向正确
+                # 对于做多：止损应该低于当前价格，止盈应该高于当前价格
+                # 对于做空：止损应该高于当前价格，止盈应该低于当前价格
+                signal_type = signal_data.get('signal', '').upper()
+                if signal_type in ['BUY', 'BUY_TO_ENTER']:
+                    # 做多信号：止损应该 < 当前价格 < 止盈
+                    if stop_loss >= current_price or take_profit <= current_price:
+                        print(f"⚠️ 做多信号的止损/止盈方向不正确，调整中...")
+                        # 修正止损（当前价格的-2%）
+                        signal_data['stop_loss'] = current_price * 0.98
+                        # 修正止盈（当前价格的+2%）
+                        signal_data['take_profit'] = current_price * 1.02
+                        print(f"✅ 已修正：止损={signal_data['stop_loss']:.2f}, 止盈={signal_data['take_profit']:.2f}")
+                elif signal_type in ['SELL', 'SELL_TO_ENTER']:
+                    # 做空信号：止损应该 > 当前价格 > 止盈
+                    if stop_loss <= current_price or take_profit >= current_price:
+                        print(f"⚠️ 做空信号的止损/止盈方向不正确，调整中...")
+                        # 修正止损（当前价格的+2%）
+                        signal_data['stop_loss'] = current_price * 1.02
+                        # 修正止盈（当前价格的-2%）
+                        signal_data['take_profit'] = current_price * 0.98
+                        print(f"✅ 已修正：止损={signal_data['stop_loss']:.2f}, 止盈={signal_data['take_profit']:.2f}")
+                else:
+                    # HOLD或CLOSE信号：对于HOLD/CLOSE，止损止盈可能不需要，但确保它们不同
+                    if abs(stop_loss - take_profit) < 0.01:
+                        # 如果HOLD/CLOSE信号中止损止盈相同，使用fallback逻辑生成合理的值
+                        print(f"⚠️ HOLD/CLOSE信号的止损和止盈相同，使用fallback逻辑")
+                        signal_data = create_fallback_signal(price_data)
+                        invalid_fields.append(f"stop_loss/take_profit: 止损和止盈不能相同({stop_loss})")
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ 止损/止盈价格格式错误: {e}，使用fallback信号")
+            signal_data = create_fallback_signal(price_data)
+            invalid_fields.append(f"stop_loss/take_profit: 价格格式错误({e})")
+    
+    if invalid_fields:
+        signal_data['invalid_fields'] = invalid_fields
+    # 添加提示词和响应（用于后续存储）
+    signal_data['system_prompt'] = system_prompt
+    signal_data['user_prompt'] = user_prompt
+    signal_data['ai_response'] = ai_response
+    signal_data['timestamp'] = price_data['timestamp']
+    if record:
+        _record_signal_history(signal_data)
+    return signal_data
+
+
+def _record_signal_history(signal_data):
+    """保存信号到历史记录并打印信号统计"""
+    # 9. 保存信号到历史记录
+    signal_history.append(signal_data)
+    if len(signal_history) > 30:
+        signal_history.pop(0)
+    
+    # 10. 信号统计
+    signal_count = len([s for s in signal_history if s.get('signal') == signal_data['signal']])
+    total_signals = len(signal_history)
+    print(f"信号统计: {signal_data['signal']} (最近{total_signals}次中出现{signal_count}次)")
+    
+    # 11. 信号连续性检查
+    if len(signal_history) >= 3:
+        last_three = [s['signal'] for s in signal_history[-3:]]
+        if len(set(last_three)) == 1:
+            print(f"⚠️ 注意：连续3次{signal_data['signal']}信号")
+
+
+def _build_universe_prompts(price_data_map, positions_map=None):
+    """构建多币种提示词：所有币种的数据区块放入同一个用户提示词
+    
+    Args:
+        price_data_map: 交易对 -> 价格数据
+        positions_map: 交易对 -> 持仓（无持仓为None）
+    
+    Returns:
+        tuple: (system_prompt, user_prompt)
+    """
+    symbols = list(price_data_map)
+    positions_map = positions_map or {}
+    
+    # 1. 系统提示词（AssetUniverse列出所有币种）
+    system_prompt = _build_system_prompt(symbols=symbols)
+    
+    # 2. 每个币种一个数据区块
+    coins_data = [_convert_price_data_to_coin_data(price_data_map[symbol]) for symbol in symbols]
+    
+    # 3. 统计、持仓和账户信息
+    elapsed, invocation_count = _update_invocation_stats(os.getenv('TEST_MODE', 'false').lower() == 'true')
+    positions = [
+        _format_position(position, price_data_map[symbol]['price'])
+        for symbol, position in positions_map.items()
+        if position and symbol in price_data_map
+    ]
+    available_cash, current_account_value, current_total_return_percent = _get_account_summary()
+    
+    # 4. 用户提示词 + 多币种输出格式
+    user_prompt = _builder.build_user_prompt(
+        minutes_elapsed=int(elapsed),
+        current_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        invocation_count=invocation_count,
+        coins_data=coins_data,
+        current_total_return_percent=current_total_return_percent,
+        available_cash=available_cash,
+        current_account_value=current_account_value,
+        positions=positions,
+    )
+    user_prompt += '\n\n' + _builder.build_universe_section([coin['symbol'] for coin in coins_data])
+    _log_prompt_tokens(system_prompt)
+    
+    return system_prompt, user_prompt
+
+
+def _extract_universe_decisions(result):
+    """从AI回复中提取多币种决策列表（支持JSON数组、{"decisions": [...]} 或单个JSON对象）"""
+    parsed = extract_json(result, openers='{[', accept=is_decision)
+    
+    if isinstance(parsed, dict):
+        parsed = parsed.get('decisions', [parsed])
+    if not isinstance(parsed, list):
+        return []
+    return [decision for decision in parsed if isinstance(decision, dict)]
+
+
+def _parse_universe_response(result, price_data_map, system_prompt, user_prompt):
+    """解析多币种AI回复，按交易对返回信号（缺少决策的币种使用fallback信号）
+    
+    Returns:
+        dict: 交易对 -> 交易信号数据
+    """
+    print(f"DeepSeek原始回复: {result}")
+    decisions = _extract_universe_decisions(result)
+    
+    by_coin = {}
+    for decision in decisions:
+        coin = str(decision.get('coin', '')).upper()
+        if coin and coin not in by_coin:
+            by_coin[coin] = decision
+    # 只有一个币种且AI未填写coin字段时，直接使用该决策
+    if len(price_data_map) == 1 and not by_coin and len(decisions) == 1:
+        by_coin[next(iter(price_data_map)).split('/')[0]] = decisions[0]
+    
+    signals = {}
+    for symbol, price_data in price_data_map.items():
+        coin = symbol.split('/')[0]
+        decision = by_coin.get(coin)
+        if decision is None:
+            print(f"⚠️ AI回复中缺少{coin}的决策，使用fallback信号")
+            decision = create_fallback_signal(price_data)
+        signal_data = _normalize_signal(dict(decision), price_data, system_prompt, user_prompt, result)
+        if not decisions:
+            signal_data['parse_failed'] = True
+        elif decision.get('is_fallback'):
+            signal_data['invalid_fields'] = [f"{coin}: 缺少该币种的决策"]
+        elif signal_data.get('invalid_fields'):
+            signal_data['invalid_fields'] = [f"{coin} {field}" for field in signal_data['invalid_fields']]
+        signals[symbol] = signal_data
+    return signals
+
+
+def analyze_universe_with_deepseek(price_data_map, positions_map=None, max_retries=2):
+    """多币种分析：一次DeepSeek请求返回所有币种的交易信号（带重试）
+    
+    Args:
+        price_data_map: 交易对 -> 价格数据
+        positions_map: 交易对 -> 持仓（无持仓为None）
+        max_retries: 最大尝试次数
+    
+    Returns:
+        dict: 交易对 -> 交易信号数据
+    """
+    system_prompt = ''
+    user_prompt = ''
+    ai_response = ''
+    
+    try:
+        system_prompt, user_prompt = _build_universe_prompts(price_data_map, positions_map)
+    except Exception as e:
+        print(f"构建多币种提示词失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return {symbol: create_fallback_signal(price_data) for symbol, price_data in price_data_map.items()}
+    
+    followup = None
+    for attempt in range(max_retries):
+        try:
+            ai_response = _request_completion(system_prompt, user_prompt, openers='{[', followup=followup)
+            signals = _parse_universe_response(ai_response, price_data_map, system_prompt, user_prompt)
+            if not all(signal.get('is_fallback', False) for signal in signals.values()):
+                return signals
+            # 下一次复用提示词：无法解析时追加JSON修复请求，字段无效时指出无效字段
+            followup = _retry_followup(ai_response, signals.values())
+            print(f"第{attempt + 1}次尝试失败，{'请求修正后' if followup else ''}重试...")
+        except Exception as e:
+            ai_response = f"API调用异常: {str(e)}"
+            print(f"第{attempt + 1}次尝试异常: {e}")
         
-        # 10. 信号统计
-        signal_count = len([s for s in signal_history if s.get('signal') == signal_data['signal']])
-        total_signals = len(signal_history)
-        print(f"信号统计: {signal_data['signal']} (最近{total_signals}次中出现{signal_count}次)")
+        if attempt < max_retries - 1:
+            if not llm_caller.has_budget():
+                print("⏱️ 本周期剩余时间不足，停止重试")
+                break
+    
+    signals = {}
+    for symbol, price_data in price_data_map.items():
+        fallback_signal = create_fallback_signal(price_data)
+        fallback_signal['system_prompt'] = system_prompt
+        fallback_signal['user_prompt'] = user_prompt
+        fallback_signal['ai_response'] = ai_response
+        signals[symbol] = fallback_signal
+    return signals
+
+
+def analyze_with_deepseek(price_data, position_data=None, account_data=None):
+    """使用DeepSeek分析市场并生成交易信号（使用新模板系统）
+    
+    Args:
+        price_data: 价格数据
+        position_data: 可选的持仓数据（用于模拟模式）
+        account_data: 可选的账户数据（用于模拟模式）
+    """
+    # 在函数开始时初始化提示词变量（用于异常时保存）
+    system_prompt = ''
+    user_prompt = ''
+    ai_response = ''
+    
+    try:
+        # 1-4. 准备数据并构建提示词
+        system_prompt, user_prompt = _build_analysis_prompts(price_data, position_data, account_data)
         
-        # 11. 信号连续性检查
-        if len(signal_history) >= 3:
-            last_three = [s['signal'] for s in signal_history[-3:]]
-            if len(set(last_three)) == 1:
-                print(f"⚠️ 注意：连续3次{signal_data['signal']}信号")
+        # 5. 调用DeepSeek API（流式模式下决策JSON完整后立即停止读取）
+        ai_response = _request_completion(system_prompt, user_prompt)
         
-        return signal_data
+        # 6-11. 解析响应并生成信号
+        return _parse_ai_response(ai_response, price_data, system_prompt, user_prompt)
         
     except Exception as e:
         print(f"DeepSeek分析失败: {e}")
@@ -612,52 +880,49 @@ def analyze_with_deepseek(price_data, position_data=None, account_data=None):
 def analyze_with_deepseek_with_retry(price_data, max_retries=2, position_data=None, account_data=None):
     """带重试的DeepSeek分析
     
+    提示词只构建一次（余额、行情、持仓只获取一次，调用统计只累计一次），重试时直接复用；
+    上一次回复无法解析时追加JSON修复请求，而不是重新提问。
+    
     Args:
         price_data: 价格数据
-        max_retries: 最大重试次数
+        max_retries: 最大尝试次数
         position_data: 可选的持仓数据（用于模拟模式）
         account_data: 可选的账户数据（用于模拟模式）
     """
-    # 保存最后一次的提示词（用于fallback时保存）
-    last_system_prompt = None
-    last_user_prompt = None
-    last_ai_response = None
+    system_prompt = ''
+    user_prompt = ''
+    ai_response = ''
     
+    try:
+        system_prompt, user_prompt = _build_analysis_prompts(price_data, position_data, account_data)
+    except Exception as e:
+        print(f"构建提示词失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return create_fallback_signal(price_data)
+    
+    followup = None
     for attempt in range(max_retries):
         try:
-            signal_data = analyze_with_deepseek(price_data, position_data, account_data)
-            
-            # 保存提示词和响应（即使是fallback也保存）
-            if signal_data:
-                last_system_prompt = signal_data.get('system_prompt', '')
-                last_user_prompt = signal_data.get('user_prompt', '')
-                last_ai_response = signal_data.get('ai_response', '')
-            
-            if signal_data and not signal_data.get('is_fallback', False):
+            ai_response = _request_completion(system_prompt, user_prompt, followup=followup)
+            signal_data = _parse_ai_response(ai_response, price_data, system_prompt, user_prompt)
+            if not signal_data.get('is_fallback', False):
                 return signal_data
-            
-            print(f"第{attempt + 1}次尝试失败，进行重试...")
-            import time
-            time.sleep(1)
-            
+            # 下一次复用提示词：无法解析时追加JSON修复请求，字段无效时指出无效字段
+            followup = _retry_followup(ai_response, [signal_data])
+            print(f"第{attempt + 1}次尝试失败，{'请求修正后' if followup else ''}重试...")
         except Exception as e:
+            ai_response = f"API调用异常: {str(e)}"
             print(f"第{attempt + 1}次尝试异常: {e}")
-            if attempt == max_retries - 1:
-                fallback_signal = create_fallback_signal(price_data)
-                # 即使是fallback也尝试保存提示词（如果之前有）
-                if last_system_prompt or last_user_prompt or last_ai_response:
-                    fallback_signal['system_prompt'] = last_system_prompt or ''
-                    fallback_signal['user_prompt'] = last_user_prompt or ''
-                    fallback_signal['ai_response'] = last_ai_response or ''
-                return fallback_signal
-            import time
-            time.sleep(1)
-    
-    # 最后一次尝试失败
+        
+        if attempt < max_retries - 1:
+            if not llm_caller.has_budget():
+                print("⏱️ 本周期剩余时间不足，停止重试")
+                break
+    
+    # 所有尝试都失败：保存提示词和最后一次回复
     fallback_signal = create_fallback_signal(price_data)
-    # 尝试保存最后一次的提示词（如果存在）
-    if last_system_prompt or last_user_prompt or last_ai_response:
-        fallback_signal['system_prompt'] = last_system_prompt or ''
-        fallback_signal['user_prompt'] = last_user_prompt or ''
-        fallback_signal['ai_response'] = last_ai_response or ''
+    fallback_signal['system_prompt'] = system_prompt
+    fallback_signal['user_prompt'] = user_prompt
+    fallback_signal['ai_response'] = ai_response
     return fallback_signal
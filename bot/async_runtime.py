@@ -0,0 +1,436 @@
+"""异步运行时模块 - 基于asyncio的交易主循环
+
+与 bot.trading_bot.main / bot_sim.trading_bot.main 功能相同，但行情和账户读取使用
+ccxt.async_support，DeepSeek调用使用AsyncOpenAI，所有请求作为协程并发执行，
+等待整点、超时和取消都由事件循环统一管理。下单和数据库写入复用同步实现，
+在线程中执行，不阻塞事件循环。
+
+通过环境变量 ASYNC_MODE=true 从 deepseekok2.py 启用。
+"""
+import asyncio
+import os
+import sqlite3
+from datetime import datetime
+
+import ccxt.async_support as ccxt_async
+from openai import AsyncOpenAI
+
+from .config import exchange, TRADE_CONFIG
+from .candle_store import candle_store
+from .cycle_context import cycle_context
+from .decision_cache import decision_cache
+from .llm_stream import astream_completion, stream_settings, prompt_cache_stats
+from .llm_caller import llm_caller
+from .market_data import _build_price_data
+from .position_manager import get_current_position
+from .timeframe_cache import timeframe_cache
+from .universe import get_universe_symbols
+from .ai_analyzer import (
+    _build_analysis_prompts,
+    _parse_ai_response,
+    _retry_followup,
+    _get_oi_and_funding_rate,
+    _get_4h_data
+)
+from .ensemble import ensemble_enabled, analyze_with_ensemble
+from .utils import wait_for_next_period, create_fallback_signal
+
+
+def _create_async_exchange(authenticated=True):
+    """创建异步OKX交易所实例（配置与bot.config.exchange一致）"""
+    config = {
+        'options': {
+            'defaultType': 'swap',
+        },
+    }
+    if authenticated:
+        config.update({
+            'apiKey': os.getenv('OKX_API_KEY'),
+            'secret': os.getenv('OKX_SECRET'),
+            'password': os.getenv('OKX_PASSWORD'),
+        })
+    return ccxt_async.okx(config)
+
+
+def _create_async_llm_client():
+    """创建异步DeepSeek客户端"""
+    return AsyncOpenAI(
+        api_key=os.getenv('DEEPSEEK_API_KEY'),
+        base_url=os.getenv('DEEPSEEK_BASE_URL', "https://api.deepseek.com")
+    )
+
+
+async def _sync_candles(aexchange, symbol, timeframe, limit):
+    """异步增量同步K线（与CandleStore.sync逻辑一致）"""
+    since, forming_open, tf_ms = await asyncio.to_thread(
+        candle_store.plan_sync, symbol, timeframe, limit, aexchange.milliseconds()
+    )
+
+    fetched = 0
+    for _ in range(candle_store.MAX_PAGES):
+        batch = await aexchange.fetch_ohlcv(symbol, timeframe, since=since, limit=candle_store.PAGE_LIMIT)
+        if not batch:
+            break
+        await asyncio.to_thread(candle_store.upsert, symbol, timeframe, batch)
+        fetched += len(batch)
+        if len(batch) < candle_store.PAGE_LIMIT or batch[-1][0] >= forming_open:
+            break
+        since = batch[-1][0] + tf_ms
+
+    print(f"✓ K线增量同步: 新拉取 {fetched} 条记录 ({symbol} {timeframe})")
+    return await asyncio.to_thread(candle_store.load, symbol, timeframe, limit)
+
+
+async def _fetch_ohlcv(aexchange):
+    """异步获取K线：优先从本地K线存储增量同步，存储不可用时回退为全量拉取"""
+    symbol = TRADE_CONFIG['symbol']
+    timeframe = TRADE_CONFIG['timeframe']
+    limit = TRADE_CONFIG['data_points']
+    if TRADE_CONFIG.get('candle_store', {}).get('enabled', True):
+        try:
+            return await _sync_candles(aexchange, symbol, timeframe, limit)
+        except sqlite3.Error as e:
+            print(f"⚠️ 本地K线存储不可用，改为全量拉取: {e}")
+    return await aexchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+
+
+async def _fetch_price_data(aexchange, apublic):
+    """异步获取K线并计算技术指标（认证接口失败时改用公共接口）"""
+    try:
+        ohlcv = await _fetch_ohlcv(aexchange)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"⚠️ 认证API获取K线失败（{e}），尝试使用公共API...")
+        ohlcv = await _fetch_ohlcv(apublic)
+    if not ohlcv:
+        raise ValueError("未能获取K线数据")
+    print(f"✓ K线数据获取成功: {len(ohlcv)} 条记录")
+    # 指标计算是CPU密集的pandas运算，放到线程中避免阻塞事件循环
+    return await asyncio.to_thread(_build_price_data, ohlcv)
+
+
+async def _gather_cycle_data(aexchange, apublic, simulation=False):
+    """并发获取本周期所需的全部数据，并填入周期上下文供后续模块复用
+
+    Returns:
+        dict: price_data 以及 balance/positions 等原始结果，失败或超时的请求为None
+    """
+    symbol = TRADE_CONFIG['symbol']
+    timeout = TRADE_CONFIG.get('fetch_timeout_seconds', 10)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    requests = {
+        'price_data': _fetch_price_data(aexchange, apublic),
+        'ticker': apublic.fetch_ticker(symbol),
+        'funding_rate': apublic.fetch_funding_rate(symbol),
+        # 4h已收盘K线缓存基于同步交易所实例，在线程中预取
+        '4h': asyncio.to_thread(timeframe_cache.prefetch, exchange, symbol, '4h', 60),
+    }
+    if not simulation:
+        requests['balance'] = aexchange.fetch_balance()
+        requests['positions'] = aexchange.fetch_positions([symbol])
+
+    names = list(requests)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(coro, timeout) for coro in requests.values()),
+        return_exceptions=True
+    )
+
+    data = {}
+    failed = set()
+    for name, result in zip(names, results):
+        if isinstance(result, asyncio.TimeoutError):
+            print(f"⚠️ 异步请求 {name} 失败: 超时（>{timeout}秒）")
+            failed.add(name)
+            result = None
+        elif isinstance(result, Exception):
+            print(f"⚠️ 异步请求 {name} 失败: {result}")
+            failed.add(name)
+            result = None
+        data[name] = result
+    print(f"⚡ 异步并发获取市场数据: 总耗时 {loop.time() - started:.2f}s")
+
+    # 已获取的数据填入周期上下文，后续同步代码读取时不再请求交易所
+    if data.get('ticker') is not None:
+        cycle_context.seed('ticker', data['ticker'], symbol)
+    if data.get('funding_rate') is not None:
+        cycle_context.seed('funding_rate', data['funding_rate'], symbol)
+    if data.get('balance') is not None:
+        cycle_context.seed('balance', data['balance'])
+    if data.get('positions') is not None:
+        cycle_context.seed('positions', data['positions'], [symbol])
+
+    price_data = data['price_data']
+    if price_data:
+        price_data['oi_data'] = _get_oi_and_funding_rate(symbol)
+        if '4h' not in failed:
+            # 4h已收盘K线已预取，未收盘K线用3m K线在本地重采样
+            price_data['data_4h'] = await asyncio.to_thread(
+                _get_4h_data, symbol, price_data.get('full_data')
+            )
+    return data
+
+
+async def _request_completion_async(aclient, system_prompt, user_prompt, timeout=None, followup=None):
+    """异步调用DeepSeek并返回回复文本（流式模式下决策JSON完整后立即停止读取）"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ] + (followup or [])
+    if stream_settings()['enabled']:
+        result = await astream_completion(aclient, messages, timeout=timeout)
+        if result.json_text is None and result.stop_reason in ('time_budget', 'token_budget'):
+            raise RuntimeError(f"流式回复已中止（{result.stop_reason}），未得到完整决策: {result.text[-200:]}")
+        return result.text
+
+    response = await asyncio.wait_for(
+        aclient.chat.completions.create(
+            model="deepseek-chat",
+            messages=messages,
+            stream=False,
+            temperature=0.1
+        ),
+        timeout
+    )
+    prompt_cache_stats.record(getattr(response, 'usage', None))
+    return response.choices[0].message.content
+
+
+async def analyze_with_deepseek_async(aclient, price_data, position_data=None, account_data=None, max_retries=2):
+    """异步DeepSeek分析（带重试和超时），提示词只构建一次，重试时复用
+
+    Args:
+        aclient: AsyncOpenAI客户端
+        price_data: 价格数据
+        position_data: 可选的持仓数据（用于模拟模式）
+        account_data: 可选的账户数据（用于模拟模式）
+        max_retries: 最大尝试次数
+    """
+    if ensemble_enabled():
+        # 多模型集成在线程池中并发调用各模型
+        return await asyncio.to_thread(analyze_with_ensemble, price_data, position_data, account_data)
+
+    timeout = TRADE_CONFIG.get('llm_timeout_seconds', 60)
+    system_prompt = ''
+    user_prompt = ''
+    ai_response = ''
+
+    try:
+        system_prompt, user_prompt = await asyncio.to_thread(
+            _build_analysis_prompts, price_data, position_data, account_data
+        )
+    except Exception as e:
+        print(f"构建提示词失败: {e}")
+        return create_fallback_signal(price_data)
+
+    followup = None
+    for attempt in range(max_retries):
+        try:
+            # 对冲请求 + 本周期截止时间（单个请求不超过llm_timeout_seconds）
+            ai_response = await llm_caller.acall(
+                lambda timeout: _request_completion_async(aclient, system_prompt, user_prompt, timeout, followup)
+            )
+            signal_data = _parse_ai_response(ai_response, price_data, system_prompt, user_prompt)
+            if not signal_data.get('is_fallback', False):
+                return signal_data
+            # 下一次复用提示词：无法解析时追加JSON修复请求，字段无效时指出无效字段
+            followup = _retry_followup(ai_response, [signal_data])
+            print(f"第{attempt + 1}次尝试失败，{'请求修正后' if followup else ''}重试...")
+        except asyncio.TimeoutError:
+            ai_response = f"API调用超时（>{timeout}秒）"
+            print(f"第{attempt + 1}次尝试超时（>{timeout}秒）")
+        except Exception as e:
+            ai_response = f"API调用异常: {str(e)}"
+            print(f"第{attempt + 1}次尝试异常: {e}")
+
+        if attempt < max_retries - 1:
+            if not llm_caller.has_budget():
+                print("⏱️ 本周期剩余时间不足，停止重试")
+                break
+
+    fallback_signal = create_fallback_signal(price_data)
+    fallback_signal['system_prompt'] = system_prompt
+    fallback_signal['user_prompt'] = user_prompt
+    fallback_signal['ai_response'] = ai_response
+    return fallback_signal
+
+
+async def _in_thread(pending, func, *args):
+    """在线程中执行同步函数
+
+    线程无法被取消：周期超时取消协程后线程仍会运行到结束，登记到pending，
+    结束周期（清理周期缓存）前必须等待这些线程。
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    pending.append(task)
+    return await asyncio.shield(task)
+
+
+async def _prepare_cycle(aexchange, apublic, aclient, simulation, pending):
+    """获取数据并完成AI分析（受周期超时限制）
+
+    Returns:
+        tuple: (执行函数, 参数) - 由调用方在超时之外执行；获取K线失败时返回None
+    """
+    tag = "[模拟] " if simulation else ""
+
+    # 1. 并发获取K线、账户、持仓、OI/资金费率和4h数据
+    data = await _gather_cycle_data(aexchange, apublic, simulation)
+    price_data = data['price_data']
+    if not price_data:
+        print(f"{tag}❌ 获取K线数据失败，跳过本次执行")
+        return None
+
+    print(f"{tag}BTC当前价格: ${price_data['price']:,.2f}")
+    print(f"{tag}数据周期: {TRADE_CONFIG['timeframe']}")
+    print(f"{tag}价格变化: {price_data['price_change']:+.2f}%")
+
+    if simulation:
+        from bot_sim import trading_bot as sim_bot
+
+        # 2-3. 模拟账户和持仓（从数据库）
+        current_position, position_info, sim_account_info = await _in_thread(
+            pending, sim_bot._get_sim_account_state, price_data
+        )
+        # 4. 使用DeepSeek分析
+        signal_data = decision_cache.lookup(price_data, position_info)
+        if signal_data is None:
+            signal_data = await analyze_with_deepseek_async(
+                aclient, price_data, position_data=position_info, account_data=sim_account_info
+            )
+            decision_cache.record(price_data, position_info, signal_data)
+        if signal_data.get('is_fallback', False):
+            print("[模拟] ⚠️ 使用备用交易信号")
+        # 5-7. 保存记录、执行模拟交易、更新状态
+        return sim_bot._record_and_execute, (signal_data, price_data, current_position)
+
+    from . import trading_bot as live_bot
+
+    # 2. 账户信息
+    try:
+        balance = data.get('balance') or await aexchange.fetch_balance()
+        account_info = live_bot._build_account_info(balance)
+    except Exception as e:
+        print(f"获取账户信息失败: {e}")
+        account_info = None
+
+    # 3. 当前持仓（读取已填入周期上下文的持仓，不再请求交易所）
+    current_position = await _in_thread(pending, get_current_position)
+    position_info = live_bot._build_position_info(current_position)
+
+    # 4. 使用DeepSeek分析
+    signal_data = decision_cache.lookup(price_data, position_info)
+    if signal_data is None:
+        signal_data = await analyze_with_deepseek_async(aclient, price_data)
+        decision_cache.record(price_data, position_info, signal_data)
+    if signal_data.get('is_fallback', False):
+        print("⚠️ 使用备用交易信号")
+
+    # 5-7. 保存记录、更新状态、执行交易（下单使用同步交易所实例，在线程中执行）
+    return live_bot._record_and_execute, (signal_data, price_data, account_info, current_position, position_info)
+
+
+async def run_trading_cycle(aexchange, apublic, aclient, simulation=False, timeout=None):
+    """执行一个交易周期：获取数据 → AI分析 → 保存记录 → 执行交易
+
+    Args:
+        timeout: 获取数据和AI分析阶段的超时（秒）；执行阶段已开始下单，不设超时，必须等待完成
+    """
+    tag = "[模拟] " if simulation else ""
+    print("\n" + "=" * 60)
+    print(f"{tag}执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    cycle_context.begin()
+    pending = []
+    try:
+        symbols = get_universe_symbols()
+        if not simulation and len(symbols) > 1:
+            # 多币种模式：批量行情 + 一次AI分析，在线程中复用同步实现
+            # 线程内包含下单，不能超时取消（AI调用已受周期截止时间限制）
+            from . import trading_bot as live_bot
+            return await asyncio.to_thread(live_bot._run_universe_cycle, symbols) is not False
+
+        try:
+            prepared = await asyncio.wait_for(
+                _prepare_cycle(aexchange, apublic, aclient, simulation, pending),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"{tag}⚠️ 获取数据和AI分析超过{timeout:.0f}秒，已取消本次执行（未下单）")
+            return False
+        if prepared is None:
+            return False
+
+        execute, args = prepared
+        await asyncio.to_thread(execute, *args)
+        return True
+    finally:
+        # 超时取消后仍在运行的线程会读取/失效周期缓存，等待结束后才能清理
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        cycle_context.end()
+
+
+async def run(simulation=False):
+    """异步主循环：在每个整点执行一个交易周期，直到被取消"""
+    tag = "[模拟] " if simulation else ""
+    interval = TRADE_CONFIG['interval_minutes']
+
+    if simulation:
+        from bot_sim.trading_bot import _initialize
+        await asyncio.to_thread(_initialize)
+    else:
+        from .trading_bot import _initialize
+        if not await asyncio.to_thread(_initialize):
+            return
+
+    aexchange = _create_async_exchange()
+    apublic = _create_async_exchange(authenticated=False)
+    aclient = _create_async_llm_client()
+    print(f"{tag}⚡ 异步运行时已启动，执行频率: 每{interval}分钟整点执行")
+
+    try:
+        while True:
+            wait_seconds = wait_for_next_period(interval)
+            if wait_seconds > 0:
+                print(f"{tag}⏰ 等待 {wait_seconds} 秒到下一个整点...")
+                await asyncio.sleep(wait_seconds)
+
+            try:
+                # 获取数据和AI分析不能超过一个执行间隔，避免与下一个周期重叠
+                result = await run_trading_cycle(aexchange, apublic, aclient, simulation, timeout=interval * 60)
+            except Exception as e:
+                print(f"{tag}交易机器人执行异常: {e}")
+                import traceback
+                traceback.print_exc()
+                result = False
+
+            if result is not False:
+                print(f"{tag}✅ 本次交易分析执行完成，等待下一次执行...")
+            else:
+                print(f"{tag}⚠️ 本次执行失败，等待5分钟后重试...")
+                await asyncio.sleep(300)
+    finally:
+        await asyncio.gather(aexchange.close(), apublic.close(), aclient.close(), return_exceptions=True)
+        print(f"{tag}异步运行时已停止，连接已关闭")
+
+
+def main(simulation=None):
+    """异步运行时入口
+
+    Args:
+        simulation: 是否模拟交易，默认读取TEST_MODE环境变量
+    """
+    if simulation is None:
+        simulation = os.getenv('TEST_MODE', 'false').lower() == 'true'
+    try:
+        asyncio.run(run(simulation))
+    except KeyboardInterrupt:
+        print("收到中断信号，异步运行时退出")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""K线本地存储模块 - 基于SQLite的增量K线缓存
+
+以 (symbol, timeframe, ts) 为主键持久化K线，每个周期只向交易所请求
+最后一根已存储K线之后的数据（since=），并自动补齐窗口内缺失的K线。
+"""
+import os
+import sqlite3
+import threading
+import ccxt
+
+
+class CandleStore:
+    """增量K线存储"""
+
+    # 单次请求的K线数量（OKX历史K线接口单次最多返回100根）
+    PAGE_LIMIT = 100
+    # 单次同步最多翻页次数，防止异常情况下无限循环
+    MAX_PAGES = 50
+
+    def __init__(self, db_path: str = "data/market_data.db"):
+        self.db_path = db_path
+        self.data_dir = os.path.dirname(db_path) if os.path.dirname(db_path) else "data"
+        # 数据目录和K线表在首次访问时创建（导入模块时不产生文件）
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _get_connection(self):
+        """获取数据库连接（首次调用时创建数据目录和K线表）"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(self.data_dir, exist_ok=True)
+                    self._init_database()
+                    self._initialized = True
+        return sqlite3.connect(self.db_path)
+
+    def _init_database(self):
+        """初始化K线表结构"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS candles (
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                PRIMARY KEY (symbol, timeframe, ts)
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        conn.close()
+
+    def upsert(self, symbol, timeframe, ohlcv):
+        """写入K线（已存在的K线会被覆盖，用于刷新未收盘的K线）"""
+        if not ohlcv:
+            return
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO candles (symbol, timeframe, ts, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(symbol, timeframe, int(c[0]), c[1], c[2], c[3], c[4], c[5]) for c in ohlcv])
+        conn.commit()
+        conn.close()
+
+    def get_last_timestamp(self, symbol, timeframe):
+        """获取最后一根已存储K线的开盘时间（毫秒），没有数据时返回None"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT MAX(ts) FROM candles WHERE symbol = ? AND timeframe = ?',
+            (symbol, timeframe)
+        )
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row and row[0] is not None else None
+
+    def load(self, symbol, timeframe, limit=None, since=None):
+        """读取K线（按时间升序），返回与ccxt fetch_ohlcv相同格式的列表
+
+        Args:
+            limit: 只返回最新的limit根K线
+            since: 只返回开盘时间 >= since（毫秒）的K线
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        query = 'SELECT ts, open, high, low, close, volume FROM candles WHERE symbol = ? AND timeframe = ?'
+        params = [symbol, timeframe]
+        if since is not None:
+            query += ' AND ts >= ?'
+            params.append(int(since))
+        query += ' ORDER BY ts DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(int(limit))
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+        return [list(row) for row in reversed(rows)]
+
+    def _find_first_gap(self, symbol, timeframe, window_start, last_ts, tf_ms):
+        """查找窗口内第一根缺失K线的开盘时间，没有缺口时返回None"""
+        stored = self.load(symbol, timeframe, since=window_start)
+        expected = window_start
+        for candle in stored:
+            if candle[0] > last_ts:
+                break
+            if candle[0] > expected:
+                return expected
+            expected = candle[0] + tf_ms
+        return None
+
+    def plan_sync(self, symbol, timeframe, limit, now_ms):
+        """计算增量同步的起始时间
+
+        Returns:
+            tuple: (since, forming_open, tf_ms) - 起始拉取时间、当前未收盘K线开盘时间、周期毫秒数
+        """
+        tf_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        forming_open = now_ms // tf_ms * tf_ms
+        window_start = forming_open - (limit - 1) * tf_ms
+
+        last_ts = self.get_last_timestamp(symbol, timeframe)
+        if last_ts is None or last_ts < window_start:
+            # 首次运行或离线时间超过窗口：拉取整个窗口
+            since = window_start
+        else:
+            gap = self._find_first_gap(symbol, timeframe, window_start, last_ts, tf_ms)
+            since = gap if gap is not None else last_ts
+        return since, forming_open, tf_ms
+
+    def sync(self, exchange, symbol, timeframe, limit):
+        """增量同步K线并返回最新的limit根K线
+
+        只请求最后一根已存储K线（可能是上次未收盘的K线）之后的数据，
+        如果窗口内存在缺口则从第一个缺口开始补齐。
+
+        Args:
+            exchange: ccxt交易所实例
+            symbol: 交易对
+            timeframe: K线周期（如 '3m'）
+            limit: 返回的K线数量
+
+        Returns:
+            list: [[timestamp, open, high, low, close, volume], ...]
+        """
+        since, forming_open, tf_ms = self.plan_sync(symbol, timeframe, limit, exchange.milliseconds())
+
+        fetched = 0
+        for _ in range(self.MAX_PAGES):
+            batch = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=self.PAGE_LIMIT)
+            if not batch:
+                break
+            self.upsert(symbol, timeframe, batch)
+            fetched += len(batch)
+            if len(batch) < self.PAGE_LIMIT or batch[-1][0] >= forming_open:
+                break
+            since = batch[-1][0] + tf_ms
+
+        print(f"✓ K线增量同步: 新拉取 {fetched} 条记录 ({symbol} {timeframe})")
+        return self.load(symbol, timeframe, limit=limit)
+
+
+# 全局K线存储实例
+candle_store = CandleStore()
@@ -9,7 +9,8 @@ load_dotenv()
 # 初始化DeepSeek客户端
 deepseek_client = OpenAI(
     api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url="https://api.deepseek.com"
+    # 可指向本地替身服务器（benchmarks/mock_deepseek_server.py）做离线测试
+    base_url=os.getenv('DEEPSEEK_BASE_URL', "https://api.deepseek.com")
 )
 
 # 初始化OKX交易所
@@ -29,6 +30,102 @@ TRADE_CONFIG = {
     'timeframe': '3m',  # 使用3分钟K线
     'interval_minutes': 3,  # 执行间隔（分钟），服务将在此时间间隔的整点执行
     'data_points': 96,  # 96根timeframe周期的K线（用于获取历史K线数据）
+    'fetch_timeout_seconds': 10,  # 并发获取市场快照时单个请求的超时时间（秒）
+    'llm_timeout_seconds': 60,  # 异步运行时单次DeepSeek调用的超时时间（秒）
+    # 多币种交易：启用后每周期批量获取所有币种行情，一次DeepSeek请求返回每个币种的信号
+    'universe': {
+        'enabled': False,
+        'symbols': ['BTC/USDT:USDT', 'ETH/USDT:USDT', 'SOL/USDT:USDT'],
+    },
+    # 本地K线存储：按(symbol, timeframe, ts)持久化，每周期只增量拉取新K线
+    'candle_store': {
+        'enabled': True,
+    },
+    # 增量指标引擎：K线收盘时O(1)更新指标状态，状态写入检查点，重启后无需重新预热
+    'indicator_engine': {
+        'enabled': True,
+    },
+    # DeepSeek流式调用：决策JSON完整后立即停止读取，超过预算时中止
+    'llm_stream': {
+        'enabled': True,
+        'time_budget_seconds': 60,  # 单次调用的时间预算（秒）
+        'max_tokens': 2048,         # 单次回复的token预算
+        'usage_grace_seconds': 0.3,  # JSON完整后等待服务端token用量（含缓存命中数）的最长时间
+    },
+    # DeepSeek调用的对冲请求与周期截止时间
+    'llm_caller': {
+        'hedge': True,                 # 主请求超过对冲阈值未返回时发出对冲请求
+        'hedge_percentile': 90,        # 对冲阈值取最近调用耗时的分位数
+        'hedge_min_samples': 5,        # 样本少于该数量时使用固定阈值
+        'hedge_after_seconds': 20,     # 固定对冲阈值（秒）
+        'deadline_margin_seconds': 15,  # 本周期截止时间 = 下一个执行整点 - 安全余量
+        'min_attempt_seconds': 5,      # 剩余时间少于该值时不再发起调用/重试
+    },
+    # 提示词前缀缓存：系统提示词逐字节不变，DeepSeek可复用已缓存的前缀（降低首token延迟和费用）
+    'prompt_cache': {
+        'stable_system_prompt': True,  # 系统提示词不注入实时余额，易变数值只放在用户提示词中
+        'starting_capital': None,      # 稳定模式下系统提示词中的固定起始资金（USDT），None表示引用用户提示词中的账户信息
+    },
+    # 提示词数值编码：按字段精度输出（价格按tick，RSI 1位小数，MACD 4位有效数字），超出token预算时缩短序列
+    'prompt_encoding': {
+        'compact': True,
+        'token_budget': 6000,      # 用户提示词的估算token预算（None表示不限制）
+        'min_series_length': 3,    # 裁剪后序列保留的最少长度
+    },
+    # 预构建：整点前提前获取余额/资金费率/OI/4h数据、同步K线、渲染系统提示词并预热DeepSeek连接
+    'prebuild': {
+        'enabled': True,
+        'lead_seconds': 10,          # 整点前多少秒开始预构建
+        'max_age_seconds': 30,       # 预构建结果的最长有效时间
+        'warm_llm_connection': True,  # 预构建时请求一次DeepSeek模型列表以建立连接
+    },
+    # 多模型集成：同一提示词并发发送到多个OpenAI兼容模型，投票合成信号
+    'ensemble': {
+        'enabled': False,
+        'voting': 'majority',   # majority（按权重多数票）/ confidence（权重×信心度）
+        'min_agreement': 0.5,   # 获胜信号票数占比低于该值时改为HOLD
+        'models': [
+            # 未配置base_url时使用默认DeepSeek客户端；api_key 可直接填写或用 api_key_env 指定环境变量
+            {'name': 'deepseek-chat', 'model': 'deepseek-chat', 'timeout': 60, 'weight': 1.0},
+            # {'name': 'deepseek-reasoner', 'model': 'deepseek-reasoner', 'timeout': 90, 'weight': 1.0},
+            # {'name': 'local', 'model': 'stub', 'base_url': 'http://127.0.0.1:8001/v1', 'api_key': 'stub', 'timeout': 30, 'weight': 0.5},
+        ],
+    },
+    # 订单跟踪：下单后轮询订单状态，确认成交即继续（替代固定等待），交易记录使用实际成交价
+    'order_tracker': {
+        'initial_delay': 0.05,   # 第一次查询订单前的等待（秒）
+        'max_delay': 0.5,        # 查询间隔上限（秒），间隔按backoff倍数增长
+        'backoff': 1.5,
+        'timeout_seconds': 5,    # 超过该时间仍未确认成交则放弃等待（反手时不再开新仓）
+    },
+    # 反手：单向持仓模式下用一笔 当前持仓+目标仓位 的市价单完成平仓并开新仓
+    'reversal': {
+        'single_order': True,  # False时始终先平后开两笔订单（超过单笔市价单上限时也会自动退回两笔）
+    },
+    # 交易所端止盈止损：开仓后挂持仓级OCO策略委托，价格触及止损/止盈时由交易所立即平仓
+    'protective_orders': {
+        'enabled': True,
+        'trigger_price_type': 'last',  # 触发价类型：last / mark / index
+        'min_change_ratio': 0.0005,    # 新信号的止损止盈价变化小于该比例时不修改委托
+    },
+    # 风控看门狗：后台线程约1Hz轮询价格，触及信号的止损止盈时立即reduceOnly平仓
+    'risk_watchdog': {
+        'enabled': True,
+        'poll_interval': 1.0,       # 价格轮询间隔（秒）
+        'price_source': 'mark',     # mark（标记价格）/ last（最新成交价）
+        'max_drawdown_ratio': 0,    # 额外的回撤平仓规则：未实现盈亏从峰值回撤达到保证金的该比例时平仓（0表示关闭）
+        'retry_seconds': 5,         # 平仓失败后再次尝试的间隔（秒）
+    },
+    # AI决策缓存：行情平静且AI连续HOLD时复用上次决策，跳过DeepSeek调用
+    'decision_cache': {
+        'enabled': True,
+        'min_hold_streak': 3,      # 最近连续N次AI决策均为HOLD才允许复用
+        'max_reuse': 5,            # 连续复用上限，达到后强制调用AI
+        'atr_move': 0.5,           # 价格相对上次AI决策变动 ≥ 0.5×ATR 视为重大变化
+        'price_bucket_atr': 1.0,   # 指纹中价格区间宽度（ATR倍数）
+        'rsi_levels': [30, 50, 70],  # RSI穿越这些阈值视为重大变化
+        'pnl_change_pct': 0.5,     # 持仓未实现盈亏变化 ≥ 名义价值的0.5% 视为重大变化
+    },
     # 智能仓位参数
     'position_management': {
         'enable_intelligent_position': True,  # 🆕 新增：是否启用智能仓位管理
@@ -0,0 +1,114 @@
+"""交易周期上下文模块 - 周期内合并重复的交易所读取请求
+
+一个交易周期内，余额、持仓、ticker、资金费率会被多个模块重复读取。
+周期开始时调用 begin()，周期内同一读取只请求一次交易所，结果在整个流程中共享；
+下单成交后调用 invalidate() 使相关缓存失效；周期结束时调用 end()。
+周期之外的调用直接透传到交易所，不做缓存。
+"""
+import threading
+from .config import exchange
+
+
+class CycleContext:
+    """周期级交易所读取缓存"""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._cache = {}
+        self._active = False
+        self._hits = 0
+        self._misses = 0
+
+    def begin(self):
+        """开始一个新周期（清空上个周期的缓存）"""
+        with self._lock:
+            self._cache.clear()
+            self._key_locks.clear()
+            self._active = True
+            self._hits = 0
+            self._misses = 0
+
+    def end(self):
+        """结束当前周期"""
+        with self._lock:
+            if self._active:
+                print(f"📡 本周期交易所读取: {self._misses} 次请求, {self._hits} 次复用")
+            self._cache.clear()
+            self._key_locks.clear()
+            self._active = False
+
+    def invalidate(self, *kinds):
+        """使缓存失效
+
+        Args:
+            kinds: 要失效的读取类型（'balance', 'positions', 'ticker', 'funding_rate'），不传则全部失效
+        """
+        with self._lock:
+            if not kinds:
+                self._cache.clear()
+                return
+            for key in [k for k in self._cache if k[0] in kinds]:
+                del self._cache[key]
+
+    def _get(self, key, fetch):
+        """读取缓存，未命中时请求交易所（同一key的并发请求只发出一次）"""
+        with self._lock:
+            if not self._active:
+                return fetch()
+            if key in self._cache:
+                self._hits += 1
+                return self._cache[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._cache:
+                    self._hits += 1
+                    return self._cache[key]
+            value = fetch()
+            with self._lock:
+                if self._active:
+                    self._cache[key] = value
+                self._misses += 1
+            return value
+
+    @staticmethod
+    def _make_key(kind, arg=None):
+        if kind == 'positions':
+            return (kind, tuple(arg) if arg else None)
+        if kind == 'balance':
+            return (kind,)
+        return (kind, arg)
+
+    def seed(self, kind, value, arg=None):
+        """填入本周期已从其他途径获取的数据（如异步运行时并发获取的结果）
+
+        Args:
+            kind: 读取类型（'balance', 'positions', 'ticker', 'funding_rate'）
+            value: 与对应交易所接口返回格式一致的数据
+            arg: positions为交易对列表，ticker/funding_rate为交易对
+        """
+        with self._lock:
+            if self._active:
+                self._cache[self._make_key(kind, arg)] = value
+
+    def fetch_balance(self):
+        return self._get(self._make_key('balance'), self.exchange.fetch_balance)
+
+    def fetch_positions(self, symbols=None):
+        key = self._make_key('positions', symbols)
+        return self._get(key, lambda: self.exchange.fetch_positions(symbols))
+
+    def fetch_ticker(self, symbol):
+        key = self._make_key('ticker', symbol)
+        return self._get(key, lambda: self.exchange.fetch_ticker(symbol))
+
+    def fetch_funding_rate(self, symbol):
+        key = self._make_key('funding_rate', symbol)
+        return self._get(key, lambda: self.exchange.fetch_funding_rate(symbol))
+
+
+# 全局周期上下文实例（基于真实交易所）
+cycle_context = CycleContext(exchange)
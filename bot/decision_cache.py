@@ -0,0 +1,189 @@
+"""AI决策缓存模块 - 市场无重大变化时复用上一次的AI决策
+
+每3分钟调用一次DeepSeek，但在行情平静、AI连续给出HOLD时，新的请求几乎总是得到同样的答案。
+本模块对每个交易对记录最近一次真实AI决策时的市场快照（锚点），并在新周期：
+1. 对量化后的快照（价格区间、指标状态、持仓状态）求指纹，与锚点指纹比较；
+2. 检查重大变化门槛（相对ATR的价格变动、RSI穿越阈值、持仓盈亏变化）。
+两者都没有触发时复用锚点决策（标记为缓存），否则调用AI并更新锚点。
+只复用HOLD决策，开仓/平仓信号永远不会被缓存。
+"""
+import bisect
+import copy
+import hashlib
+import json
+import math
+from datetime import datetime
+
+from .config import TRADE_CONFIG, signal_history
+from .indicator_registry import indicator_registry
+from .position_manager import get_contract_spec
+
+# 默认参数（可在 TRADE_CONFIG['decision_cache'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'min_hold_streak': 3,
+    'max_reuse': 5,
+    'atr_move': 0.5,
+    'price_bucket_atr': 1.0,
+    'rsi_levels': [30, 50, 70],
+    'pnl_change_pct': 0.5,
+}
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('decision_cache', {})}
+
+
+def _safe_float(value, default=0.0):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if math.isnan(value) or math.isinf(value) else value
+
+
+class DecisionCache:
+    """AI决策缓存（按交易对保存锚点）"""
+
+    def __init__(self):
+        # 交易对 -> {'snapshot', 'fingerprint', 'signal', 'hold_streak', 'reused', 'time'}
+        self._anchors = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _snapshot(price_data, position):
+        """提取用于比较的市场与持仓快照"""
+        price = _safe_float(price_data.get('price'))
+        atr = 0.0
+        df = price_data.get('full_data')
+        if df is not None and not df.empty:
+            atr = _safe_float(indicator_registry.series(df, 'atr', period=14).iloc[-1])
+        trend = price_data.get('trend_analysis') or {}
+        return {
+            'price': price,
+            'atr': atr,
+            'rsi': _safe_float(price_data.get('technical_data', {}).get('rsi'), 50.0),
+            'trend': trend.get('overall'),
+            'macd': trend.get('macd'),
+            'position_side': position.get('side') if position else None,
+            'position_size': _safe_float(position.get('size')) if position else 0.0,
+            'entry_price': _safe_float(position.get('entry_price')) if position else 0.0,
+            'unrealized_pnl': _safe_float(position.get('unrealized_pnl')) if position else 0.0,
+        }
+
+    @staticmethod
+    def _fingerprint(snapshot, bucket_width, rsi_levels):
+        """量化快照并求哈希：价格区间、RSI区间、趋势、MACD方向和持仓状态"""
+        quantized = [
+            math.floor(snapshot['price'] / bucket_width) if bucket_width > 0 else snapshot['price'],
+            bisect.bisect(rsi_levels, snapshot['rsi']),
+            snapshot['trend'],
+            snapshot['macd'],
+            snapshot['position_side'],
+            round(snapshot['position_size'], 8),
+        ]
+        return hashlib.sha1(json.dumps(quantized, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _material_change(anchor, current, settings, symbol):
+        """重大变化门槛，返回触发原因（未触发返回None）"""
+        move = abs(current['price'] - anchor['price'])
+        if anchor['atr'] > 0 and move >= settings['atr_move'] * anchor['atr']:
+            return f"价格变动 {move:.2f} ≥ {settings['atr_move']}×ATR({anchor['atr']:.2f})"
+
+        low, high = sorted((anchor['rsi'], current['rsi']))
+        for level in settings['rsi_levels']:
+            if low < level <= high:
+                return f"RSI穿越{level}（{anchor['rsi']:.1f} → {current['rsi']:.1f}）"
+
+        if current['position_side']:
+            contract_size, _ = get_contract_spec(symbol)
+            notional = current['position_size'] * current['entry_price'] * contract_size
+            pnl_change = abs(current['unrealized_pnl'] - anchor['unrealized_pnl'])
+            if notional > 0 and pnl_change / notional * 100 >= settings['pnl_change_pct']:
+                return f"持仓盈亏变化 {pnl_change:.2f} USDT（≥名义价值的{settings['pnl_change_pct']}%）"
+        return None
+
+    def lookup(self, price_data, position=None, symbol=None):
+        """查找可复用的决策
+
+        Args:
+            price_data: 价格数据
+            position: 持仓信息（side/size/entry_price/unrealized_pnl），无持仓为None
+            symbol: 交易对，默认TRADE_CONFIG['symbol']
+
+        Returns:
+            dict: 可复用的信号（已标记is_cached），需要调用AI时返回None
+        """
+        settings = _settings()
+        if not settings['enabled']:
+            return None
+        symbol = symbol or TRADE_CONFIG['symbol']
+        anchor = self._anchors.get(symbol)
+        if anchor is None:
+            return None
+
+        if anchor['signal'].get('signal') != 'HOLD' or anchor['hold_streak'] < settings['min_hold_streak']:
+            return None
+        if anchor['reused'] >= settings['max_reuse']:
+            print(f"🧠 决策缓存已连续复用{anchor['reused']}次，本周期重新调用AI")
+            return None
+
+        current = self._snapshot(price_data, position)
+        if self._fingerprint(current, anchor['bucket_width'], settings['rsi_levels']) != anchor['fingerprint']:
+            print("🧠 市场快照已变化（价格区间/指标状态/持仓），调用AI")
+            self.misses += 1
+            return None
+        reason = self._material_change(anchor['snapshot'], current, settings, symbol)
+        if reason:
+            print(f"🧠 触发重大变化门槛: {reason}，调用AI")
+            self.misses += 1
+            return None
+
+        anchor['reused'] += 1
+        self.hits += 1
+        signal_data = copy.deepcopy(anchor['signal'])
+        signal_data['is_cached'] = True
+        signal_data['cached_from'] = anchor['time']
+        signal_data['timestamp'] = price_data['timestamp']
+        signal_data['ai_response'] = (
+            f"[决策缓存] 市场无重大变化，复用 {anchor['time']} 的AI决策"
+            f"（第{anchor['reused']}次复用）\n\n{anchor['signal'].get('ai_response', '')}"
+        )
+        signal_history.append(signal_data)
+        if len(signal_history) > 30:
+            signal_history.pop(0)
+        print(f"🧠 决策缓存命中: 复用{signal_data['signal']}决策，跳过DeepSeek调用"
+              f"（累计命中 {self.hits} 次）")
+        return signal_data
+
+    def record(self, price_data, position, signal_data, symbol=None):
+        """记录一次真实的AI决策，作为后续周期的比较锚点"""
+        symbol = symbol or TRADE_CONFIG['symbol']
+        if signal_data.get('is_fallback', False) or signal_data.get('is_cached', False):
+            # 备用信号不是AI的真实判断，不作为锚点
+            self._anchors.pop(symbol, None)
+            return
+
+        settings = _settings()
+        previous = self._anchors.get(symbol)
+        is_hold = signal_data.get('signal') == 'HOLD'
+        hold_streak = (previous['hold_streak'] + 1 if previous and is_hold else 1) if is_hold else 0
+
+        snapshot = self._snapshot(price_data, position)
+        # 价格区间宽度在锚点处固定，避免ATR波动导致区间边界抖动
+        bucket_width = settings['price_bucket_atr'] * snapshot['atr']
+        self._anchors[symbol] = {
+            'snapshot': snapshot,
+            'bucket_width': bucket_width,
+            'fingerprint': self._fingerprint(snapshot, bucket_width, settings['rsi_levels']),
+            'signal': copy.deepcopy(signal_data),
+            'hold_streak': hold_streak,
+            'reused': 0,
+            'time': price_data.get('timestamp') or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+# 全局AI决策缓存实例
+decision_cache = DecisionCache()
@@ -0,0 +1,222 @@
+"""多模型集成分析模块 - 同一提示词并发发送到多个模型，投票合成交易信号
+
+启用 TRADE_CONFIG['ensemble'] 后，提示词只构建一次，并发发送到配置的每个
+OpenAI兼容端点/模型（各自独立超时），分别解析为信号后按投票方式合成：
+- majority: 每个模型按权重投票，得票最多的信号获胜；
+- confidence: 每个模型的票数为 权重 × 信心度（HIGH/MEDIUM/LOW）。
+获胜信号的票数占比低于 min_agreement 时视为分歧，改为HOLD。
+请求并发发出，集成的耗时等于最慢模型的耗时，而不是所有模型之和。
+每个模型的耗时、信号和一致度随信号保存到AI分析历史。
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from openai import OpenAI
+
+from .config import deepseek_client, TRADE_CONFIG
+from .llm_stream import stream_completion, stream_settings, prompt_cache_stats
+from .llm_caller import llm_caller
+from .ai_analyzer import _build_analysis_prompts, _parse_ai_response, _record_signal_history
+from .utils import create_fallback_signal
+
+# 默认参数（可在 TRADE_CONFIG['ensemble'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'enabled': False,
+    'voting': 'majority',
+    'min_agreement': 0.5,
+    'models': [
+        {'name': 'deepseek-chat', 'model': 'deepseek-chat', 'timeout': 60, 'weight': 1.0},
+    ],
+}
+
+# confidence投票时信心度对应的权重
+CONFIDENCE_WEIGHTS = {'HIGH': 1.0, 'MEDIUM': 0.6, 'LOW': 0.3}
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('ensemble', {})}
+
+
+def ensemble_enabled():
+    """是否启用多模型集成分析"""
+    settings = _settings()
+    return bool(settings['enabled'] and settings['models'])
+
+
+class EnsembleAnalyzer:
+    """多模型并发分析与投票"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ensemble')
+        # (base_url, api_key) -> OpenAI客户端
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, spec):
+        """获取模型对应的客户端（未配置base_url时使用默认DeepSeek客户端）"""
+        if not spec.get('base_url'):
+            return deepseek_client
+        api_key = spec.get('api_key') or os.getenv(spec.get('api_key_env', 'DEEPSEEK_API_KEY'), '')
+        key = (spec['base_url'], api_key)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = OpenAI(api_key=api_key, base_url=spec['base_url'])
+            return self._clients[key]
+
+    def _call_model(self, spec, messages, timeout, cancel_event):
+        """调用单个模型，返回 (回复文本, 耗时)"""
+        started = time.perf_counter()
+        client = self._client(spec)
+        model = spec.get('model', 'deepseek-chat')
+        temperature = spec.get('temperature', 0.1)
+        if stream_settings()['enabled']:
+            result = stream_completion(
+                client, messages, model=model, temperature=temperature,
+                timeout=timeout, cancel_event=cancel_event
+            )
+            if result.json_text is None and result.stop_reason in ('time_budget', 'token_budget'):
+                raise RuntimeError(f"流式回复已中止（{result.stop_reason}），未得到完整决策")
+            text = result.text
+        else:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=False,
+                temperature=temperature,
+                timeout=timeout
+            )
+            prompt_cache_stats.record(getattr(response, 'usage', None))
+            text = response.choices[0].message.content
+        return text, time.perf_counter() - started
+
+    @staticmethod
+    def _vote(results, voting, min_agreement):
+        """按投票方式合成信号
+
+        Returns:
+            tuple: (获胜信号, 代表模型结果或None, 一致度)
+        """
+        scores = {}
+        for result in results:
+            weight = result['weight']
+            if voting == 'confidence':
+                weight *= CONFIDENCE_WEIGHTS.get(str(result['confidence']).upper(), CONFIDENCE_WEIGHTS['LOW'])
+            result['vote'] = weight
+            scores[result['signal']] = scores.get(result['signal'], 0.0) + weight
+
+        total = sum(scores.values())
+        if total <= 0:
+            return 'HOLD', None, 0.0
+        winner = max(scores, key=scores.get)
+        agreement = scores[winner] / total
+        tied = [signal for signal, score in scores.items() if score == scores[winner]]
+        if len(tied) > 1 or agreement < min_agreement:
+            # 模型分歧：保守处理为HOLD
+            winner = 'HOLD'
+            agreement = scores.get('HOLD', 0.0) / total
+        supporters = [result for result in results if result['signal'] == winner]
+        representative = max(supporters, key=lambda result: result['vote']) if supporters else None
+        return winner, representative, agreement
+
+    def analyze(self, price_data, system_prompt, user_prompt):
+        """并发调用所有模型并投票合成信号"""
+        settings = _settings()
+        models = settings['models']
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        # 每个模型独立超时，整体不超过本周期截止时间
+        budget = llm_caller.remaining()
+        cancel_events = {}
+        futures = {}
+        for index, spec in enumerate(models):
+            name = spec.get('name') or spec.get('model', f'model-{index}')
+            timeout = max(0.0, min(spec.get('timeout', TRADE_CONFIG.get('llm_timeout_seconds', 60)), budget))
+            cancel_events[name] = threading.Event()
+            futures[name] = (spec, self._executor.submit(
+                self._call_model, spec, messages, timeout, cancel_events[name]
+            ))
+        overall = max(0.0, min(max(spec.get('timeout', 60) for spec in models), budget))
+        wait([future for _, future in futures.values()], timeout=overall)
+
+        records = []
+        valid = []
+        for name, (spec, future) in futures.items():
+            record = {'name': name, 'model': spec.get('model', 'deepseek-chat'), 'latency': None,
+                      'signal': None, 'confidence': None, 'error': None}
+            records.append(record)
+            if not future.done():
+                cancel_events[name].set()
+                record['error'] = f"超时（>{overall:.0f}秒）"
+                continue
+            try:
+                text, record['latency'] = future.result()
+            except Exception as e:
+                record['error'] = str(e)
+                continue
+            signal_data = _parse_ai_response(text, price_data, system_prompt, user_prompt, record=False)
+            record['response'] = text
+            if signal_data.get('is_fallback', False):
+                record['error'] = "回复无法解析为有效信号"
+                continue
+            record['signal'] = signal_data['signal']
+            record['confidence'] = signal_data.get('confidence')
+            valid.append({'name': name, 'signal': signal_data['signal'], 'confidence': record['confidence'],
+                          'weight': float(spec.get('weight', 1.0)), 'signal_data': signal_data})
+
+        winner, representative, agreement = self._vote(valid, settings['voting'], settings['min_agreement'])
+        if representative is not None:
+            signal_data = dict(representative['signal_data'])
+        else:
+            signal_data = create_fallback_signal(price_data)
+            if valid:
+                # 模型有分歧且没有模型给出HOLD：保守HOLD，不作为备用信号处理
+                signal_data.pop('is_fallback', None)
+                signal_data['reason'] = "多模型信号分歧，保持观望"
+
+        signal_data['system_prompt'] = system_prompt
+        signal_data['user_prompt'] = user_prompt
+        signal_data['ai_response'] = '\n\n'.join(
+            f"[{record['name']}] {record.get('response') or record['error']}" for record in records
+        )
+        signal_data['timestamp'] = price_data['timestamp']
+        signal_data['ensemble'] = {
+            'voting': settings['voting'],
+            'winner': winner,
+            'agreement': round(agreement, 4),
+            'models': [{key: value for key, value in record.items() if key != 'response'} for record in records],
+        }
+
+        summary = ', '.join(
+            f"{record['name']}={record['signal'] or '失败'}"
+            f"({record['latency']:.2f}s)" if record['latency'] is not None else f"{record['name']}=失败"
+            for record in records
+        )
+        print(f"🗳️ 多模型集成: {summary} → {signal_data['signal']}（一致度 {agreement:.0%}，"
+              f"{len(valid)}/{len(records)} 个模型有效）")
+        _record_signal_history(signal_data)
+        return signal_data
+
+
+# 全局多模型集成分析实例
+ensemble_analyzer = EnsembleAnalyzer()
+
+
+def analyze_with_ensemble(price_data, position_data=None, account_data=None):
+    """多模型集成分析（提示词只构建一次，发送给所有模型）
+
+    Args:
+        price_data: 价格数据
+        position_data: 可选的持仓数据（用于模拟模式）
+        account_data: 可选的账户数据（用于模拟模式）
+    """
+    try:
+        system_prompt, user_prompt = _build_analysis_prompts(price_data, position_data, account_data)
+    except Exception as e:
+        print(f"构建提示词失败: {e}")
+        return create_fallback_signal(price_data)
+    return ensemble_analyzer.analyze(price_data, system_prompt, user_prompt)
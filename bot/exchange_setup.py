@@ -1,6 +1,9 @@
 """交易所设置模块"""
 from .config import exchange, TRADE_CONFIG
 from .position_manager import get_current_position
+from .leverage_cache import leverage_cache
+from .protective_orders import protective_orders
+from .universe import get_universe_symbols
 
 
 def setup_exchange():
@@ -22,21 +25,39 @@ def setup_exchange():
 
         print(f"📏 最小交易量: {TRADE_CONFIG['min_amount']} 张")
 
+        # 多币种模式：记录每个交易对的合约规格
+        symbols = get_universe_symbols()
+        TRADE_CONFIG['contract_specs'] = {}
+        for symbol in symbols:
+            market = markets[symbol]
+            TRADE_CONFIG['contract_specs'][symbol] = {
+                'contract_size': float(market['contractSize']),
+                'min_amount': market['limits']['amount']['min'],
+                'tick_size': market['precision']['price'],  # 最小价格变动单位（用于提示词数值编码）
+                # 单笔市价单最大张数（单笔反手订单不能超过该值）
+                'max_market_amount': float(market['info']['maxMktSz']) if market['info'].get('maxMktSz') else None,
+            }
+        if len(symbols) > 1:
+            print(f"✅ 多币种模式: {', '.join(symbols)}")
+
         # 先检查现有持仓
         print("🔍 检查现有持仓模式...")
-        positions = exchange.fetch_positions([TRADE_CONFIG['symbol']])
+        positions = exchange.fetch_positions(symbols)
 
         has_isolated_position = False
         isolated_position_info = None
 
         for pos in positions:
-            if pos['symbol'] == TRADE_CONFIG['symbol']:
+            # 记录持仓当前生效的杠杆，避免重复设置
+            leverage_cache.observe(pos)
+            if pos['symbol'] in symbols:
                 contracts = float(pos.get('contracts', 0))
                 mode = pos.get('mgnMode')
 
                 if contracts > 0 and mode == 'isolated':
                     has_isolated_position = True
                     isolated_position_info = {
+                        'symbol': pos['symbol'],
                         'side': pos.get('side'),
                         'size': contracts,
                         'entry_price': pos.get('entryPrice'),
@@ -48,6 +69,7 @@ def setup_exchange():
         if has_isolated_position:
             print("❌ 检测到逐仓持仓，程序无法继续运行！")
             print(f"📊 逐仓持仓详情:")
+            print(f"   - 交易对: {isolated_position_info['symbol']}")
             print(f"   - 方向: {isolated_position_info['side']}")
             print(f"   - 数量: {isolated_position_info['size']}")
             print(f"   - 入场价: {isolated_position_info['entry_price']}")
@@ -65,16 +87,24 @@ def setup_exchange():
             print("✅ 已设置单向持仓模式")
         except Exception as e:
             print(f"⚠️ 设置单向持仓模式失败 (可能已设置): {e}")
+        # 确认持仓模式：只有单向持仓模式下才能用一笔订单完成反手
+        try:
+            TRADE_CONFIG['net_mode'] = not exchange.fetch_position_mode(TRADE_CONFIG['symbol'])['hedged']
+        except Exception as e:
+            TRADE_CONFIG['net_mode'] = False
+            print(f"⚠️ 无法确认持仓模式，反手使用先平后开两笔订单: {e}")
 
         # 4. 设置全仓模式和杠杆
         print("⚙️ 设置全仓模式和杠杆...")
-        exchange.set_leverage(
-            TRADE_CONFIG['leverage'],
-            TRADE_CONFIG['symbol'],
-            {'mgnMode': 'cross'}  # 强制全仓模式
-        )
+        for symbol in symbols:
+            leverage_cache.ensure(symbol, TRADE_CONFIG['leverage'], 'cross')  # 强制全仓模式
         print(f"✅ 已设置全仓模式，杠杆倍数: {TRADE_CONFIG['leverage']}x")
 
+        # 恢复仍在挂单的交易所止盈止损委托（重启后继续修改/撤销同一笔委托）
+        if TRADE_CONFIG.get('protective_orders', {}).get('enabled', True):
+            for symbol in symbols:
+                protective_orders.reconcile(symbol)
+
         # 5. 验证设置
         print("🔍 验证账户设置...")
         balance = exchange.fetch_balance()
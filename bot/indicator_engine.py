@@ -0,0 +1,541 @@
+"""增量指标引擎模块 - 每根K线O(1)更新的有状态指标计算
+
+calculate_technical_indicators 每个周期都在整个DataFrame上重新计算全部指标。
+本模块为每个(symbol, timeframe)维护一组有状态的指标内核：
+滑动窗口累加和、EMA状态、SMA/Wilder RSI累加器、单调队列滚动最大/最小值。
+K线收盘时每个内核O(1)更新一次，未收盘K线只做O(1)的试算（不修改状态）。
+内核状态定期写入检查点文件，重启后从检查点继续，无需重新预热。
+
+输出列与 calculate_technical_indicators 一致，在相同K线上的结果与pandas实现的误差在浮点精度范围内。
+"""
+import json
+import math
+import os
+import threading
+from collections import deque
+
+import ccxt
+import pandas as pd
+
+from .indicator_registry import adopt_technical_indicators
+
+NAN = float('nan')
+
+# 输出列（与 technical_analysis.calculate_technical_indicators 一致）
+INDICATOR_COLUMNS = [
+    'sma_5', 'sma_20', 'sma_50',
+    'ema_12', 'ema_26', 'macd', 'macd_signal', 'macd_histogram',
+    'rsi',
+    'bb_middle', 'bb_upper', 'bb_lower', 'bb_position',
+    'volume_ma', 'volume_ratio',
+    'resistance', 'support',
+]
+
+
+def _div(numerator, denominator):
+    """与pandas一致的除法：除以0得到±inf，0/0得到NaN"""
+    if denominator == 0:
+        if numerator == 0 or math.isnan(numerator):
+            return NAN
+        return math.copysign(math.inf, numerator) * math.copysign(1.0, denominator)
+    return numerator / denominator
+
+
+class RollingMean:
+    """滑动窗口均值（等价于 Series.rolling(window, min_periods).mean()）"""
+
+    # 每累计这么多次更新，用窗口内数据重新求和一次，消除浮点累积误差（均摊O(1)）
+    RESYNC_EVERY = 1024
+
+    def __init__(self, window, min_periods=None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.total = 0.0
+        self.updates = 0
+
+    def update(self, x):
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+        self.updates += 1
+        if self.updates % self.RESYNC_EVERY == 0:
+            self.total = math.fsum(self.values)
+        return self.value()
+
+    def value(self):
+        count = len(self.values)
+        return self.total / count if count >= self.min_periods else NAN
+
+    def peek(self, x):
+        """试算追加x后的值（不修改状态）"""
+        count = len(self.values) + 1
+        total = self.total + x
+        if count > self.window:
+            total -= self.values[0]
+            count -= 1
+        return total / count if count >= self.min_periods else NAN
+
+    def state(self):
+        return {'values': list(self.values), 'updates': self.updates}
+
+    def load_state(self, state):
+        self.values = deque(state['values'])
+        self.total = math.fsum(self.values)
+        self.updates = state['updates']
+
+
+class RollingStd:
+    """滑动窗口样本标准差（ddof=1，等价于 Series.rolling(window).std()），使用滑动Welford更新"""
+
+    RESYNC_EVERY = 1024
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    @staticmethod
+    def _add(n, mean, m2, x):
+        n += 1
+        delta = x - mean
+        mean += delta / n
+        m2 += delta * (x - mean)
+        return n, mean, m2
+
+    @staticmethod
+    def _replace(n, mean, m2, old, new):
+        new_mean = mean + (new - old) / n
+        m2 += (new - old) * (new - new_mean + old - mean)
+        return new_mean, m2
+
+    def _resync(self):
+        n = len(self.values)
+        self.mean = math.fsum(self.values) / n if n else 0.0
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in self.values)
+
+    def update(self, x):
+        n = len(self.values)
+        if n < self.window:
+            _, self.mean, self.m2 = self._add(n, self.mean, self.m2, x)
+            self.values.append(x)
+        else:
+            old = self.values.popleft()
+            self.values.append(x)
+            self.mean, self.m2 = self._replace(n, self.mean, self.m2, old, x)
+        self.updates += 1
+        if self.updates % self.RESYNC_EVERY == 0:
+            self._resync()
+        return self.value()
+
+    def _std(self, n, m2):
+        if n < self.window or n < 2:
+            return NAN
+        return math.sqrt(max(m2, 0.0) / (n - 1))
+
+    def value(self):
+        return self._std(len(self.values), self.m2)
+
+    def peek(self, x):
+        n = len(self.values)
+        if n < self.window:
+            n, _, m2 = self._add(n, self.mean, self.m2, x)
+            return self._std(n, m2)
+        _, m2 = self._replace(n, self.mean, self.m2, self.values[0], x)
+        return self._std(n, m2)
+
+    def state(self):
+        return {'values': list(self.values), 'updates': self.updates}
+
+    def load_state(self, state):
+        self.values = deque(state['values'])
+        self.updates = state['updates']
+        self._resync()
+
+
+class EMA:
+    """指数加权均值（等价于 Series.ewm(span, adjust).mean()）
+
+    adjust=True 时维护加权分子和分母，adjust=False 时维护递推值。
+    """
+
+    def __init__(self, span, adjust=True):
+        self.span = span
+        self.adjust = adjust
+        self.alpha = 2 / (span + 1)
+        self.decay = 1 - self.alpha
+        self.numerator = 0.0
+        self.denominator = 0.0
+        self.last = NAN
+
+    def _next(self, x):
+        if self.adjust:
+            numerator = x + self.decay * self.numerator
+            denominator = 1 + self.decay * self.denominator
+            return numerator, denominator, numerator / denominator
+        if math.isnan(self.last):
+            return 0.0, 0.0, x
+        return 0.0, 0.0, self.last + self.alpha * (x - self.last)
+
+    def update(self, x):
+        self.numerator, self.denominator, self.last = self._next(x)
+        return self.last
+
+    def value(self):
+        return self.last
+
+    def peek(self, x):
+        return self._next(x)[2]
+
+    def state(self):
+        return {'numerator': self.numerator, 'denominator': self.denominator, 'last': self.last}
+
+    def load_state(self, state):
+        self.numerator = state['numerator']
+        self.denominator = state['denominator']
+        self.last = state['last']
+
+
+class RSI:
+    """RSI累加器
+
+    默认与现有实现一致：涨跌幅用简单滑动均值（rolling(period).mean()）；
+    wilder=True 时使用Wilder平滑（首个值为简单均值，之后按 (prev*(n-1)+x)/n 递推）。
+    """
+
+    def __init__(self, period=14, wilder=False):
+        self.period = period
+        self.wilder = wilder
+        self.prev_close = NAN
+        if wilder:
+            self.count = 0
+            self.seed_gain = 0.0
+            self.seed_loss = 0.0
+            self.avg_gain = NAN
+            self.avg_loss = NAN
+        else:
+            self.gain = RollingMean(period)
+            self.loss = RollingMean(period)
+        self.last = NAN
+
+    @staticmethod
+    def _rsi(gain, loss):
+        return 100 - _div(100, 1 + _div(gain, loss))
+
+    def _changes(self, close):
+        # 与pandas一致：第一根K线的diff为NaN，where(delta > 0, 0) 后记为0
+        delta = close - self.prev_close
+        if math.isnan(delta):
+            return 0.0, 0.0
+        return max(delta, 0.0), max(-delta, 0.0)
+
+    def _wilder_next(self, gain, loss):
+        count = self.count + 1
+        if count < self.period:
+            return count, self.seed_gain + gain, self.seed_loss + loss, NAN, NAN
+        if count == self.period:
+            avg_gain = (self.seed_gain + gain) / self.period
+            avg_loss = (self.seed_loss + loss) / self.period
+        else:
+            avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        return count, self.seed_gain, self.seed_loss, avg_gain, avg_loss
+
+    def update(self, close):
+        gain, loss = self._changes(close)
+        self.prev_close = close
+        if self.wilder:
+            self.count, self.seed_gain, self.seed_loss, self.avg_gain, self.avg_loss = \
+                self._wilder_next(gain, loss)
+            self.last = self._rsi(self.avg_gain, self.avg_loss)
+        else:
+            self.last = self._rsi(self.gain.update(gain), self.loss.update(loss))
+        return self.last
+
+    def value(self):
+        return self.last
+
+    def peek(self, close):
+        gain, loss = self._changes(close)
+        if self.wilder:
+            _, _, _, avg_gain, avg_loss = self._wilder_next(gain, loss)
+            return self._rsi(avg_gain, avg_loss)
+        return self._rsi(self.gain.peek(gain), self.loss.peek(loss))
+
+    def state(self):
+        state = {'prev_close': self.prev_close, 'last': self.last}
+        if self.wilder:
+            state.update(count=self.count, seed_gain=self.seed_gain, seed_loss=self.seed_loss,
+                         avg_gain=self.avg_gain, avg_loss=self.avg_loss)
+        else:
+            state.update(gain=self.gain.state(), loss=self.loss.state())
+        return state
+
+    def load_state(self, state):
+        self.prev_close = state['prev_close']
+        self.last = state['last']
+        if self.wilder:
+            self.count = state['count']
+            self.seed_gain = state['seed_gain']
+            self.seed_loss = state['seed_loss']
+            self.avg_gain = state['avg_gain']
+            self.avg_loss = state['avg_loss']
+        else:
+            self.gain.load_state(state['gain'])
+            self.loss.load_state(state['loss'])
+
+
+class RollingExtreme:
+    """滑动窗口最大/最小值（单调队列，均摊O(1)，等价于 rolling(window).max()/min()）"""
+
+    def __init__(self, window, mode='max'):
+        self.window = window
+        self.mode = mode
+        self.queue = deque()  # (序号, 值)，值单调
+        self.index = -1
+
+    def _dominates(self, a, b):
+        return a >= b if self.mode == 'max' else a <= b
+
+    def update(self, x):
+        self.index += 1
+        while self.queue and self._dominates(x, self.queue[-1][1]):
+            self.queue.pop()
+        self.queue.append((self.index, x))
+        if self.queue[0][0] <= self.index - self.window:
+            self.queue.popleft()
+        return self.value()
+
+    def value(self):
+        if self.index + 1 < self.window:
+            return NAN
+        return self.queue[0][1]
+
+    def peek(self, x):
+        index = self.index + 1
+        if index + 1 < self.window:
+            return NAN
+        # 追加x后最多只有队首一个元素移出窗口，次优值即队列第二个元素
+        candidates = list(self.queue)[:2]
+        if candidates and candidates[0][0] <= index - self.window:
+            candidates = candidates[1:]
+        if not candidates:
+            return x
+        best = candidates[0][1]
+        return x if self._dominates(x, best) else best
+
+    def state(self):
+        return {'queue': [list(item) for item in self.queue], 'index': self.index}
+
+    def load_state(self, state):
+        self.queue = deque(tuple(item) for item in state['queue'])
+        self.index = state['index']
+
+
+class IndicatorSet:
+    """单个(symbol, timeframe)的全部指标内核"""
+
+    def __init__(self):
+        self.sma_5 = RollingMean(5, min_periods=1)
+        self.sma_20 = RollingMean(20, min_periods=1)
+        self.sma_50 = RollingMean(50, min_periods=1)
+        self.ema_12 = EMA(12)
+        self.ema_26 = EMA(26)
+        self.macd_signal = EMA(9)
+        self.rsi = RSI(14)
+        self.bb_middle = RollingMean(20)
+        self.bb_std = RollingStd(20)
+        self.volume_ma = RollingMean(20)
+        self.resistance = RollingExtreme(20, 'max')
+        self.support = RollingExtreme(20, 'min')
+
+    def _kernels(self):
+        return {name: kernel for name, kernel in vars(self).items()}
+
+    def _row(self, close, volume, values):
+        sma_5, sma_20, sma_50, ema_12, ema_26, rsi, bb_middle, bb_std, volume_ma, resistance, support, signal_of = values
+        macd = ema_12 - ema_26
+        macd_signal = signal_of(macd)
+        bb_upper = bb_middle + bb_std * 2
+        bb_lower = bb_middle - bb_std * 2
+        return [
+            sma_5, sma_20, sma_50,
+            ema_12, ema_26, macd, macd_signal, macd - macd_signal,
+            rsi,
+            bb_middle, bb_upper, bb_lower, _div(close - bb_lower, bb_upper - bb_lower),
+            volume_ma, _div(volume, volume_ma),
+            resistance, support,
+        ]
+
+    def update(self, high, low, close, volume):
+        """已收盘K线：更新全部内核（O(1)）并返回指标行"""
+        return self._row(close, volume, (
+            self.sma_5.update(close), self.sma_20.update(close), self.sma_50.update(close),
+            self.ema_12.update(close), self.ema_26.update(close),
+            self.rsi.update(close),
+            self.bb_middle.update(close), self.bb_std.update(close),
+            self.volume_ma.update(volume),
+            self.resistance.update(high), self.support.update(low),
+            self.macd_signal.update,
+        ))
+
+    def peek(self, high, low, close, volume):
+        """未收盘K线：试算指标行（O(1)，不修改状态）"""
+        return self._row(close, volume, (
+            self.sma_5.peek(close), self.sma_20.peek(close), self.sma_50.peek(close),
+            self.ema_12.peek(close), self.ema_26.peek(close),
+            self.rsi.peek(close),
+            self.bb_middle.peek(close), self.bb_std.peek(close),
+            self.volume_ma.peek(volume),
+            self.resistance.peek(high), self.support.peek(low),
+            self.macd_signal.peek,
+        ))
+
+    def state(self):
+        return {name: kernel.state() for name, kernel in self._kernels().items()}
+
+    def load_state(self, state):
+        for name, kernel in self._kernels().items():
+            kernel.load_state(state[name])
+
+
+class IndicatorEngine:
+    """增量指标引擎：按(symbol, timeframe)维护指标状态，并定期写入检查点"""
+
+    def __init__(self, checkpoint_path="data/indicator_state.json", history_size=500):
+        self.checkpoint_path = checkpoint_path
+        self.history_size = history_size  # 每个序列保留的已收盘指标行数量（需不少于K线窗口）
+        self._series = {}  # (symbol, timeframe) -> {'set', 'last_ts', 'history'}
+        self._loaded = False
+        self._lock = threading.Lock()  # 多交易对并发计算时保护状态和检查点
+
+    # ========== 检查点 ==========
+
+    def _load_checkpoint(self):
+        self._loaded = True
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            for key, entry in saved.items():
+                symbol, timeframe = key.rsplit('|', 1)
+                indicator_set = IndicatorSet()
+                indicator_set.load_state(entry['state'])
+                self._series[(symbol, timeframe)] = {
+                    'set': indicator_set,
+                    'last_ts': entry['last_ts'],
+                    'history': deque(
+                        ((row[0], row[1:]) for row in entry['history']), maxlen=self.history_size
+                    ),
+                }
+            print(f"✓ 指标引擎已从检查点恢复: {len(saved)} 个序列")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ 指标检查点读取失败，将重新预热: {e}")
+            self._series = {}
+
+    def save_checkpoint(self):
+        """写入检查点（先写临时文件再替换，避免写入中断导致文件损坏）"""
+        if not self.checkpoint_path:
+            return
+        saved = {
+            f"{symbol}|{timeframe}": {
+                'state': series['set'].state(),
+                'last_ts': series['last_ts'],
+                'history': [[ts] + list(row) for ts, row in series['history']],
+            }
+            for (symbol, timeframe), series in self._series.items()
+        }
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # ========== 计算 ==========
+
+    def _cold_start(self, key, closed):
+        series = {'set': IndicatorSet(), 'last_ts': None, 'history': deque(maxlen=self.history_size)}
+        self._series[key] = series
+        self._apply(series, closed)
+        return series
+
+    @staticmethod
+    def _apply(series, bars):
+        indicator_set = series['set']
+        history = series['history']
+        for ts, _, high, low, close, volume in bars:
+            history.append((ts, indicator_set.update(high, low, close, volume)))
+            series['last_ts'] = ts
+
+    def update(self, symbol, timeframe, ohlcv):
+        """用最新K线更新指标状态，返回每根K线对应的指标行
+
+        Args:
+            symbol: 交易对
+            timeframe: K线周期
+            ohlcv: [[timestamp, open, high, low, close, volume], ...]，按时间升序，最后一根视为未收盘
+
+        Returns:
+            list: 与ohlcv一一对应的指标行（列顺序见INDICATOR_COLUMNS）
+        """
+        with self._lock:
+            return self._update(symbol, timeframe, ohlcv)
+
+    def _update(self, symbol, timeframe, ohlcv):
+        if not self._loaded:
+            self._load_checkpoint()
+
+        key = (symbol, timeframe)
+        tf_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        closed, forming = ohlcv[:-1], ohlcv[-1]
+
+        series = self._series.get(key)
+        rows_by_ts = None
+        changed = False
+        if series is not None and series['last_ts'] is not None:
+            new_bars = [bar for bar in closed if bar[0] > series['last_ts']]
+            if not new_bars or new_bars[0][0] == series['last_ts'] + tf_ms:
+                self._apply(series, new_bars)
+                changed = bool(new_bars)
+                rows_by_ts = {ts: row for ts, row in series['history']}
+                if any(bar[0] not in rows_by_ts for bar in closed):
+                    rows_by_ts = None
+
+        if rows_by_ts is None:
+            # 首次运行、检查点过期或出现缺口：在当前窗口上重新预热
+            series = self._cold_start(key, closed)
+            changed = True
+            rows_by_ts = {ts: row for ts, row in series['history']}
+
+        if changed:
+            try:
+                self.save_checkpoint()
+            except OSError as e:
+                print(f"⚠️ 指标检查点写入失败: {e}")
+
+        rows = [rows_by_ts[bar[0]] for bar in closed]
+        rows.append(series['set'].peek(forming[2], forming[3], forming[4], forming[5]))
+        return rows
+
+    def compute(self, symbol, timeframe, df, ohlcv):
+        """在K线DataFrame上添加指标列（与 calculate_technical_indicators 的输出一致）
+
+        Args:
+            df: 由ohlcv构建的DataFrame
+            ohlcv: 原始K线列表
+        """
+        rows = self.update(symbol, timeframe, ohlcv)
+        indicators = pd.DataFrame(rows, columns=INDICATOR_COLUMNS, index=df.index)
+        df = pd.concat([df, indicators], axis=1)
+        # 与pandas实现一致：预热期的NaN用后续第一个有效值填充
+        return adopt_technical_indicators(df.bfill().ffill(), timeframe=timeframe)
+
+
+# 全局增量指标引擎实例
+indicator_engine = IndicatorEngine()
@@ -0,0 +1,145 @@
+"""NumPy指标内核模块 - 在连续float64数组上向量化计算技术指标
+
+所有内核接受一维数组（单个交易对）或二维数组（多个交易对，沿最后一个轴为时间），
+一次调用即可计算全部交易对，返回与输入形状相同的float64数组（预热期为NaN）。
+计算结果与 technical_analysis 中的pandas实现一致（误差在浮点精度范围内）。
+输入应为有限数值（K线数据不含NaN）。
+"""
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 块递推中 decay^-i 的上限，防止浮点溢出
+_MAX_BLOCK_SCALE = 1e150
+_MAX_BLOCK = 8192
+
+
+def _as_2d(values):
+    """转换为连续的二维float64数组，返回 (数组, 原始是否为一维)"""
+    array = np.ascontiguousarray(values, dtype=np.float64)
+    if array.ndim == 1:
+        return array.reshape(1, -1), True
+    if array.ndim != 2:
+        raise ValueError(f"只支持一维或二维数组，当前维度: {array.ndim}")
+    return array, False
+
+
+def _restore(array, was_1d):
+    return array[0] if was_1d else array
+
+
+def _linear_recurrence(inputs, decay, initial=None):
+    """向量化计算 y[t] = decay * y[t-1] + inputs[t]
+
+    按块处理：块内用 y[t] = decay^t * cumsum(inputs[i] / decay^i) 一次性求出，
+    块间只传递上一块的最后一个值，避免 decay^-t 在长序列上溢出。
+
+    Args:
+        inputs: 二维数组（行=交易对，列=时间）
+        decay: 衰减系数，0 < decay < 1
+        initial: 每行的初始值 y[-1]（默认0）
+    """
+    rows, length = inputs.shape
+    output = np.empty_like(inputs)
+    if length == 0:
+        return output
+    if decay <= 0.0:
+        output[...] = inputs
+        return output
+
+    block = max(1, min(_MAX_BLOCK, int(math.log(_MAX_BLOCK_SCALE) / -math.log(decay))))
+    powers = decay ** np.arange(block + 1, dtype=np.float64)
+    inverse = 1.0 / powers[:block]
+    carry = np.zeros(rows) if initial is None else np.asarray(initial, dtype=np.float64)
+
+    for start in range(0, length, block):
+        stop = min(start + block, length)
+        size = stop - start
+        segment = output[:, start:stop]
+        np.multiply(inputs[:, start:stop], inverse[:size], out=segment)
+        np.cumsum(segment, axis=1, out=segment)
+        segment *= powers[:size]
+        # 加上上一块传递下来的值：decay^(t+1) * carry
+        segment += carry[:, None] * powers[1:size + 1]
+        carry = segment[:, -1].copy()
+    return output
+
+
+def ema(close, span, adjust=True):
+    """指数移动平均（等价于 Series.ewm(span, adjust).mean()）"""
+    values, was_1d = _as_2d(close)
+    alpha = 2.0 / (span + 1)
+    decay = 1.0 - alpha
+    if adjust:
+        # adjust=True: 加权分子 / 加权分母，分母为等比数列和
+        numerator = _linear_recurrence(values, decay)
+        # decay^(t+1) 小于机器精度后分母恒为 1/alpha，只需计算前段
+        length = values.shape[1]
+        head = length if decay <= 0.0 else min(length, int(math.log(1e-17) / math.log(decay)) + 1)
+        numerator[:, :head] *= alpha / (1.0 - decay ** np.arange(1, head + 1))
+        numerator[:, head:] *= alpha
+        return _restore(numerator, was_1d)
+    # adjust=False: y[0] = x[0]，y[t] = decay * y[t-1] + alpha * x[t]
+    inputs = values * alpha
+    if values.shape[1]:
+        inputs[:, 0] = values[:, 0]
+    return _restore(_linear_recurrence(inputs, decay), was_1d)
+
+
+def rolling_mean(values, window, min_periods=None):
+    """滑动均值（等价于 Series.rolling(window, min_periods).mean()）"""
+    array, was_1d = _as_2d(values)
+    min_periods = window if min_periods is None else min_periods
+    rows, length = array.shape
+    output = np.full((rows, length), np.nan)
+    if length >= window:
+        # 每个窗口独立求和（视图上求和，不累积误差）
+        np.mean(sliding_window_view(array, window, axis=1), axis=2, out=output[:, window - 1:])
+    head = min(window - 1, length)
+    if head > 0 and min_periods < window:
+        counts = np.arange(1, head + 1, dtype=np.float64)
+        partial = np.cumsum(array[:, :head], axis=1) / counts
+        partial[:, :max(min_periods - 1, 0)] = np.nan
+        output[:, :head] = partial
+    return _restore(output, was_1d)
+
+
+def rsi(close, period=14):
+    """RSI（涨跌幅简单滑动均值，与 calculate_rsi_series 算法一致，预热期为NaN）"""
+    values, was_1d = _as_2d(close)
+    delta = np.zeros_like(values)
+    np.subtract(values[:, 1:], values[:, :-1], out=delta[:, 1:])
+    gain = rolling_mean(np.maximum(delta, 0.0), period)
+    loss = rolling_mean(np.maximum(-delta, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gain /= loss
+        gain += 1.0
+        np.divide(100.0, gain, out=gain)
+        np.subtract(100.0, gain, out=gain)
+    return _restore(gain, was_1d)
+
+
+def macd(close, fast=12, slow=26):
+    """MACD线（adjust=True的快慢EMA之差，与 calculate_macd_series 一致）"""
+    line = ema(close, fast, adjust=True)
+    line -= ema(close, slow, adjust=True)
+    return line
+
+
+def true_range(high, low, close):
+    """真实波幅：max(high-low, |high-前收|, |low-前收|)，第一根K线为high-low"""
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    output = high - low
+    if output.shape[1] > 1:
+        prev_close = close[:, :-1]
+        np.maximum(output[:, 1:], np.abs(high[:, 1:] - prev_close), out=output[:, 1:])
+        np.maximum(output[:, 1:], np.abs(low[:, 1:] - prev_close), out=output[:, 1:])
+    return _restore(output, was_1d)
+
+
+def atr(high, low, close, period=14):
+    """平均真实波幅（真实波幅的简单滑动均值，预热期为NaN）"""
+    return rolling_mean(true_range(high, low, close), period)
@@ -0,0 +1,183 @@
+"""指标注册表模块 - 每个(指标, 参数, 周期)在同一版本的DataFrame上只计算一次
+
+同一个周期内，MACD/RSI/EMA 会被 calculate_technical_indicators、calculate_*_series、
+提示词序列和4h数据分别重复计算。注册表把计算结果作为列写入DataFrame，
+并在 df.attrs 中记录 "指标规格 -> 列名" 和K线版本指纹；后续任何模块请求同一指标时直接复用该列。
+K线发生变化（新增K线或未收盘K线刷新）时指纹随之变化，已登记的指标全部失效并按需重新计算。
+指标本身由 indicator_kernels 中的NumPy内核计算。
+"""
+import pandas as pd
+
+from . import indicator_kernels as kernels
+
+# df.attrs 中保存注册表状态的键
+ATTRS_KEY = 'indicator_registry'
+
+
+def _column(df, values):
+    """将内核输出的数组包装为与df对齐的Series"""
+    return pd.Series(values, index=df.index)
+
+
+def _sma(df, window, min_periods=None):
+    return _column(df, kernels.rolling_mean(df['close'].to_numpy(), window, min_periods))
+
+
+def _ema(df, span, adjust=True):
+    return _column(df, kernels.ema(df['close'].to_numpy(), span, adjust))
+
+
+def _macd(df, fast=12, slow=26):
+    fast_col = indicator_registry.ensure(df, 'ema', span=fast, adjust=True)
+    slow_col = indicator_registry.ensure(df, 'ema', span=slow, adjust=True)
+    return df[fast_col] - df[slow_col]
+
+
+def _rsi(df, period=14):
+    return _column(df, kernels.rsi(df['close'].to_numpy(), period))
+
+
+def _tr(df):
+    return _column(df, kernels.true_range(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy()))
+
+
+def _atr(df, period=14):
+    tr_col = indicator_registry.ensure(df, 'tr')
+    return _column(df, kernels.rolling_mean(df[tr_col].to_numpy(), period))
+
+
+def _default_column(name, params):
+    """指标的默认列名（与现有列名保持一致：ema_20、rsi_7、atr_14等）"""
+    if name == 'sma':
+        return f"sma_{params['window']}"
+    if name == 'ema':
+        suffix = '_adj' if params.get('adjust', True) else ''
+        return f"ema_{params['span']}{suffix}"
+    if name == 'macd':
+        fast, slow = params.get('fast', 12), params.get('slow', 26)
+        return 'macd' if (fast, slow) == (12, 26) else f"macd_{fast}_{slow}"
+    if name in ('rsi', 'atr'):
+        return f"{name}_{params.get('period', 14)}"
+    return name
+
+
+# 指标名 -> (计算函数, 默认参数)
+INDICATORS = {
+    'sma': (_sma, {'min_periods': None}),
+    'ema': (_ema, {'adjust': True}),
+    'macd': (_macd, {'fast': 12, 'slow': 26}),
+    'rsi': (_rsi, {'period': 14}),
+    'tr': (_tr, {}),
+    'atr': (_atr, {'period': 14}),
+}
+
+
+class IndicatorRegistry:
+    """指标注册表：按DataFrame版本缓存指标列"""
+
+    @staticmethod
+    def spec_key(name, **params):
+        """指标规格的唯一键（如 'rsi:period=7'）"""
+        defaults = INDICATORS[name][1]
+        merged = {**defaults, **params}
+        return name + ':' + ','.join(f"{k}={merged[k]}" for k in sorted(merged))
+
+    @staticmethod
+    def _version(df):
+        """K线版本指纹：根数、首尾时间和最后一根K线的OHLCV"""
+        if df.empty:
+            return (0,)
+        last = df.iloc[-1]
+        return (
+            len(df),
+            str(df['timestamp'].iloc[0]) if 'timestamp' in df.columns else None,
+            str(last['timestamp']) if 'timestamp' in df.columns else None,
+            float(last['high']), float(last['low']), float(last['close']), float(last['volume']),
+        )
+
+    def _state(self, df, timeframe=None):
+        """读取当前版本的注册表状态，K线或周期变化时重置"""
+        version = self._version(df)
+        state = df.attrs.get(ATTRS_KEY)
+        if (
+            not state
+            or state['version'] != version
+            or (timeframe is not None and state['timeframe'] not in (None, timeframe))
+        ):
+            state = {'version': version, 'timeframe': timeframe, 'columns': {}}
+            df.attrs[ATTRS_KEY] = state
+        elif timeframe is not None and state['timeframe'] is None:
+            state['timeframe'] = timeframe
+        return state
+
+    def ensure(self, df, name, timeframe=None, **params):
+        """确保指标列存在（同一版本只计算一次），返回列名
+
+        Args:
+            df: K线DataFrame（至少包含 high/low/close/volume 列），指标列直接写入该DataFrame
+            name: 指标名（sma/ema/macd/rsi/tr/atr）
+            timeframe: K线周期（可选），用于区分不同周期的DataFrame
+            params: 指标参数（如 period=7、span=20, adjust=False）
+        """
+        func, defaults = INDICATORS[name]
+        merged = {**defaults, **params}
+        key = self.spec_key(name, **params)
+        state = self._state(df, timeframe)
+
+        column = state['columns'].get(key)
+        if column is not None and column in df.columns:
+            return column
+
+        column = _default_column(name, merged)
+        taken = set(state['columns'].values())
+        if column in taken:
+            # 默认列名已被其他规格占用（如不同参数的同名指标），追加序号区分
+            index = 2
+            while f"{column}_{index}" in taken:
+                index += 1
+            column = f"{column}_{index}"
+
+        df[column] = func(df, **merged)
+        # 重新读取状态：计算依赖指标时可能已写入新列
+        state = df.attrs[ATTRS_KEY]
+        state['columns'] = {**state['columns'], key: column}
+        return column
+
+    def adopt(self, df, columns, timeframe=None):
+        """登记已由其他途径计算好的指标列（如 calculate_technical_indicators、增量指标引擎的输出）
+
+        Args:
+            columns: {(指标名, ((参数名, 值), ...)): 列名}
+        """
+        state = self._state(df, timeframe)
+        registered = dict(state['columns'])
+        for (name, params), column in columns.items():
+            registered[self.spec_key(name, **dict(params))] = column
+        state['columns'] = registered
+        return df
+
+    def series(self, df, name, fill=None, timeframe=None, **params):
+        """获取指标序列（pandas Series），fill为NaN的填充值（标量或Series）"""
+        values = df[self.ensure(df, name, timeframe=timeframe, **params)]
+        return values if fill is None else values.fillna(fill)
+
+
+# calculate_technical_indicators 与增量指标引擎输出中可复用的指标列
+TECHNICAL_INDICATOR_COLUMNS = {
+    ('sma', (('window', 5), ('min_periods', 1))): 'sma_5',
+    ('sma', (('window', 20), ('min_periods', 1))): 'sma_20',
+    ('sma', (('window', 50), ('min_periods', 1))): 'sma_50',
+    ('ema', (('span', 12), ('adjust', True))): 'ema_12',
+    ('ema', (('span', 26), ('adjust', True))): 'ema_26',
+    ('macd', ()): 'macd',
+    ('rsi', (('period', 14),)): 'rsi',
+}
+
+
+def adopt_technical_indicators(df, timeframe=None):
+    """登记 calculate_technical_indicators 格式的指标列"""
+    return indicator_registry.adopt(df, TECHNICAL_INDICATOR_COLUMNS, timeframe=timeframe)
+
+
+# 全局指标注册表实例
+indicator_registry = IndicatorRegistry()
@@ -0,0 +1,83 @@
+"""杠杆缓存模块 - 记录每个交易对已生效的杠杆和保证金模式，只在真正变化时调用 set_leverage
+
+原流程每次BUY/SELL下单前都调用一次 exchange.set_leverage（签名的私有接口），
+即使AI要求的杠杆与上次相同，关键路径上每笔交易都多一次往返。
+缓存的来源：
+1. 启动时 fetch_positions 返回的持仓杠杆；
+2. 每周期获取持仓时同步（在交易所网页上手动修改杠杆也能及时反映）；
+3. set_leverage 成功后更新；调用失败时用 fetch_leverage 重新同步。
+"""
+import threading
+
+from .config import exchange
+
+
+class LeverageCache:
+    """交易对 -> (杠杆倍数, 保证金模式)"""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        """已知的 (杠杆, 保证金模式)，未知时返回None"""
+        with self._lock:
+            return self._state.get(symbol)
+
+    def seed(self, symbol, leverage, margin_mode='cross'):
+        """记录交易对当前生效的杠杆和保证金模式"""
+        if not leverage:
+            return
+        with self._lock:
+            self._state[symbol] = (int(float(leverage)), margin_mode)
+
+    def observe(self, position):
+        """从交易所返回的持仓（ccxt格式）同步杠杆"""
+        if not position or not position.get('symbol') or not position.get('leverage'):
+            return
+        self.seed(position['symbol'], position['leverage'], position.get('marginMode') or 'cross')
+
+    def invalidate(self, symbol=None):
+        """清除缓存（symbol为None时清除全部）"""
+        with self._lock:
+            if symbol is None:
+                self._state.clear()
+            else:
+                self._state.pop(symbol, None)
+
+    def refresh(self, symbol, margin_mode='cross'):
+        """用 fetch_leverage 从交易所重新同步杠杆"""
+        try:
+            info = exchange.fetch_leverage(symbol, {'marginMode': margin_mode})
+            leverage = info.get('longLeverage') or info.get('shortLeverage')
+            if leverage:
+                self.seed(symbol, leverage, info.get('marginMode') or margin_mode)
+            else:
+                self.invalidate(symbol)
+        except Exception as e:
+            self.invalidate(symbol)
+            print(f"⚠️ 获取{symbol}杠杆失败: {e}")
+
+    def ensure(self, symbol, leverage, margin_mode='cross'):
+        """确保交易对使用指定杠杆和保证金模式，只有与缓存不同时才调用 set_leverage
+
+        Returns:
+            bool: 是否实际调用了 set_leverage
+
+        Raises:
+            Exception: set_leverage 失败（此时已用 fetch_leverage 重新同步缓存）
+        """
+        leverage = int(leverage)
+        if self.get(symbol) == (leverage, margin_mode):
+            return False
+        try:
+            exchange.set_leverage(leverage, symbol, {'mgnMode': margin_mode})
+        except Exception:
+            self.refresh(symbol, margin_mode)
+            raise
+        self.seed(symbol, leverage, margin_mode)
+        return True
+
+
+# 全局杠杆缓存实例
+leverage_cache = LeverageCache()
@@ -0,0 +1,232 @@
+"""LLM调用器模块 - 带对冲请求和周期截止时间的DeepSeek调用
+
+一次缓慢的DeepSeek回复可能把决策拖到下一根K线之后。调用器：
+1. 以本周期截止时间（下一个整点减去安全余量）作为硬性预算，每个请求的超时都不超过剩余预算；
+2. 主请求超过对冲阈值（最近调用耗时的p90）仍未返回时，再发出一个相同的对冲请求，
+   取先返回的结果并取消另一个（同步调用中只有流式请求能真正中止，非流式请求无法中断，
+   会在后台运行到返回或请求超时为止；异步调用直接取消任务）；
+3. 记录成功调用的耗时，动态更新对冲阈值。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .config import TRADE_CONFIG
+
+# 默认参数（可在 TRADE_CONFIG['llm_caller'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'hedge': True,
+    'hedge_percentile': 90,
+    'hedge_min_samples': 5,
+    'hedge_after_seconds': 20,
+    'deadline_margin_seconds': 15,
+    'min_attempt_seconds': 5,
+}
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('llm_caller', {})}
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """本周期剩余时间不足以完成LLM调用"""
+
+
+class LLMCaller:
+    """对冲 + 截止时间约束的LLM调用器"""
+
+    def __init__(self, history_size=50):
+        self._latencies = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        # 对冲请求需要主请求之外的额外线程
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='llm')
+
+    # ========== 预算 ==========
+
+    @staticmethod
+    def cycle_deadline():
+        """本周期截止时间（时间戳）：下一个执行整点减去安全余量"""
+        interval = TRADE_CONFIG['interval_minutes'] * 60
+        now = time.time()
+        next_period = (now // interval + 1) * interval
+        return next_period - _settings()['deadline_margin_seconds']
+
+    def remaining(self, deadline=None):
+        """距截止时间的剩余秒数"""
+        return (deadline or self.cycle_deadline()) - time.time()
+
+    def has_budget(self, deadline=None):
+        """剩余时间是否足够再发起一次调用"""
+        return self.remaining(deadline) >= _settings()['min_attempt_seconds']
+
+    def _request_timeout(self, remaining):
+        """单个请求的超时：不超过 llm_timeout_seconds 和剩余预算"""
+        return max(0.0, min(TRADE_CONFIG.get('llm_timeout_seconds', 60), remaining))
+
+    # ========== 对冲阈值 ==========
+
+    def hedge_delay(self):
+        """对冲阈值（秒）：样本足够时取最近调用耗时的分位数，否则用默认值"""
+        settings = _settings()
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < settings['hedge_min_samples']:
+            return settings['hedge_after_seconds']
+        index = min(len(samples) - 1, int(len(samples) * settings['hedge_percentile'] / 100))
+        return samples[index]
+
+    def _record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    @staticmethod
+    def _log(tag, latency, hedged):
+        suffix = "（已发出对冲请求）" if hedged else ""
+        label = "对冲请求" if tag == 'hedge' else "主请求"
+        print(f"⏱️ LLM调用完成: {label}先返回，耗时 {latency:.2f}s{suffix}")
+
+    # ========== 同步调用 ==========
+
+    def call(self, request, deadline=None):
+        """发起带对冲和截止时间的调用
+
+        Args:
+            request: request(cancel_event, timeout) -> 结果；cancel_event被设置时应尽快结束
+                （流式请求在下一个数据块处停止；非流式请求无法中断，只能等待其在timeout内结束）
+            deadline: 截止时间戳，默认为本周期截止时间
+
+        Returns:
+            先成功返回的请求结果
+
+        Raises:
+            LLMDeadlineExceeded: 剩余预算不足或截止前没有请求成功
+        """
+        settings = _settings()
+        deadline = deadline or self.cycle_deadline()
+        if not self.has_budget(deadline):
+            raise LLMDeadlineExceeded(f"本周期剩余时间不足（{self.remaining(deadline):.1f}秒），跳过LLM调用")
+
+        started = time.perf_counter()
+        hedge_at = self.hedge_delay() if settings['hedge'] else None
+        cancel_events = []
+        errors = []
+
+        def launch(tag):
+            cancel_event = threading.Event()
+            cancel_events.append(cancel_event)
+            timeout = self._request_timeout(self.remaining(deadline))
+
+            def run():
+                request_started = time.perf_counter()
+                result = request(cancel_event, timeout)
+                return tag, result, time.perf_counter() - request_started
+            return self._executor.submit(run)
+
+        pending = {launch('primary')}
+        hedged = False
+        try:
+            while pending:
+                remaining = self.remaining(deadline)
+                if remaining <= 0:
+                    break
+                wait_time = remaining
+                if not hedged and hedge_at is not None:
+                    wait_time = min(wait_time, max(0.0, hedge_at - (time.perf_counter() - started)))
+                done, pending = wait(pending, timeout=wait_time, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        tag, result, latency = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    self._record(latency)
+                    self._log(tag, latency, hedged)
+                    return result
+
+                # 主请求超过对冲阈值，或已失败且尚未对冲：发出对冲请求
+                elapsed = time.perf_counter() - started
+                if not hedged and (hedge_at is not None and elapsed >= hedge_at or not pending):
+                    if not self.has_budget(deadline):
+                        # 剩余预算不足以再发对冲请求：不再对冲，只等待已发出的请求
+                        hedge_at = None
+                        continue
+                    hedged = True
+                    print(f"⏱️ 主请求{'失败' if not pending else f'超过 {hedge_at:.1f}s 未返回'}，发出对冲请求")
+                    pending.add(launch('hedge'))
+        finally:
+            # 取消仍在进行的请求（流式请求会在下一个数据块处停止）
+            for cancel_event in cancel_events:
+                cancel_event.set()
+
+        if errors and not pending:
+            raise errors[-1]
+        raise LLMDeadlineExceeded(f"LLM调用在本周期截止时间前未完成（已用 {time.perf_counter() - started:.1f}s）")
+
+    # ========== 异步调用 ==========
+
+    async def acall(self, request, deadline=None):
+        """call 的异步版本
+
+        Args:
+            request: request(timeout) -> 协程；落后的请求会被直接取消
+        """
+        settings = _settings()
+        deadline = deadline or self.cycle_deadline()
+        if not self.has_budget(deadline):
+            raise LLMDeadlineExceeded(f"本周期剩余时间不足（{self.remaining(deadline):.1f}秒），跳过LLM调用")
+
+        started = time.perf_counter()
+        hedge_at = self.hedge_delay() if settings['hedge'] else None
+        errors = []
+
+        async def run(tag, timeout):
+            request_started = time.perf_counter()
+            result = await request(timeout)
+            return tag, result, time.perf_counter() - request_started
+
+        def launch(tag):
+            return asyncio.ensure_future(run(tag, self._request_timeout(self.remaining(deadline))))
+
+        pending = {launch('primary')}
+        hedged = False
+        try:
+            while pending:
+                remaining = self.remaining(deadline)
+                if remaining <= 0:
+                    break
+                wait_time = remaining
+                if not hedged and hedge_at is not None:
+                    wait_time = min(wait_time, max(0.0, hedge_at - (time.perf_counter() - started)))
+                done, pending = await asyncio.wait(pending, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        tag, result, latency = task.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    self._record(latency)
+                    self._log(tag, latency, hedged)
+                    return result
+
+                elapsed = time.perf_counter() - started
+                if not hedged and (hedge_at is not None and elapsed >= hedge_at or not pending):
+                    if not self.has_budget(deadline):
+                        # 剩余预算不足以再发对冲请求：不再对冲，只等待已发出的请求
+                        hedge_at = None
+                        continue
+                    hedged = True
+                    print(f"⏱️ 主请求{'失败' if not pending else f'超过 {hedge_at:.1f}s 未返回'}，发出对冲请求")
+                    pending.add(launch('hedge'))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if errors and not pending:
+            raise errors[-1]
+        raise LLMDeadlineExceeded(f"LLM调用在本周期截止时间前未完成（已用 {time.perf_counter() - started:.1f}s）")
+
+
+# 全局LLM调用器实例
+llm_caller = LLMCaller()
@@ -0,0 +1,323 @@
+"""LLM流式调用模块 - 边接收边解析JSON，决策完整后立即停止读取
+
+非流式调用需要等待整个回复生成完毕才能解析。流式模式下每收到一段文本就交给
+增量JSON提取器，一旦第一个完整的交易决策JSON闭合就关闭连接返回（说明文字中的 "{signal}"、
+"{}" 等片段不算）；
+超过时间预算或token预算时中止，避免等待失控的长回复。
+JSON完整后最多再等待 usage_grace_seconds 接收服务端的token用量（含前缀缓存命中数）。
+"""
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import TRADE_CONFIG
+from .signal_parser import is_decision, loads_lenient
+
+# 默认参数（可在 TRADE_CONFIG['llm_stream'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'time_budget_seconds': 60,
+    'max_tokens': 2048,
+    'usage_grace_seconds': 0.3,
+}
+
+
+def stream_settings():
+    """读取流式调用配置"""
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('llm_stream', {})}
+
+
+class PromptCacheStats:
+    """前缀缓存命中统计（来自API返回的usage字段）
+
+    DeepSeek在usage中返回 prompt_cache_hit_tokens / prompt_cache_miss_tokens，
+    其他OpenAI兼容服务返回 prompt_tokens_details.cached_tokens。
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.hit_tokens = 0
+        self.miss_tokens = 0
+
+    @staticmethod
+    def extract(usage):
+        """提取 (命中token数, 未命中token数)，usage中没有缓存字段时返回None"""
+        if usage is None:
+            return None
+        hit = getattr(usage, 'prompt_cache_hit_tokens', None)
+        miss = getattr(usage, 'prompt_cache_miss_tokens', None)
+        if hit is not None and miss is not None:
+            return int(hit), int(miss)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', None) if details is not None else None
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if cached is not None and prompt_tokens is not None:
+            return int(cached), int(prompt_tokens) - int(cached)
+        return None
+
+    def record(self, usage):
+        """记录一次调用的缓存命中情况并打印"""
+        tokens = self.extract(usage)
+        if tokens is None:
+            return
+        hit, miss = tokens
+        self.calls += 1
+        self.hit_tokens += hit
+        self.miss_tokens += miss
+        rate = hit / (hit + miss) * 100 if hit + miss else 0.0
+        total = self.hit_tokens + self.miss_tokens
+        total_rate = self.hit_tokens / total * 100 if total else 0.0
+        print(f"🗄️ 前缀缓存: 命中 {hit} / 未命中 {miss} tokens（命中率 {rate:.1f}%，"
+              f"累计 {self.calls} 次调用命中率 {total_rate:.1f}%）")
+
+
+# 全局前缀缓存统计实例
+prompt_cache_stats = PromptCacheStats()
+
+
+class IncrementalJSONExtractor:
+    """增量JSON提取器：逐段输入文本，第一个作为交易决策的顶层JSON值闭合时返回其文本
+
+    跳过JSON之前的说明文字和代码块标记，正确处理字符串中的括号和转义字符。
+    闭合的片段无法解析或不含 signal / decisions 时（如说明文字中的 "{signal}"）丢弃并继续寻找。
+    每个字符只扫描一次（闭合时解析一次候选片段）。
+    """
+
+    def __init__(self, openers='{'):
+        """
+        Args:
+            openers: 允许作为顶层JSON起点的字符（'{' 只接受对象，'{[' 同时接受数组）
+        """
+        self.openers = openers
+        self._chunks = []
+        self._length = 0
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self.result = None
+
+    @property
+    def text(self):
+        """已接收的全部文本"""
+        return ''.join(self._chunks)
+
+    def feed(self, chunk):
+        """输入一段文本
+
+        Returns:
+            str: JSON已完整时返回JSON文本，否则返回None
+        """
+        if self.result is not None or not chunk:
+            return self.result
+        offset = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+
+        for index, char in enumerate(chunk):
+            if self._start is None:
+                if char in self.openers:
+                    self._start = offset + index
+                    self._stack.append('}' if char == '{' else ']')
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._stack.append('}' if char == '{' else ']')
+            elif char in '}]':
+                if not self._stack or char != self._stack[-1]:
+                    # 括号不匹配：放弃当前起点，从下一个字符重新寻找
+                    self._reset()
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    candidate = self.text[self._start:offset + index + 1]
+                    if self._is_decision(candidate):
+                        self.result = candidate
+                        return self.result
+                    self._reset()
+        return None
+
+    @staticmethod
+    def _is_decision(candidate):
+        try:
+            return is_decision(loads_lenient(candidate))
+        except json.JSONDecodeError:
+            return False
+
+    def _reset(self):
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+
+@dataclass
+class StreamResult:
+    """一次流式调用的结果"""
+    text: str = ''  # 已接收的全部文本
+    json_text: Optional[str] = None  # 提取出的完整JSON文本
+    stop_reason: str = ''  # complete（JSON完整）/ finished（回复结束）/ time_budget / token_budget / cancelled
+    elapsed: float = 0.0  # 总耗时（秒）
+    first_token_latency: Optional[float] = None  # 首个token耗时（秒）
+    chunks: int = 0  # 收到的数据块数量（约等于token数）
+    usage: Optional[object] = None  # 服务端返回的token用量（宽限时间内未收到时为None）
+
+
+def _request_kwargs(messages, model, temperature, settings, time_budget, extra=None):
+    kwargs = {
+        'model': model,
+        'messages': messages,
+        'stream': True,
+        'temperature': temperature,
+        'max_tokens': settings['max_tokens'],
+        'timeout': time_budget,
+        'stream_options': {'include_usage': True},
+    }
+    kwargs.update(extra or {})
+    return kwargs
+
+
+def _chunk_text(chunk):
+    if not chunk.choices:
+        return ''
+    return chunk.choices[0].delta.content or ''
+
+
+def _log_result(result):
+    first = f"{result.first_token_latency:.2f}s" if result.first_token_latency is not None else "N/A"
+    labels = {
+        'complete': '决策JSON已完整，提前结束读取',
+        'finished': '回复结束',
+        'time_budget': '超过时间预算，已中止',
+        'token_budget': '超过token预算，已中止',
+        'cancelled': '已被取消（其他请求先返回）',
+    }
+    print(f"📶 流式调用: {labels.get(result.stop_reason, result.stop_reason)} | 首token {first} | "
+          f"总耗时 {result.elapsed:.2f}s | {result.chunks} 个数据块")
+
+
+def stream_completion(client, messages, model="deepseek-chat", temperature=0.1, openers='{',
+                      settings=None, extra=None, timeout=None, cancel_event=None):
+    """流式调用chat.completions，第一个完整JSON出现后立即停止
+
+    Args:
+        client: OpenAI客户端
+        messages: 消息列表
+        openers: 顶层JSON的起始字符（'{' 或 '{['）
+        settings: 流式配置，默认读取 TRADE_CONFIG['llm_stream']
+        extra: 额外的请求参数
+        timeout: 本次调用的时间上限（秒），与配置的时间预算取较小值
+        cancel_event: threading.Event，被设置时在下一个数据块处停止读取
+
+    Returns:
+        StreamResult
+    """
+    settings = settings or stream_settings()
+    time_budget = settings['time_budget_seconds'] if timeout is None else min(timeout, settings['time_budget_seconds'])
+    started = time.perf_counter()
+    extractor = IncrementalJSONExtractor(openers)
+    result = StreamResult(stop_reason='finished')
+
+    stream = client.chat.completions.create(**_request_kwargs(messages, model, temperature, settings, time_budget, extra))
+    completed_at = None
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                result.stop_reason = 'cancelled'
+                break
+            if getattr(chunk, 'usage', None):
+                result.usage = chunk.usage
+            if completed_at is not None:
+                # JSON已完整，只在宽限时间内等待usage
+                if result.usage is not None or time.perf_counter() - completed_at > settings['usage_grace_seconds']:
+                    break
+                continue
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            result.chunks += 1
+            if result.first_token_latency is None:
+                result.first_token_latency = time.perf_counter() - started
+            if extractor.feed(text) is not None:
+                result.stop_reason = 'complete'
+                completed_at = time.perf_counter()
+                if settings['usage_grace_seconds'] <= 0:
+                    break
+                continue
+            if time.perf_counter() - started > time_budget:
+                result.stop_reason = 'time_budget'
+                break
+            if result.chunks >= settings['max_tokens']:
+                result.stop_reason = 'token_budget'
+                break
+    finally:
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+    result.text = extractor.text
+    result.json_text = extractor.result
+    result.elapsed = time.perf_counter() - started
+    _log_result(result)
+    prompt_cache_stats.record(result.usage)
+    return result
+
+
+async def astream_completion(aclient, messages, model="deepseek-chat", temperature=0.1, openers='{',
+                             settings=None, extra=None, timeout=None):
+    """stream_completion 的异步版本（AsyncOpenAI客户端，通过取消任务中止）"""
+    settings = settings or stream_settings()
+    time_budget = settings['time_budget_seconds'] if timeout is None else min(timeout, settings['time_budget_seconds'])
+    started = time.perf_counter()
+    extractor = IncrementalJSONExtractor(openers)
+    result = StreamResult(stop_reason='finished')
+
+    stream = await aclient.chat.completions.create(**_request_kwargs(messages, model, temperature, settings, time_budget, extra))
+    completed_at = None
+    try:
+        async for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                result.usage = chunk.usage
+            if completed_at is not None:
+                if result.usage is not None or time.perf_counter() - completed_at > settings['usage_grace_seconds']:
+                    break
+                continue
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            result.chunks += 1
+            if result.first_token_latency is None:
+                result.first_token_latency = time.perf_counter() - started
+            if extractor.feed(text) is not None:
+                result.stop_reason = 'complete'
+                completed_at = time.perf_counter()
+                if settings['usage_grace_seconds'] <= 0:
+                    break
+                continue
+            if time.perf_counter() - started > time_budget:
+                result.stop_reason = 'time_budget'
+                break
+            if result.chunks >= settings['max_tokens']:
+                result.stop_reason = 'token_budget'
+                break
+    finally:
+        close = getattr(stream, 'close', None)
+        if close:
+            await close()
+
+    result.text = extractor.text
+    result.json_text = extractor.result
+    result.elapsed = time.perf_counter() - started
+    _log_result(result)
+    prompt_cache_stats.record(result.usage)
+    return result
@@ -1,8 +1,11 @@
 """市场数据获取模块"""
+import sqlite3
 import pandas as pd
 import ccxt
 from datetime import datetime
 from .config import exchange, TRADE_CONFIG
+from .candle_store import candle_store
+from .indicator_engine import indicator_engine
 from .technical_analysis import (
     calculate_technical_indicators,
     get_market_trend,
@@ -10,6 +13,31 @@ from .technical_analysis import (
 )
 
 
+def _fetch_ohlcv(ex, symbol=None):
+    """获取K线数据：优先从本地K线存储增量同步，存储不可用时回退为全量拉取
+
+    Args:
+        ex: ccxt交易所实例
+        symbol: 交易对，默认TRADE_CONFIG['symbol']
+    """
+    symbol = symbol or TRADE_CONFIG['symbol']
+    if TRADE_CONFIG.get('candle_store', {}).get('enabled', True):
+        try:
+            return candle_store.sync(
+                ex,
+                symbol,
+                TRADE_CONFIG['timeframe'],
+                TRADE_CONFIG['data_points']
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ 本地K线存储不可用，改为全量拉取: {e}")
+    return ex.fetch_ohlcv(
+        symbol,
+        TRADE_CONFIG['timeframe'],
+        limit=TRADE_CONFIG['data_points']
+    )
+
+
 def get_btc_ohlcv_enhanced():
     """增强版：获取BTC K线数据并计算技术指标"""
     try:
@@ -20,12 +48,8 @@ def get_btc_ohlcv_enhanced():
         ohlcv = None
         first_error = None
         try:
-            # 直接调用fetch_ohlcv，不加载markets
-            ohlcv = exchange.fetch_ohlcv(
-                TRADE_CONFIG['symbol'], 
-                TRADE_CONFIG['timeframe'],
-                limit=TRADE_CONFIG['data_points']
-            )
+            # 直接调用fetch_ohlcv，不加载markets（增量同步本地K线存储）
+            ohlcv = _fetch_ohlcv(exchange)
             print(f"✓ K线数据获取成功: {len(ohlcv)} 条记录")
         except Exception as e:
             first_error = e
@@ -39,11 +63,7 @@ def get_btc_ohlcv_enhanced():
                     },
                     # 不提供API密钥，使用公共接口
                 })
-                ohlcv = public_exchange.fetch_ohlcv(
-                    TRADE_CONFIG['symbol'], 
-                    TRADE_CONFIG['timeframe'],
-                    limit=TRADE_CONFIG['data_points']
-                )
+                ohlcv = _fetch_ohlcv(public_exchange)
                 print(f"✓ 公共API成功: 获取到 {len(ohlcv)} 条K线数据")
             except Exception as public_error:
                 # 如果公共API也失败，使用第一个错误进行详细分析
@@ -94,46 +114,63 @@ def get_btc_ohlcv_enhanced():
         if ohlcv is None:
             raise ValueError("未能获取K线数据")
 
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return _build_price_data(ohlcv)
+    except Exception as e:
+        print(f"获取增强K线数据失败: {e}")
+        return None
+
 
-        # 计算技术指标
-        df = calculate_technical_indicators(df)
+def _build_price_data(ohlcv, symbol=None):
+    """由K线数据构建price_data：计算技术指标、趋势和支撑阻力
 
-        current_data = df.iloc[-1]
-        previous_data = df.iloc[-2]
+    Args:
+        ohlcv: K线列表，最后一根为未收盘K线
+        symbol: 交易对，默认TRADE_CONFIG['symbol']（用于区分增量指标引擎的状态）
+    """
+    symbol = symbol or TRADE_CONFIG['symbol']
+    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+
+    # 计算技术指标：优先使用增量指标引擎，失败时回退为全量pandas计算
+    if TRADE_CONFIG.get('indicator_engine', {}).get('enabled', True):
+        try:
+            df = indicator_engine.compute(symbol, TRADE_CONFIG['timeframe'], df, ohlcv)
+        except Exception as e:
+            print(f"⚠️ 增量指标引擎计算失败，改为全量计算: {e}")
+            df = calculate_technical_indicators(df)
+    else:
+        df = calculate_technical_indicators(df)
 
-        # 获取技术分析数据
-        trend_analysis = get_market_trend(df)
-        levels_analysis = get_support_resistance_levels(df)
+    current_data = df.iloc[-1]
+    previous_data = df.iloc[-2]
 
-        return {
-            'price': current_data['close'],
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'high': current_data['high'],
-            'low': current_data['low'],
-            'volume': current_data['volume'],
-            'timeframe': TRADE_CONFIG['timeframe'],
-            'price_change': ((current_data['close'] - previous_data['close']) / previous_data['close']) * 100,
-            'kline_data': df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].tail(10).to_dict('records'),
-            'technical_data': {
-                'sma_5': current_data.get('sma_5', 0),
-                'sma_20': current_data.get('sma_20', 0),
-                'sma_50': current_data.get('sma_50', 0),
-                'rsi': current_data.get('rsi', 0),
-                'macd': current_data.get('macd', 0),
-                'macd_signal': current_data.get('macd_signal', 0),
-                'macd_histogram': current_data.get('macd_histogram', 0),
-                'bb_upper': current_data.get('bb_upper', 0),
-                'bb_lower': current_data.get('bb_lower', 0),
-                'bb_position': current_data.get('bb_position', 0),
-                'volume_ratio': current_data.get('volume_ratio', 0)
-            },
-            'trend_analysis': trend_analysis,
-            'levels_analysis': levels_analysis,
-            'full_data': df
-        }
-    except Exception as e:
-        print(f"获取增强K线数据失败: {e}")
-        return None
+    # 获取技术分析数据
+    trend_analysis = get_market_trend(df)
+    levels_analysis = get_support_resistance_levels(df)
 
+    return {
+        'price': current_data['close'],
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'high': current_data['high'],
+        'low': current_data['low'],
+        'volume': current_data['volume'],
+        'timeframe': TRADE_CONFIG['timeframe'],
+        'price_change': ((current_data['close'] - previous_data['close']) / previous_data['close']) * 100,
+        'kline_data': df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].tail(10).to_dict('records'),
+        'technical_data': {
+            'sma_5': current_data.get('sma_5', 0),
+            'sma_20': current_data.get('sma_20', 0),
+            'sma_50': current_data.get('sma_50', 0),
+            'rsi': current_data.get('rsi', 0),
+            'macd': current_data.get('macd', 0),
+            'macd_signal': current_data.get('macd_signal', 0),
+            'macd_histogram': current_data.get('macd_histogram', 0),
+            'bb_upper': current_data.get('bb_upper', 0),
+            'bb_lower': current_data.get('bb_lower', 0),
+            'bb_position': current_data.get('bb_position', 0),
+            'volume_ratio': current_data.get('volume_ratio', 0)
+        },
+        'trend_analysis': trend_analysis,
+        'levels_analysis': levels_analysis,
+        'full_data': df
+    }
@@ -0,0 +1,98 @@
+"""市场快照模块 - 并发获取一个周期所需的全部行情和账户数据
+
+3m K线、余额、持仓、OI/资金费率、4h K线之间互不依赖，
+并发发出后从收盘到提示词就绪的耗时等于最慢的单个请求，而不是所有请求之和。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .config import exchange, TRADE_CONFIG
+from .cycle_context import cycle_context
+from .market_data import get_btc_ohlcv_enhanced
+from .position_manager import get_current_position
+from .ai_analyzer import _get_oi_and_funding_rate, _get_4h_data
+from .timeframe_cache import timeframe_cache
+
+# 常驻线程池，避免每个周期重复创建线程
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='snapshot')
+
+
+@dataclass
+class MarketSnapshot:
+    """一个周期的市场与账户快照"""
+    price_data: Optional[Dict[str, Any]] = None  # get_btc_ohlcv_enhanced() 的返回值
+    balance: Optional[Dict[str, Any]] = None  # exchange.fetch_balance() 的返回值
+    position: Optional[Dict[str, Any]] = None  # get_current_position() 的返回值
+    oi_data: Optional[Dict[str, Any]] = None  # _get_oi_and_funding_rate() 的返回值
+    data_4h: Optional[Dict[str, Any]] = None  # _get_4h_data() 的返回值
+    latencies: Dict[str, float] = field(default_factory=dict)  # 各请求耗时（秒）
+    errors: Dict[str, str] = field(default_factory=dict)  # 失败或超时的请求
+    elapsed: float = 0.0  # 总耗时（秒）
+
+
+def _timed(func):
+    """包装请求，返回 (结果, 耗时)"""
+    def run():
+        started = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - started
+    return run
+
+
+def gather_market_snapshot(timeout=None, oi_data=None):
+    """并发获取本周期所需的全部数据
+
+    Args:
+        timeout: 单个请求的超时时间（秒），默认读取 TRADE_CONFIG['fetch_timeout_seconds']
+        oi_data: 整点前已预构建的OI/资金费率数据（提供时不再请求）
+
+    Returns:
+        MarketSnapshot: 超时或失败的字段为None，原因记录在errors中
+    """
+    if timeout is None:
+        timeout = TRADE_CONFIG.get('fetch_timeout_seconds', 10)
+    symbol = TRADE_CONFIG['symbol']
+    started = time.perf_counter()
+
+    tasks = {
+        'price_data': get_btc_ohlcv_enhanced,
+        'balance': cycle_context.fetch_balance,
+        'position': get_current_position,
+        'oi_data': lambda: _get_oi_and_funding_rate(symbol),
+        '4h': lambda: timeframe_cache.prefetch(exchange, symbol, '4h', limit=60),
+    }
+    if oi_data is not None:
+        del tasks['oi_data']
+    futures = {name: _executor.submit(_timed(func)) for name, func in tasks.items()}
+
+    snapshot = MarketSnapshot()
+    results = {}
+    for name, future in futures.items():
+        # 所有请求同时发出，因此每个请求的截止时间都从同一起点计算
+        remaining = max(0.0, timeout - (time.perf_counter() - started))
+        try:
+            results[name], snapshot.latencies[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            snapshot.errors[name] = f"超时（>{timeout}秒）"
+        except Exception as e:
+            snapshot.errors[name] = str(e)
+
+    snapshot.price_data = results.get('price_data')
+    snapshot.balance = results.get('balance')
+    snapshot.position = results.get('position')
+    snapshot.oi_data = results.get('oi_data', oi_data)
+
+    # 4h已收盘K线已预取，未收盘K线用3m K线在本地重采样（无网络请求）
+    if '4h' in results:
+        base_df = snapshot.price_data.get('full_data') if snapshot.price_data else None
+        snapshot.data_4h = _get_4h_data(symbol, base_df=base_df)
+
+    snapshot.elapsed = time.perf_counter() - started
+    slowest = max(snapshot.latencies.values()) if snapshot.latencies else 0.0
+    print(f"⚡ 并发获取市场快照: 总耗时 {snapshot.elapsed:.2f}s, 最慢请求 {slowest:.2f}s, "
+          f"串行合计 {sum(snapshot.latencies.values()):.2f}s")
+    for name, error in snapshot.errors.items():
+        print(f"⚠️ 快照请求 {name} 失败: {error}")
+    return snapshot
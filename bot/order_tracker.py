@@ -0,0 +1,132 @@
+"""订单跟踪模块 - 下单后轮询订单状态，确认成交即返回实际成交价和成交量
+
+原流程在反手时平仓后固定 sleep(1) 再开仓，下单后再固定 sleep(2) 才读取持仓，
+每次交易至少多等3秒，且交易记录使用的是下单前的行情价而不是实际成交价。
+订单跟踪器下单后立即用 fetch_order 轮询（间隔从 initial_delay 开始按 backoff 倍数增长，
+不超过 max_delay），订单一旦完全成交就返回；超过 timeout_seconds 仍未成交时返回当前状态。
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .config import exchange, TRADE_CONFIG
+
+# 默认参数（可在 TRADE_CONFIG['order_tracker'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'initial_delay': 0.05,
+    'max_delay': 0.5,
+    'backoff': 1.5,
+    'timeout_seconds': 5,
+}
+
+# 未成交即结束的订单状态（ccxt统一状态）
+ABORTED_STATUSES = ('canceled', 'expired', 'rejected')
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('order_tracker', {})}
+
+
+@dataclass
+class OrderFill:
+    """订单成交结果"""
+    order_id: Optional[str]
+    symbol: str
+    side: str
+    amount: float  # 下单数量（张）
+    filled: float = 0.0  # 实际成交数量（张）
+    average: Optional[float] = None  # 成交均价
+    status: str = 'open'  # ccxt统一状态：open / closed / canceled / expired / rejected
+    elapsed: float = 0.0  # 从下单到确认成交的耗时（秒）
+    polls: int = 0  # fetch_order 调用次数
+    order: Optional[Dict[str, Any]] = None  # 最后一次获取到的原始订单
+
+    @property
+    def is_filled(self):
+        """是否已完全成交"""
+        return self.status == 'closed' or (self.amount > 0 and self.filled >= self.amount)
+
+    def update(self, order):
+        """用交易所返回的订单更新成交信息"""
+        self.order = order
+        self.order_id = order.get('id') or self.order_id
+        self.status = order.get('status') or self.status
+        if order.get('filled') is not None:
+            self.filled = float(order['filled'])
+        average = order.get('average') or order.get('price')
+        if average:
+            self.average = float(average)
+
+
+class OrderTracker:
+    """下单并确认成交"""
+
+    def wait_for_fill(self, fill, timeout=None):
+        """轮询订单状态直到完全成交、进入终态或超时
+
+        Args:
+            fill: 下单后创建的 OrderFill
+            timeout: 最长等待秒数，默认 TRADE_CONFIG['order_tracker']['timeout_seconds']
+
+        Returns:
+            OrderFill: 更新后的成交结果
+        """
+        settings = _settings()
+        started = time.perf_counter()
+        timeout = settings['timeout_seconds'] if timeout is None else timeout
+        delay = settings['initial_delay']
+        while not (fill.is_filled and fill.average) and fill.status not in ABORTED_STATUSES:
+            if time.perf_counter() - started >= timeout:
+                print(f"⚠️ 订单 {fill.order_id} 在 {timeout:.1f} 秒内未确认成交（状态: {fill.status}，"
+                      f"已成交 {fill.filled}/{fill.amount}）")
+                break
+            time.sleep(delay)
+            delay = min(delay * settings['backoff'], settings['max_delay'])
+            try:
+                fill.polls += 1
+                fill.update(exchange.fetch_order(fill.order_id, fill.symbol))
+            except Exception as e:
+                # 下单后立即查询可能暂时查不到订单，继续轮询
+                print(f"⚠️ 查询订单 {fill.order_id} 失败: {e}")
+        fill.elapsed += time.perf_counter() - started
+        return fill
+
+    def market_order(self, symbol, side, amount, params=None, timeout=None):
+        """下市价单并等待成交确认
+
+        Args:
+            symbol: 交易对
+            side: 'buy' / 'sell'
+            amount: 数量（张）
+            params: 交易所参数（如 reduceOnly、tag、tdMode）
+            timeout: 确认成交的最长等待秒数
+
+        Returns:
+            OrderFill: 成交结果（is_filled 为False表示超时前未确认完全成交）
+        """
+        started = time.perf_counter()
+        order = exchange.create_market_order(symbol, side, amount, params=params or {})
+        fill = OrderFill(order_id=order.get('id'), symbol=symbol, side=side, amount=float(amount))
+        fill.update(order)
+        fill.elapsed = time.perf_counter() - started
+        if fill.order_id is None:
+            return fill
+        self.wait_for_fill(fill, timeout)
+        if fill.is_filled:
+            price = f"{fill.average:.2f}" if fill.average else "未知"
+            print(f"✅ 订单已成交: {side} {fill.filled:.2f} 张 @ {price}（确认耗时 {fill.elapsed:.2f}s，"
+                  f"查询 {fill.polls} 次）")
+        return fill
+
+
+def average_fill_price(fills, default=None):
+    """多个成交结果的数量加权均价（没有成交价时返回default）"""
+    priced = [fill for fill in fills if fill.average and fill.filled]
+    total = sum(fill.filled for fill in priced)
+    if not total:
+        return default
+    return sum(fill.average * fill.filled for fill in priced) / total
+
+
+# 全局订单跟踪器实例
+order_tracker = OrderTracker()
@@ -1,25 +1,58 @@
 """仓位和持仓管理模块"""
-from .config import exchange, TRADE_CONFIG
+from .config import TRADE_CONFIG
+from .cycle_context import cycle_context
+from .leverage_cache import leverage_cache
 
 
-def get_current_position():
-    """获取当前持仓情况 - OKX版本"""
+def get_contract_spec(symbol=None):
+    """获取交易对的合约规格
+
+    Returns:
+        tuple: (contract_size, min_amount) - 合约乘数、最小下单张数
+    """
+    spec = TRADE_CONFIG.get('contract_specs', {}).get(symbol or TRADE_CONFIG['symbol'])
+    if spec:
+        return spec['contract_size'], spec['min_amount']
+    return TRADE_CONFIG.get('contract_size', 0.01), TRADE_CONFIG.get('min_amount', 0.01)
+
+
+def get_max_market_amount(symbol=None):
+    """获取交易对单笔市价单的最大张数（未知时返回None）"""
+    spec = TRADE_CONFIG.get('contract_specs', {}).get(symbol or TRADE_CONFIG['symbol'], {})
+    return spec.get('max_market_amount')
+
+
+def _parse_position(pos):
+    """将交易所持仓转换为内部持仓格式，无持仓时返回None"""
+    contracts = float(pos['contracts']) if pos['contracts'] else 0
+    if contracts <= 0:
+        return None
+    return {
+        'side': pos['side'],  # 'long' or 'short'
+        'size': contracts,
+        'entry_price': float(pos['entryPrice']) if pos['entryPrice'] else 0,
+        'unrealized_pnl': float(pos['unrealizedPnl']) if pos['unrealizedPnl'] else 0,
+        'leverage': float(pos['leverage']) if pos['leverage'] else TRADE_CONFIG['leverage'],
+        'symbol': pos['symbol']
+    }
+
+
+def get_current_position(symbol=None):
+    """获取当前持仓情况 - OKX版本
+
+    Args:
+        symbol: 交易对，默认TRADE_CONFIG['symbol']
+    """
+    symbol = symbol or TRADE_CONFIG['symbol']
     try:
-        positions = exchange.fetch_positions([TRADE_CONFIG['symbol']])
+        positions = cycle_context.fetch_positions([symbol])
 
         for pos in positions:
-            if pos['symbol'] == TRADE_CONFIG['symbol']:
-                contracts = float(pos['contracts']) if pos['contracts'] else 0
-
-                if contracts > 0:
-                    return {
-                        'side': pos['side'],  # 'long' or 'short'
-                        'size': contracts,
-                        'entry_price': float(pos['entryPrice']) if pos['entryPrice'] else 0,
-                        'unrealized_pnl': float(pos['unrealizedPnl']) if pos['unrealizedPnl'] else 0,
-                        'leverage': float(pos['leverage']) if pos['leverage'] else TRADE_CONFIG['leverage'],
-                        'symbol': pos['symbol']
-                    }
+            leverage_cache.observe(pos)
+            if pos['symbol'] == symbol:
+                current = _parse_position(pos)
+                if current:
+                    return current
 
         return None
 
@@ -30,6 +63,26 @@ def get_current_position():
         return None
 
 
+def get_positions(symbols):
+    """一次请求获取多个交易对的持仓
+
+    Returns:
+        dict: 交易对 -> 持仓（无持仓为None），获取失败时返回None
+    """
+    try:
+        positions = cycle_context.fetch_positions(list(symbols))
+    except Exception as e:
+        print(f"获取持仓失败: {e}")
+        return None
+
+    result = {symbol: None for symbol in symbols}
+    for pos in positions:
+        leverage_cache.observe(pos)
+        if pos['symbol'] in result and result[pos['symbol']] is None:
+            result[pos['symbol']] = _parse_position(pos)
+    return result
+
+
 def calculate_intelligent_position(signal_data, price_data, current_position):
     """计算智能仓位大小 - 修复版"""
     config = TRADE_CONFIG['position_management']
@@ -42,7 +95,7 @@ def calculate_intelligent_position(signal_data, price_data, current_position):
 
     try:
         # 获取账户余额
-        balance = exchange.fetch_balance()
+        balance = cycle_context.fetch_balance()
         usdt_balance = balance['USDT']['free']
 
         # 基础USDT投入
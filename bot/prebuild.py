@@ -0,0 +1,153 @@
+"""预构建模块 - 在K线收盘前几秒提前准备变化缓慢的输入
+
+主循环原本睡到整点才开始拉取数据、构建提示词，整个准备过程都在收盘后的关键路径上。
+预构建在整点前 lead_seconds 秒在后台执行：
+1. 获取变化缓慢的输入：账户余额、资金费率、OI、4h已收盘K线；
+2. 增量同步K线存储，整点时只需补拉最后一两根K线；
+3. 提前渲染系统提示词（渲染结果被缓存，整点时直接复用）；
+4. 向DeepSeek发一个轻量请求，提前建立并保持HTTPS连接。
+整点时把预构建结果填入周期上下文，只拉取最新K线和持仓即可发送请求。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .config import exchange, deepseek_client, TRADE_CONFIG
+from .cycle_context import cycle_context
+from .candle_store import candle_store
+from .timeframe_cache import timeframe_cache
+from .universe import get_universe_symbols
+from .ai_analyzer import _get_oi_and_funding_rate, _build_system_prompt
+
+# 默认参数（可在 TRADE_CONFIG['prebuild'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'lead_seconds': 10,
+    'max_age_seconds': 30,
+    'warm_llm_connection': True,
+}
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('prebuild', {})}
+
+
+@dataclass
+class PrebuiltInputs:
+    """整点前预构建的输入"""
+    symbols: tuple = ()
+    balance: Optional[Dict[str, Any]] = None  # exchange.fetch_balance() 的返回值
+    funding_rates: Dict[str, Any] = field(default_factory=dict)  # 交易对 -> fetch_funding_rate() 的返回值
+    oi_data: Optional[Dict[str, Any]] = None  # 单币种模式下 _get_oi_and_funding_rate() 的返回值
+    created: float = 0.0  # 完成时间（时间戳）
+    elapsed: float = 0.0  # 预构建耗时（秒）
+    errors: Dict[str, str] = field(default_factory=dict)  # 失败的步骤
+
+
+class SpeculativePrebuilder:
+    """K线收盘前的预构建器"""
+
+    def __init__(self):
+        # _build 在单独的线程中运行，其获取任务另用按任务数创建的线程池，避免排在 _build 自身之后
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prebuild')
+        self._future = None
+
+    @staticmethod
+    def lead_seconds():
+        """整点前多少秒开始预构建（未启用时为0）"""
+        settings = _settings()
+        return settings['lead_seconds'] if settings['enabled'] else 0
+
+    def start(self):
+        """在后台开始预构建（立即返回）"""
+        if self._future is not None and not self._future.done():
+            return
+        print(f"🔮 距整点 {self.lead_seconds()} 秒，开始预构建本周期输入...")
+        self._future = self._executor.submit(self._build, tuple(get_universe_symbols()))
+
+    def _build(self, symbols):
+        settings = _settings()
+        started = time.perf_counter()
+        prebuilt = PrebuiltInputs(symbols=symbols)
+        primary = symbols[0]
+
+        tasks = {'balance': exchange.fetch_balance}
+        for symbol in symbols:
+            tasks[f'funding_rate:{symbol}'] = lambda symbol=symbol: exchange.fetch_funding_rate(symbol)
+            tasks[f'candles:{symbol}'] = lambda symbol=symbol: candle_store.sync(
+                exchange, symbol, TRADE_CONFIG['timeframe'], TRADE_CONFIG['data_points'])
+            tasks[f'4h:{symbol}'] = lambda symbol=symbol: timeframe_cache.prefetch(exchange, symbol, '4h', limit=60)
+        if len(symbols) == 1:
+            tasks['oi_data'] = lambda: _get_oi_and_funding_rate(primary)
+        if settings['warm_llm_connection']:
+            tasks['llm'] = lambda: deepseek_client.with_options(timeout=5).models.list()
+
+        # 每个任务一个线程：多币种模式下 3N+2 个请求同时发出，不会排队等到整点之后
+        fetch_executor = ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='prebuild-fetch')
+        futures = {name: fetch_executor.submit(func) for name, func in tasks.items()}
+        fetch_executor.shutdown(wait=False)
+        wait(futures.values(), timeout=max(1.0, settings['lead_seconds']))
+        results = {}
+        for name, future in futures.items():
+            if not future.done():
+                prebuilt.errors[name] = "未在整点前完成"
+                continue
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                prebuilt.errors[name] = str(e)
+
+        prebuilt.balance = results.get('balance')
+        prebuilt.oi_data = results.get('oi_data')
+        prebuilt.funding_rates = {
+            symbol: results[f'funding_rate:{symbol}'] for symbol in symbols if f'funding_rate:{symbol}' in results
+        }
+
+        # 提前渲染系统提示词（结果按配置缓存，整点构建时直接命中）
+        try:
+            account_data = None
+            if prebuilt.balance:
+                account_data = {'balance': float(prebuilt.balance['USDT'].get('total', 0))}
+            _build_system_prompt(account_data, list(symbols) if len(symbols) > 1 else None)
+        except Exception as e:
+            prebuilt.errors['system_prompt'] = str(e)
+
+        prebuilt.elapsed = time.perf_counter() - started
+        prebuilt.created = time.time()
+        print(f"🔮 预构建完成: 耗时 {prebuilt.elapsed:.2f}s，成功 {len(results)}/{len(tasks)} 项")
+        for name, error in prebuilt.errors.items():
+            print(f"⚠️ 预构建 {name} 失败: {error}")
+        return prebuilt
+
+    def take(self):
+        """取出预构建结果（未完成、已过期或交易对已变化时返回None）"""
+        future, self._future = self._future, None
+        if future is None:
+            return None
+        if not future.done():
+            print("⚠️ 预构建尚未完成，本周期按常规流程获取数据")
+            return None
+        try:
+            prebuilt = future.result()
+        except Exception as e:
+            print(f"⚠️ 预构建失败: {e}")
+            return None
+        if time.time() - prebuilt.created > _settings()['max_age_seconds']:
+            print("⚠️ 预构建结果已过期，本周期按常规流程获取数据")
+            return None
+        if prebuilt.symbols != tuple(get_universe_symbols()):
+            return None
+        return prebuilt
+
+    @staticmethod
+    def apply(prebuilt):
+        """把预构建结果填入本周期上下文（须在 cycle_context.begin() 之后调用）"""
+        if prebuilt.balance is not None:
+            cycle_context.seed('balance', prebuilt.balance)
+        for symbol, funding_rate in prebuilt.funding_rates.items():
+            cycle_context.seed('funding_rate', funding_rate, symbol)
+
+
+# 全局预构建器实例
+speculative_prebuilder = SpeculativePrebuilder()
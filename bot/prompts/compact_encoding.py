@@ -0,0 +1,128 @@
+"""
+紧凑数值编码 - 按字段精度压缩币种数据中的浮点数，并估算提示词token数
+
+json.dumps 直接输出浮点数时最多带17位有效数字（如 94812.34999999999），
+这些数字对决策没有意义却占用大量token。紧凑模式按字段设定精度：
+价格类按最小价格变动单位（tick）取整，RSI保留1位小数，MACD保留4位有效数字。
+"""
+import math
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+
+# 字段精度规则：('tick',) 价格类按tick取整；('decimals', n) 保留n位小数；('sig', n) 保留n位有效数字
+FIELD_PRECISION = {
+    # 价格类
+    'current_price': ('tick',),
+    'current_ema20': ('tick',),
+    'mid_prices': ('tick',),
+    'ema20_series': ('tick',),
+    'ema20_4h': ('tick',),
+    'ema50_4h': ('tick',),
+    'atr3_4h': ('tick',),
+    'atr14_4h': ('tick',),
+    # RSI
+    'current_rsi7': ('decimals', 1),
+    'rsi7_series': ('decimals', 1),
+    'rsi14_series': ('decimals', 1),
+    'rsi14_4h': ('decimals', 1),
+    # MACD
+    'current_macd': ('sig', 4),
+    'macd_series': ('sig', 4),
+    'macd_4h': ('sig', 4),
+    # 持仓量、资金费率、成交量
+    'oi_latest': ('sig', 6),
+    'oi_avg': ('sig', 6),
+    'funding_rate': ('sig', 4),
+    'current_volume_4h': ('sig', 6),
+    'avg_volume_4h': ('sig', 6),
+}
+
+# 未知tick时价格类字段保留的有效数字位数
+DEFAULT_PRICE_SIG_DIGITS = 6
+
+# 可按token预算裁剪长度的序列字段
+SERIES_FIELDS = [
+    'mid_prices', 'ema20_series', 'macd_series', 'rsi7_series', 'rsi14_series', 'macd_4h', 'rsi14_4h',
+]
+
+# token估算的字符类别（在UTF-8字节上用 bytes.translate 计数，不逐字符循环）
+_DIGITS = b'0123456789'
+_LETTERS = bytes(range(ord('A'), ord('Z') + 1)) + bytes(range(ord('a'), ord('z') + 1))
+_SPACES = b' \t\r\n'
+
+
+def _tidy(value: float) -> Any:
+    """整数值输出为int，避免 95000.0 这样的多余小数位"""
+    if math.isfinite(value) and value == int(value) and abs(value) < 1e15:
+        return int(value)
+    return value
+
+
+def round_to_tick(value: float, tick: float) -> Any:
+    """按最小价格变动单位取整"""
+    if not tick or tick <= 0:
+        return round_sig(value, DEFAULT_PRICE_SIG_DIGITS)
+    # tick本身的小数位数（0.1 -> 1，0.25 -> 2，1e-05 -> 5），消除 round(x/tick)*tick 的浮点尾数
+    decimals = max(0, -Decimal(str(tick)).normalize().as_tuple().exponent)
+    return _tidy(round(round(value / tick) * tick, decimals))
+
+
+def round_sig(value: float, digits: int) -> Any:
+    """保留指定位数的有效数字"""
+    if value == 0 or not math.isfinite(value):
+        return _tidy(value) if math.isfinite(value) else 0
+    decimals = digits - 1 - math.floor(math.log10(abs(value)))
+    return _tidy(round(value, decimals))
+
+
+def encode_value(field: str, value: Any, tick_size: Optional[float] = None) -> Any:
+    """按字段精度规则编码单个数值或数值列表（未知字段原样返回）"""
+    rule = FIELD_PRECISION.get(field)
+    if rule is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [encode_value(field, item, tick_size) for item in value]
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return value
+    if not math.isfinite(value):
+        return 0
+    if rule[0] == 'tick':
+        return round_to_tick(value, tick_size)
+    if rule[0] == 'decimals':
+        return _tidy(round(value, rule[1]))
+    return round_sig(value, rule[1])
+
+
+def encode_coin_data(coin_data: Dict[str, Any]) -> Dict[str, Any]:
+    """返回按字段精度编码后的币种数据副本（tick_size 取自 coin_data['tick_size']）"""
+    tick_size = coin_data.get('tick_size')
+    return {field: encode_value(field, value, tick_size) for field, value in coin_data.items()}
+
+
+def trim_series(coin_data: Dict[str, Any], length: int) -> Dict[str, Any]:
+    """返回序列字段只保留最近length个值的币种数据副本"""
+    trimmed = dict(coin_data)
+    for field in SERIES_FIELDS:
+        series = trimmed.get(field)
+        if isinstance(series, (list, tuple)) and len(series) > length:
+            trimmed[field] = list(series[-length:])
+    return trimmed
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数（近似BPE分词，不依赖分词器）
+
+    数字约3位一个token，英文字母约4个一个token，其余符号和中文等多字节字符各算一个token。
+    """
+    data = text.encode('utf-8')
+    size = len(data)
+    digits = size - len(data.translate(None, _DIGITS))
+    letters = size - len(data.translate(None, _LETTERS))
+    spaces = size - len(data.translate(None, _SPACES))
+    # 多字节字符（中文在UTF-8中为3字节，多出2字节）
+    wide = (size - len(text)) // 2
+    symbols = len(text) - digits - letters - spaces - wide
+    return -(-digits // 3) + -(-letters // 4) + max(symbols, 0) + wide
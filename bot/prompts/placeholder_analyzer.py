@@ -202,6 +202,11 @@ class PlaceholderAnalyzer:
             'AvgVolume_4h': '4小时平均成交量',
             'MACD4h': '4小时MACD序列（JSON数组）',
             'RSI14_4h': '4小时14周期RSI序列（JSON数组）',
+            
+            # universe.md
+            'CoinCount': '币种数量',
+            'Coins': '币种列表',
+            'ExampleDecisions': '多币种决策示例（JSON数组）',
         }
         return descriptions.get(name, '')
     
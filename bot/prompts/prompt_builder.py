@@ -2,17 +2,19 @@
 提示词构建器 - 基于模板文件构建完整的提示词
 """
 import json
-import re
 from pathlib import Path
 from typing import Dict, Any, Optional
 from datetime import datetime
 
+from .template_engine import TemplateLoader, PLACEHOLDER_PATTERN
+from .compact_encoding import encode_coin_data, trim_series, estimate_tokens, SERIES_FIELDS
+
 
 class PromptBuilder:
     """
     提示词构建器
     
-    注意：占位符替换直接使用正则表达式完成，不需要分析器。
+    注意：模板在加载时预编译（template_engine），渲染不需要分析器。
     占位符分析工具（PlaceholderAnalyzer）主要用于开发阶段的模板验证和文档生成。
     """
     
@@ -60,27 +62,63 @@ class PromptBuilder:
         'AvgVolume_4h': '4小时平均成交量',
         'MACD4h': '4小时MACD序列（JSON数组）',
         'RSI14_4h': '4小时14周期RSI序列（JSON数组）',
+        # universe.md
+        'CoinCount': '币种数量',
+        'Coins': '币种列表',
+        'ExampleDecisions': '多币种决策示例（JSON数组）',
+    }
+    
+    # 模板名称 -> 模板文件
+    _TEMPLATE_FILES = {
+        'system': 'system.md',
+        'user': 'user.md',
+        'coin': 'coin.md',
+        'universe': 'universe.md',
     }
     
-    def __init__(self, prompts_dir: str = None):
+    def __init__(self, prompts_dir: str = None, compact: bool = False,
+                 token_budget: Optional[int] = None, min_series_length: int = 3):
+        """
+        Args:
+            prompts_dir: 模板目录，默认为本模块所在目录
+            compact: 紧凑数值编码（按字段精度输出数值，见 compact_encoding）
+            token_budget: 用户提示词的token预算，超出时从最旧的一端裁剪序列（None表示不限制）
+            min_series_length: 裁剪后序列保留的最少长度
+        """
+        self.compact = compact
+        self.token_budget = token_budget
+        self.min_series_length = min_series_length
+        # 最近一次构建用户提示词的统计（估算token数、序列长度）
+        self.last_token_count = 0
+        self.last_series_length = None
+        
         if prompts_dir is None:
             prompts_dir = Path(__file__).parent
         self.prompts_dir = Path(prompts_dir)
         
-        # 加载模板文件
-        self.system_template = self._load_template('system.md')
-        self.user_template = self._load_template('user.md')
-        self.coin_template = self._load_template('coin.md')
+        # 加载并预编译模板文件（文件修改后自动重新编译）
+        self._templates = TemplateLoader(self.prompts_dir)
+        for filename in self._TEMPLATE_FILES.values():
+            self._templates.get(filename)
         
         # 占位符替换正则（支持 {{.Name}} 和 {{.Name | toJSON}} 格式）
-        self.placeholder_pattern = re.compile(r'\{\{\s*\.([^}|]+?)(?:\s*\|\s*toJSON)?\s*\}\}')
+        self.placeholder_pattern = PLACEHOLDER_PATTERN
+    
+    @property
+    def system_template(self) -> str:
+        return self._templates.get('system.md').source
+    
+    @property
+    def user_template(self) -> str:
+        return self._templates.get('user.md').source
     
-    def _load_template(self, filename: str) -> str:
-        """加载模板文件"""
-        template_path = self.prompts_dir / filename
-        if not template_path.exists():
-            raise FileNotFoundError(f"模板文件不存在: {template_path}")
-        return template_path.read_text(encoding='utf-8')
+    @property
+    def coin_template(self) -> str:
+        return self._templates.get('coin.md').source
+    
+    @property
+    def universe_template(self) -> str:
+        return self._templates.get('universe.md').source
     
     def build_system_prompt(self, config: Dict[str, Any]) -> str:
         """
@@ -91,7 +129,7 @@ class PromptBuilder:
                 - exchange: 交易所名称
                 - model_name: 模型名称
                 - asset_universe: 资产范围
-                - starting_capital: 起始资金
+                - starting_capital: 起始资金（数值或说明文字）
                 - market_hours: 市场交易时间
                 - decision_frequency: 决策频率
                 - leverage_range: 杠杆范围
@@ -102,11 +140,16 @@ class PromptBuilder:
         Returns:
             构建好的系统提示词
         """
+        # 起始资金可以是数值，也可以是固定说明文字（稳定系统提示词模式）
+        starting_capital = config.get('starting_capital', 1000)
+        if not isinstance(starting_capital, str):
+            starting_capital = self._format_currency(starting_capital)
+        
         replacements = {
             'Exchange': config.get('exchange', 'OKX'),
             'MODEL_NAME': config.get('model_name', 'DeepSeek'),
             'AssetUniverse': config.get('asset_universe', 'BTC/USDT, ETH/USDT, SOL/USDT, BNB/USDT, DOGE/USDT, XRP/USDT'),
-            'StartingCapital': self._format_currency(config.get('starting_capital', 1000)),
+            'StartingCapital': starting_capital,
             'MarketHours': config.get('market_hours', '24/7'),
             'DecisionFrequency': config.get('decision_frequency', 'Every 10 minutes'),
             'LeverageRange': config.get('leverage_range', '1-20x'),
@@ -115,7 +158,7 @@ class PromptBuilder:
             'Slippage': config.get('slippage', '0.01-0.05%'),
         }
         
-        return self._replace_placeholders(self.system_template, replacements)
+        return self._templates.render('system.md', replacements)
     
     def build_coin_section(self, coin_data: Dict[str, Any]) -> str:
         """
@@ -148,7 +191,9 @@ class PromptBuilder:
         Returns:
             构建好的币种数据区块
         """
-        # 根据示例格式，币种数据直接输出数值，不格式化
+        # 根据示例格式，币种数据直接输出数值；紧凑模式下按字段精度取整
+        if self.compact:
+            coin_data = encode_coin_data(coin_data)
         replacements = {
             'Symbol': coin_data.get('symbol', 'BTC'),
             'CurrentPrice': coin_data.get('current_price', 0),
@@ -173,7 +218,7 @@ class PromptBuilder:
             'RSI14_4h': coin_data.get('rsi14_4h', []),
         }
         
-        return self._replace_placeholders(self.coin_template, replacements)
+        return self._templates.render('coin.md', replacements)
     
     def build_coin_sections(self, coins_data: list) -> str:
         """
@@ -191,6 +236,24 @@ class PromptBuilder:
             sections.append(section)
         return '\n\n'.join(sections)
     
+    def build_universe_section(self, coins: list) -> str:
+        """
+        构建多币种输出格式区块（追加在用户提示词末尾，要求AI为每个币种返回一个决策）
+        
+        Args:
+            coins: 币种符号列表（如 ['BTC', 'ETH']）
+        
+        Returns:
+            构建好的多币种输出格式区块
+        """
+        replacements = {
+            'CoinCount': str(len(coins)),
+            'Coins': ', '.join(coins),
+            'ExampleDecisions': [{'signal': 'hold', 'coin': coin} for coin in coins],
+        }
+        
+        return self._templates.render('universe.md', replacements)
+    
     def build_user_prompt(
         self,
         minutes_elapsed: int,
@@ -203,7 +266,55 @@ class PromptBuilder:
         positions: Optional[list] = None
     ) -> str:
         """
-        构建用户提示词
+        构建用户提示词（设置了token预算时，超出预算则逐步缩短序列直至满足预算或达到最少长度）
+        
+        参数同 _render_user_prompt；构建后的估算token数和序列长度记录在
+        last_token_count / last_series_length 中。
+        
+        Returns:
+            构建好的用户提示词
+        """
+        if current_time is None:
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        coins_data = coins_data or []
+        params = {
+            'minutes_elapsed': minutes_elapsed,
+            'current_time': current_time,
+            'invocation_count': invocation_count,
+            'current_total_return_percent': current_total_return_percent,
+            'available_cash': available_cash,
+            'current_account_value': current_account_value,
+            'positions': positions,
+        }
+        
+        prompt = self._render_user_prompt(coins_data=coins_data, **params)
+        tokens = estimate_tokens(prompt)
+        length = max((len(coin.get(field) or []) for coin in coins_data for field in SERIES_FIELDS), default=0)
+        
+        if self.token_budget:
+            while tokens > self.token_budget and length > self.min_series_length:
+                length -= 1
+                trimmed = [trim_series(coin, length) for coin in coins_data]
+                prompt = self._render_user_prompt(coins_data=trimmed, **params)
+                tokens = estimate_tokens(prompt)
+        
+        self.last_token_count = tokens
+        self.last_series_length = length
+        return prompt
+    
+    def _render_user_prompt(
+        self,
+        minutes_elapsed: int,
+        current_time: Optional[str] = None,
+        invocation_count: int = 0,
+        coins_data: Optional[list] = None,
+        current_total_return_percent: float = 0.0,
+        available_cash: float = 0.0,
+        current_account_value: float = 0.0,
+        positions: Optional[list] = None
+    ) -> str:
+        """
+        渲染用户提示词模板
         
         Args:
             minutes_elapsed: 已交易分钟数
@@ -237,11 +348,11 @@ class PromptBuilder:
             'Positions': positions or [],
         }
         
-        return self._replace_placeholders(self.user_template, replacements)
+        return self._templates.render('user.md', replacements)
     
     def _replace_placeholders(self, template: str, replacements: Dict[str, Any]) -> str:
         """
-        替换模板中的占位符
+        替换模板中的占位符（原正则实现，构建时已改用预编译模板，保留用于对比校验）
         
         Args:
             template: 模板字符串
@@ -312,7 +423,7 @@ class PromptBuilder:
         获取指定模板所需的所有字段
         
         Args:
-            template_name: 模板名称 ('system', 'user', 'coin')
+            template_name: 模板名称 ('system', 'user', 'coin', 'universe')
         
         Returns:
             字段名到描述的映射
@@ -323,6 +434,8 @@ class PromptBuilder:
             template = self.user_template
         elif template_name == 'coin':
             template = self.coin_template
+        elif template_name == 'universe':
+            template = self.universe_template
         else:
             raise ValueError(f"未知的模板名称: {template_name}")
         
@@ -0,0 +1,95 @@
+"""
+预编译模板引擎 - 模板加载时编译为片段列表，渲染时只做一次拼接
+
+原实现每次构建都用正则扫描整个模板并对每个占位符回调一次Python函数。
+编译后的模板由字面文本片段和占位符槽位（名称、是否toJSON、原始文本）组成，
+渲染只需遍历片段并 ''.join。模板文件的修改时间变化时自动重新编译。
+
+渲染语义与 PromptBuilder 原 _replace_placeholders 完全一致：
+- {{.Name}} 输出 str(value)
+- {{.Name | toJSON}} 输出紧凑JSON（ensure_ascii=False，无空格）
+- 找不到替换值的占位符原样保留
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+# 占位符正则（支持 {{.Name}} 和 {{.Name | toJSON}} 格式）
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*\.([^}|]+?)(?:\s*\|\s*toJSON)?\s*\}\}')
+
+# 片段：字面文本（str）或槽位（名称, 是否toJSON, 原始占位符文本）
+Segment = Union[str, Tuple[str, bool, str]]
+
+
+# 复用同一个编码器（json.dumps 带参数时每次都会新建编码器）
+_to_json = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+class CompiledTemplate:
+    """编译后的模板"""
+
+    __slots__ = ('source', 'segments', 'names')
+
+    def __init__(self, source: str):
+        self.source = source
+        segments = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            if match.start() > position:
+                segments.append(source[position:match.start()])
+            raw = match.group(0)
+            segments.append((match.group(1).strip(), 'toJSON' in raw, raw))
+            position = match.end()
+        if position < len(source):
+            segments.append(source[position:])
+        self.segments = tuple(segments)
+        self.names = tuple(segment[0] for segment in segments if segment.__class__ is tuple)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """用替换值渲染模板"""
+        parts = []
+        append = parts.append
+        for segment in self.segments:
+            if segment.__class__ is str:
+                append(segment)
+                continue
+            name, is_json, raw = segment
+            if name not in values:
+                append(raw)
+            elif is_json:
+                append(_to_json(values[name]))
+            else:
+                append(str(values[name]))
+        return ''.join(parts)
+
+
+class TemplateLoader:
+    """模板加载器：按文件名缓存编译结果，文件修改时间变化时重新编译"""
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        # 文件名 -> (mtime_ns, CompiledTemplate)
+        self._cache: Dict[str, Tuple[int, CompiledTemplate]] = {}
+
+    def get(self, filename: str) -> CompiledTemplate:
+        """获取编译后的模板（模板文件被修改后自动重新加载）"""
+        path = self.directory / filename
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"模板文件不存在: {path}") from None
+
+        entry = self._cache.get(filename)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        compiled = CompiledTemplate(path.read_text(encoding='utf-8'))
+        self._cache[filename] = (mtime, compiled)
+        if entry is not None:
+            print(f"🔄 模板文件已修改，重新编译: {filename}")
+        return compiled
+
+    def render(self, filename: str, values: Dict[str, Any]) -> str:
+        """渲染指定模板"""
+        return self.get(filename).render(values)
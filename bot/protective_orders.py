@@ -0,0 +1,222 @@
+"""交易所端止损止盈模块 - 开仓后挂OKX持仓级止盈止损（OCO策略委托），由交易所按价格触发平仓
+
+原流程中AI返回的 stop_loss / take_profit 只写入记录，两次分析之间没有任何机制执行，
+价格击穿止损后要等到下一个K线周期、再经过一次LLM调用才可能平仓。
+本模块在开仓（含反手、加仓）后挂一笔 closeFraction=1 的OCO策略委托：
+1. 止损和止盈二选一触发，触发后按市价平掉整个持仓（加减仓无需修改委托数量）；
+2. 后续信号给出不同的止损止盈价时用 amend-algos 修改触发价，修改失败时撤单重挂；
+3. CLOSE信号或持仓已平时撤销委托。
+"""
+import threading
+
+import ccxt
+
+from .config import exchange, TRADE_CONFIG
+
+# 默认参数（可在 TRADE_CONFIG['protective_orders'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'trigger_price_type': 'last',  # 触发价类型：last / mark / index
+    'min_change_ratio': 0.0005,  # 止损止盈价变化小于该比例时不修改委托
+}
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('protective_orders', {})}
+
+
+def protective_levels(side, signal_data, reference_price):
+    """从信号中取出对当前持仓方向有效的 (止损价, 止盈价)，无效时返回None
+
+    多仓要求 止损 < 参考价 < 止盈，空仓要求 止盈 < 参考价 < 止损，否则交易所会拒绝或立即触发。
+    """
+    try:
+        stop_loss = float(signal_data.get('stop_loss'))
+        take_profit = float(signal_data.get('take_profit'))
+        reference_price = float(reference_price)
+    except (TypeError, ValueError):
+        return None
+    if stop_loss <= 0 or take_profit <= 0:
+        return None
+    if side == 'long' and stop_loss < reference_price < take_profit:
+        return stop_loss, take_profit
+    if side == 'short' and take_profit < reference_price < stop_loss:
+        return stop_loss, take_profit
+    return None
+
+
+def _changed(old, new, min_change_ratio):
+    return abs(new - old) > old * min_change_ratio
+
+
+class ProtectiveOrderManager:
+    """交易对 -> 当前挂着的止盈止损委托 {'algo_id', 'side', 'stop_loss', 'take_profit'}"""
+
+    def __init__(self):
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        """当前记录的止盈止损委托，没有时返回None"""
+        with self._lock:
+            order = self._orders.get(symbol)
+            return dict(order) if order else None
+
+    def _set(self, symbol, order):
+        with self._lock:
+            if order is None:
+                self._orders.pop(symbol, None)
+            else:
+                self._orders[symbol] = order
+
+    def place(self, symbol, side, stop_loss, take_profit):
+        """为持仓挂止盈止损OCO委托（触发后市价平掉整个持仓）
+
+        Args:
+            symbol: 交易对
+            side: 持仓方向 'long' / 'short'
+            stop_loss: 止损触发价
+            take_profit: 止盈触发价
+
+        Returns:
+            dict: 记录的委托信息
+        """
+        settings = _settings()
+        close_side = 'sell' if side == 'long' else 'buy'
+        order = exchange.create_order(
+            symbol,
+            'oco',
+            close_side,
+            None,
+            None,
+            {
+                'stopLossPrice': stop_loss,
+                'takeProfitPrice': take_profit,
+                'slTriggerPxType': settings['trigger_price_type'],
+                'tpTriggerPxType': settings['trigger_price_type'],
+                'closeFraction': '1',  # 平掉整个持仓，数量随加减仓自动变化
+                'tdMode': 'cross',  # 全仓模式
+                'tag': '60bb4a8d3416BCDE'
+            }
+        )
+        record = {'algo_id': order.get('id'), 'side': side, 'stop_loss': stop_loss, 'take_profit': take_profit}
+        self._set(symbol, record)
+        print(f"🛡️ 已挂交易所止盈止损: {symbol} {side}仓 止损 {stop_loss:.2f} / 止盈 {take_profit:.2f}")
+        return record
+
+    def amend(self, symbol, stop_loss, take_profit):
+        """修改已挂委托的触发价，交易所不支持修改时撤单重挂"""
+        record = self.get(symbol)
+        if record is None:
+            return None
+        settings = _settings()
+        close_side = 'sell' if record['side'] == 'long' else 'buy'
+        try:
+            exchange.edit_order(
+                record['algo_id'],
+                symbol,
+                'oco',
+                close_side,
+                None,
+                None,
+                {
+                    'stopLossPrice': stop_loss,
+                    'newSlOrdPx': '-1',  # 市价
+                    'newSlTriggerPxType': settings['trigger_price_type'],  # 不传时ccxt默认改为last
+                    'takeProfitPrice': take_profit,
+                    'newTpOrdPx': '-1',
+                    'newTpTriggerPxType': settings['trigger_price_type'],
+                }
+            )
+        except ccxt.OrderNotFound:
+            # 委托已被撤销（如在网页上手动撤单），持仓仍在则重新挂单
+            print(f"⚠️ {symbol} 止盈止损委托已不存在，重新挂单")
+            self._set(symbol, None)
+            return self.place(symbol, record['side'], stop_loss, take_profit)
+        except Exception as e:
+            print(f"⚠️ 修改止盈止损失败，撤单重挂: {e}")
+            self.cancel(symbol)
+            return self.place(symbol, record['side'], stop_loss, take_profit)
+        record.update(stop_loss=stop_loss, take_profit=take_profit)
+        self._set(symbol, record)
+        print(f"🛡️ 已修改交易所止盈止损: {symbol} 止损 {stop_loss:.2f} / 止盈 {take_profit:.2f}")
+        return record
+
+    def cancel(self, symbol):
+        """撤销交易对的止盈止损委托（委托已触发或不存在时忽略）"""
+        record = self.get(symbol)
+        if record is None:
+            return False
+        try:
+            exchange.cancel_order(record['algo_id'], symbol, {'trigger': True})
+            print(f"🛡️ 已撤销交易所止盈止损: {symbol}")
+        except ccxt.OrderNotFound:
+            pass
+        finally:
+            self._set(symbol, None)
+        return True
+
+    def reconcile(self, symbol):
+        """从交易所读取仍在挂单的止盈止损委托（启动时恢复状态）"""
+        try:
+            orders = exchange.fetch_open_orders(symbol, params={'trigger': True, 'ordType': 'oco'})
+        except Exception as e:
+            print(f"⚠️ 获取{symbol}止盈止损委托失败: {e}")
+            return None
+        for order in orders:
+            if order.get('stopLossPrice') and order.get('takeProfitPrice'):
+                record = {
+                    'algo_id': order['id'],
+                    'side': 'long' if order.get('side') == 'sell' else 'short',
+                    'stop_loss': float(order['stopLossPrice']),
+                    'take_profit': float(order['takeProfitPrice']),
+                }
+                self._set(symbol, record)
+                return record
+        self._set(symbol, None)
+        return None
+
+    def sync(self, symbol, position, signal_data, reference_price):
+        """按交易后的持仓和最新信号挂出、修改或撤销止盈止损委托
+
+        失败只打印警告，不影响交易流程。
+
+        Args:
+            symbol: 交易对
+            position: 交易后的持仓（None表示无持仓）
+            signal_data: 最新交易信号（备用信号的止损止盈不会覆盖已挂委托）
+            reference_price: 参考价（用于检查止损止盈方向）
+        """
+        settings = _settings()
+        if not settings['enabled']:
+            return
+        try:
+            record = self.get(symbol)
+            if not position or not position.get('size'):
+                self.cancel(symbol)
+                return
+            side = position['side']
+            if record and record['side'] != side:
+                # 反手后旧委托方向不对
+                self.cancel(symbol)
+                record = None
+            if record and signal_data.get('is_fallback', False):
+                return
+            levels = protective_levels(side, signal_data, reference_price)
+            if levels is None:
+                if record is None:
+                    print(f"⚠️ 信号的止损止盈价对{side}仓无效（止损 {signal_data.get('stop_loss')}，"
+                          f"止盈 {signal_data.get('take_profit')}，参考价 {reference_price}），未挂交易所止盈止损")
+                return
+            stop_loss, take_profit = levels
+            if record is None:
+                self.place(symbol, side, stop_loss, take_profit)
+            elif (_changed(record['stop_loss'], stop_loss, settings['min_change_ratio'])
+                  or _changed(record['take_profit'], take_profit, settings['min_change_ratio'])):
+                self.amend(symbol, stop_loss, take_profit)
+        except Exception as e:
+            print(f"⚠️ 同步{symbol}交易所止盈止损失败: {e}")
+
+
+# 全局止盈止损委托管理实例
+protective_orders = ProtectiveOrderManager()
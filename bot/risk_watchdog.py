@@ -0,0 +1,267 @@
+"""风控看门狗模块 - 在两次AI分析之间以约1Hz轮询价格，本地检查止损/止盈，触发时立即reduceOnly平仓
+
+主循环每 interval_minutes 才查看一次行情，执行失败后还会盲等5分钟，
+期间价格击穿止损只能依赖交易所端的止盈止损委托（挂单失败时完全没有保护）。
+看门狗在后台线程中运行：
+1. 每 poll_interval 秒用一次公共接口批量获取所有持仓交易对的标记价格（不调用私有接口）；
+2. 止损/止盈价来自最近一次交易信号（与交易所端止盈止损相同）；
+3. 可选的最大回撤规则（默认关闭）：max_drawdown_ratio > 0 时，未实现盈亏从峰值回撤达到保证金的该比例也会平仓，
+   这是信号止损止盈之外的额外平仓条件，可能在止损价之前平掉仍在盈利的持仓；
+4. 触发后立即下 reduceOnly 市价单平仓，并撤销交易所端止盈止损委托。
+持仓信息由交易执行器在每次交易/观望后同步，看门狗平仓与交易执行器下单互斥。
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from .config import exchange, TRADE_CONFIG
+from .cycle_context import cycle_context
+from .leverage_cache import leverage_cache
+from .order_tracker import order_tracker
+from .position_manager import get_contract_spec, get_positions
+from .protective_orders import protective_orders, protective_levels
+from .universe import get_universe_symbols
+from data_manager import save_trade_record
+
+# 默认参数（可在 TRADE_CONFIG['risk_watchdog'] 中覆盖）
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'poll_interval': 1.0,  # 价格轮询间隔（秒）
+    'price_source': 'mark',  # mark（标记价格）/ last（最新成交价）
+    'max_drawdown_ratio': 0,  # 未实现盈亏从峰值回撤达到保证金的该比例时平仓（0表示关闭，只执行信号的止损止盈）
+    'retry_seconds': 5,  # 平仓失败后再次尝试的间隔（秒）
+}
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('risk_watchdog', {})}
+
+
+@dataclass
+class WatchedPosition:
+    """看门狗监控的持仓"""
+    symbol: str
+    side: str  # 'long' / 'short'
+    size: float  # 张数
+    entry_price: float
+    leverage: float
+    stop_loss: Optional[float] = None
+    take_profit: Optional[float] = None
+    peak_pnl: float = 0.0  # 监控期间未实现盈亏的峰值（不低于0）
+    retry_at: float = 0.0  # 平仓失败后的下次尝试时间（monotonic）
+
+    def pnl(self, price, contract_size):
+        """按价格计算未实现盈亏（USDT）"""
+        direction = 1 if self.side == 'long' else -1
+        return (price - self.entry_price) * direction * self.size * contract_size
+
+    def check(self, price, contract_size, max_drawdown_ratio):
+        """检查价格是否触发止损/止盈/最大回撤，触发时返回 (类型, 说明)，否则None"""
+        if self.stop_loss is not None:
+            if (self.side == 'long' and price <= self.stop_loss) or (self.side == 'short' and price >= self.stop_loss):
+                return 'stop_loss', f"价格 {price:.2f} 触及止损 {self.stop_loss:.2f}"
+        if self.take_profit is not None:
+            if (self.side == 'long' and price >= self.take_profit) or (self.side == 'short' and price <= self.take_profit):
+                return 'take_profit', f"价格 {price:.2f} 触及止盈 {self.take_profit:.2f}"
+
+        pnl = self.pnl(price, contract_size)
+        self.peak_pnl = max(self.peak_pnl, pnl)
+        margin = self.entry_price * self.size * contract_size / (self.leverage or 1)
+        if max_drawdown_ratio and margin > 0:
+            drawdown = (self.peak_pnl - pnl) / margin
+            if drawdown >= max_drawdown_ratio:
+                return 'max_drawdown', (f"未实现盈亏 {pnl:+.2f} USDT 从峰值 {self.peak_pnl:+.2f} 回撤"
+                                        f"保证金的 {drawdown:.0%}（上限 {max_drawdown_ratio:.0%}）")
+        return None
+
+
+class RiskWatchdog:
+    """后台风控线程：交易对 -> WatchedPosition"""
+
+    def __init__(self):
+        self._positions = {}
+        self._lock = threading.Lock()
+        # 交易执行器下单和看门狗平仓互斥，避免按过期持仓平仓
+        self.trade_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, symbol):
+        """当前监控的持仓，没有时返回None"""
+        with self._lock:
+            return self._positions.get(symbol)
+
+    def sync(self, symbol, position, signal_data, reference_price):
+        """按交易后的持仓和最新信号更新监控（与交易所端止盈止损的 sync 语义相同）
+
+        Args:
+            symbol: 交易对
+            position: 交易后的持仓（None表示无持仓）
+            signal_data: 最新交易信号（备用信号的止损止盈不会覆盖已有价位）
+            reference_price: 参考价（用于检查止损止盈方向）
+        """
+        if not position or not position.get('size'):
+            with self._lock:
+                self._positions.pop(symbol, None)
+            return
+        with self._lock:
+            previous = self._positions.get(symbol)
+        if previous and previous.side != position['side']:
+            previous = None
+
+        levels = protective_levels(position['side'], signal_data, reference_price)
+        # 杠杆取本交易对实际设置的值（AI可按信号调整杠杆，不一定等于配置值）
+        applied = leverage_cache.get(symbol)
+        leverage = applied[0] if applied else (position.get('leverage') or TRADE_CONFIG['leverage'])
+        if levels is None or (previous and signal_data.get('is_fallback', False)):
+            levels = (previous.stop_loss, previous.take_profit) if previous else (None, None)
+        watched = WatchedPosition(
+            symbol=symbol,
+            side=position['side'],
+            size=float(position['size']),
+            entry_price=float(position['entry_price']),
+            leverage=float(leverage),
+            stop_loss=levels[0],
+            take_profit=levels[1],
+            peak_pnl=previous.peak_pnl if previous else 0.0,
+        )
+        with self._lock:
+            self._positions[symbol] = watched
+
+    def start(self):
+        """从交易所读取现有持仓并启动后台线程"""
+        settings = _settings()
+        if not settings['enabled'] or (self._thread and self._thread.is_alive()):
+            return
+        symbols = get_universe_symbols()
+        positions = get_positions(symbols) or {}
+        try:
+            prices = self._fetch_prices([symbol for symbol, position in positions.items() if position])
+        except Exception as e:
+            print(f"⚠️ 风控看门狗获取价格失败，止损止盈方向按入场价检查: {e}")
+            prices = {}
+        for symbol, position in positions.items():
+            if position:
+                # 重启后止损止盈价取自仍在挂单的交易所止盈止损委托
+                self.sync(symbol, position, protective_orders.get(symbol) or {},
+                          prices.get(symbol, position['entry_price']))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='risk-watchdog', daemon=True)
+        self._thread.start()
+        drawdown = (f"，最大回撤 {settings['max_drawdown_ratio']:.0%} 保证金时平仓"
+                    if settings['max_drawdown_ratio'] else "")
+        print(f"🐕 风控看门狗已启动: 每 {settings['poll_interval']}s 检查{settings['price_source']}价格"
+              f"是否触及止损止盈{drawdown}")
+
+    def stop(self, timeout=5):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _fetch_prices(self, symbols):
+        """一次请求获取多个交易对的价格"""
+        if not symbols:
+            return {}
+        if _settings()['price_source'] == 'mark':
+            tickers = exchange.fetch_mark_prices(symbols)
+            return {symbol: float(t.get('markPrice') or t['last']) for symbol, t in tickers.items() if symbol in symbols}
+        tickers = exchange.fetch_tickers(symbols)
+        return {symbol: float(t['last']) for symbol, t in tickers.items() if symbol in symbols}
+
+    def _run(self):
+        while not self._stop.wait(_settings()['poll_interval']):
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"⚠️ 风控看门狗检查失败: {e}")
+
+    def check_once(self):
+        """检查一次所有监控中的持仓（后台线程每个轮询间隔调用一次）
+
+        Returns:
+            list: 本次触发平仓的 (交易对, 类型) 列表
+        """
+        settings = _settings()
+        with self._lock:
+            watched = dict(self._positions)
+        if not watched:
+            return []
+        prices = self._fetch_prices(list(watched))
+        tripped = []
+        now = time.monotonic()
+        for symbol, position in watched.items():
+            price = prices.get(symbol)
+            if price is None or now < position.retry_at:
+                continue
+            contract_size, _ = get_contract_spec(symbol)
+            result = position.check(price, contract_size, settings['max_drawdown_ratio'])
+            if result and self._close(position, price, *result):
+                tripped.append((symbol, result[0]))
+        return tripped
+
+    def _close(self, position, price, kind, detail):
+        """reduceOnly市价平仓，成功后撤销交易所端止盈止损并保存交易记录"""
+        settings = _settings()
+        symbol = position.symbol
+        with self.trade_lock:
+            # 等待期间交易执行器可能已更新持仓，下个轮询周期按新持仓重新检查
+            if self.get(symbol) is not position:
+                return False
+            print(f"🐕 风控看门狗触发（{symbol}）: {detail}，立即平{position.side}仓 {position.size:.2f} 张")
+            close_side = 'sell' if position.side == 'long' else 'buy'
+            try:
+                fill = order_tracker.market_order(
+                    symbol,
+                    close_side,
+                    position.size,
+                    params={'reduceOnly': True, 'tdMode': 'cross', 'tag': '60bb4a8d3416BCDE'}
+                )
+            except Exception as e:
+                cycle_context.invalidate('balance', 'positions')
+                current = (get_positions([symbol]) or {symbol: position}).get(symbol)
+                if current is None:
+                    # 持仓已不存在（通常已被交易所端止盈止损平掉）
+                    print(f"ℹ️ {symbol} 持仓已平（可能已由交易所止盈止损执行），停止监控: {e}")
+                    with self._lock:
+                        self._positions.pop(symbol, None)
+                    protective_orders.sync(symbol, None, {}, price)
+                else:
+                    position.retry_at = time.monotonic() + settings['retry_seconds']
+                    print(f"❌ 风控看门狗平仓失败（{settings['retry_seconds']}s后重试）: {e}")
+                return False
+            cycle_context.invalidate('balance', 'positions')
+
+            with self._lock:
+                self._positions.pop(symbol, None)
+            protective_orders.sync(symbol, None, {}, price)
+
+        close_price = fill.average or price
+        contract_size, _ = get_contract_spec(symbol)
+        pnl = position.pnl(close_price, contract_size)
+        print(f"✅ 风控看门狗平仓完成: 成交价 {close_price:.2f}，盈亏 {pnl:+.2f} USDT")
+        try:
+            save_trade_record({
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'notes': symbol,  # 交易对（多币种模式下区分币种）
+                'signal': 'CLOSE',
+                'price': close_price,
+                'amount': position.size,
+                'confidence': 'HIGH',
+                'reason': f"风控看门狗: {detail}",
+                'pnl': pnl,
+                'trade_type': kind,
+                'position_action': 'close',
+                'position_side': position.side
+            })
+        except Exception as e:
+            print(f"保存交易记录失败: {e}")
+        return True
+
+
+# 全局风控看门狗实例
+risk_watchdog = RiskWatchdog()
@@ -0,0 +1,309 @@
+"""交易信号解析模块 - 提取AI回复中的JSON、按声明的schema校验并统一字段名
+
+原实现用 find('{') / rfind('}') 截取JSON，解析失败后把所有单引号替换为双引号、
+用 (\\w+): 正则给"键"加引号，会破坏URL、时间戳和理由文本；字段校验分散在长串if/else中。
+本模块：
+1. extract_json: 从第一个候选起点用C实现的 raw_decode 直接解码；失败时按括号配对
+   找到该值的结尾，只修复字符串之外的不规范写法（单引号字符串、未加引号的键、
+   尾随逗号、Python字面量），字符串内容原样保留；
+2. validate_signal: 统一新旧字段名（justification→reason、buy_to_enter→BUY 等），
+   按 SIGNAL_SCHEMA 校验并转换类型，返回精确到字段的错误列表。
+"""
+import json
+import math
+import re
+
+# 复用同一个解码器（json.loads 每次都会查找默认解码器）
+_decoder = json.JSONDecoder()
+
+# 带千位分隔符的数字（如 "95,000.5"）；其他含逗号的写法（如小数逗号 "1,5"）视为无效
+_THOUSANDS_NUMBER = re.compile(r'-?\d{1,3}(,\d{3})+(\.\d+)?')
+
+# 新格式信号 -> 旧格式信号
+SIGNAL_MAPPING = {
+    'buy_to_enter': 'BUY',
+    'sell_to_enter': 'SELL',
+    'hold': 'HOLD',
+    'close': 'CLOSE',  # close信号需要平掉当前持仓
+    'close_position': 'CLOSE',
+}
+
+# 新格式字段名 -> 旧格式字段名（旧字段已存在时不覆盖）
+FIELD_ALIASES = {
+    'justification': 'reason',
+    'profit_target': 'take_profit',
+}
+
+# 信号schema：字段 -> 规则
+# type: signal（枚举）/ confidence（HIGH|MEDIUM|LOW 或数字，大于1按百分比）/ text / number / integer（数字，取整）
+SIGNAL_SCHEMA = {
+    'signal': {'type': 'signal', 'required': True, 'choices': ('BUY', 'SELL', 'HOLD', 'CLOSE')},
+    'reason': {'type': 'text', 'required': True},
+    'stop_loss': {'type': 'number', 'required': True, 'min': 0, 'exclusive_min': True},
+    'take_profit': {'type': 'number', 'required': True, 'min': 0, 'exclusive_min': True},
+    'confidence': {'type': 'confidence', 'required': True, 'choices': ('HIGH', 'MEDIUM', 'LOW')},
+    'quantity': {'type': 'number', 'required': False, 'min': 0, 'exclusive_min': True},
+    'leverage': {'type': 'integer', 'required': False, 'min': 1, 'max': 20},
+}
+
+_PY_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def _balanced_end(text, start):
+    """从 start 处的括号开始按配对找到该JSON值的结尾（不含），找不到返回-1
+
+    单引号和双引号字符串中的括号与转义字符都会被跳过。
+    """
+    stack = []
+    quote = None
+    escape = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote is not None:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == quote:
+                quote = None
+            continue
+        if char == '"' or char == "'":
+            quote = char
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char == '}' or char == ']':
+            if not stack or stack.pop() != char:
+                return -1
+            if not stack:
+                return index + 1
+    return -1
+
+
+def repair_json(text):
+    """修复字符串之外的不规范JSON写法，字符串内容原样保留
+
+    - 'single quoted' 字符串 -> "double quoted"
+    - 对象中未加引号的键 {signal: ...} -> {"signal": ...}
+    - 尾随逗号 [1, 2,] / {"a": 1,} -> 去掉
+    - True / False / None -> true / false / null
+    """
+    out = []
+    append = out.append
+    length = len(text)
+    index = 0
+    last = ''  # 上一个输出的非空白字符
+    while index < length:
+        char = text[index]
+        if char == '"':
+            end = index + 1
+            while end < length and text[end] != '"':
+                end += 2 if text[end] == '\\' else 1
+            append(text[index:end + 1])
+            last = '"'
+            index = end + 1
+        elif char == "'":
+            end = index + 1
+            parts = []
+            while end < length and text[end] != "'":
+                if text[end] == '\\' and end + 1 < length:
+                    # \' 在双引号字符串中无需转义
+                    parts.append("'" if text[end + 1] == "'" else text[end:end + 2])
+                    end += 2
+                    continue
+                parts.append('\\"' if text[end] == '"' else text[end])
+                end += 1
+            append('"' + ''.join(parts) + '"')
+            last = '"'
+            index = end + 1
+        elif char.isalpha() or char == '_':
+            end = index + 1
+            while end < length and (text[end].isalnum() or text[end] == '_'):
+                end += 1
+            word = text[index:end]
+            following = end
+            while following < length and text[following] in ' \t\r\n':
+                following += 1
+            if last and last in '{,' and following < length and text[following] == ':':
+                append('"' + word + '"')
+            else:
+                append(_PY_LITERALS.get(word, word))
+            last = 'w'
+            index = end
+        elif char == ',':
+            following = index + 1
+            while following < length and text[following] in ' \t\r\n':
+                following += 1
+            if following < length and text[following] in '}]':
+                index += 1
+                continue
+            append(char)
+            last = char
+            index += 1
+        else:
+            append(char)
+            if char not in ' \t\r\n':
+                last = char
+            index += 1
+    return ''.join(out)
+
+
+def loads_lenient(text):
+    """解析JSON文本，标准解析失败时修复字符串之外的不规范写法后重试
+
+    Raises:
+        json.JSONDecodeError: 修复后仍无法解析
+    """
+    try:
+        return _decoder.decode(text)
+    except json.JSONDecodeError:
+        return _decoder.decode(repair_json(text))
+
+
+def is_decision(value):
+    """是否像交易决策：含 signal 或 decisions 键的对象，或包含带 signal 键对象的数组
+
+    用于跳过说明文字中的 "{signal}"、"{}" 等片段。
+    """
+    if isinstance(value, dict):
+        return 'signal' in value or 'decisions' in value
+    if isinstance(value, list):
+        return any(isinstance(item, dict) and 'signal' in item for item in value)
+    return False
+
+
+def extract_json(text, openers='{', accept=None):
+    """提取文本中第一个可解析的JSON值（跳过说明文字、代码块标记和无法解析的片段）
+
+    Args:
+        text: AI回复的原始文本
+        openers: 允许作为起点的字符（'{' 只接受对象，'{[' 同时接受数组）
+        accept: 可选的判断函数，解析出的值不满足时跳过该片段继续寻找（如 is_decision）
+
+    Returns:
+        解析出的对象/数组，找不到时返回None
+    """
+    if not text:
+        return None
+    position = 0
+    length = len(text)
+    while position < length:
+        start = min((index for index in (text.find(opener, position) for opener in openers) if index != -1),
+                    default=-1)
+        if start == -1:
+            return None
+        try:
+            value = _decoder.raw_decode(text, start)[0]
+            if accept is None or accept(value):
+                return value
+        except json.JSONDecodeError:
+            end = _balanced_end(text, start)
+            if end != -1:
+                try:
+                    value = _decoder.decode(repair_json(text[start:end]))
+                    if accept is None or accept(value):
+                        return value
+                except json.JSONDecodeError:
+                    pass
+        position = start + 1
+    return None
+
+
+def _to_number(value):
+    """转换为有限浮点数（接受数字和数字字符串，如 "95,000.5"），失败返回None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if ',' in value:
+            if not _THOUSANDS_NUMBER.fullmatch(value):
+                return None
+            value = value.replace(',', '')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _check_field(name, value, rule):
+    """按规则校验并转换单个字段
+
+    Returns:
+        tuple: (转换后的值, 错误信息或None)
+    """
+    kind = rule['type']
+    if kind == 'signal':
+        if not isinstance(value, str):
+            return value, f"{name} 应为字符串，实际为 {type(value).__name__}"
+        normalized = SIGNAL_MAPPING.get(value.strip().lower(), value.strip().upper())
+        if normalized not in rule['choices']:
+            return value, f"{name} 取值 {value!r} 不在 {'/'.join(rule['choices'])} 中"
+        return normalized, None
+    if kind == 'confidence':
+        if isinstance(value, str) and value.strip().upper() in rule['choices']:
+            return value.strip().upper(), None
+        is_percent = isinstance(value, str) and value.strip().endswith('%')
+        number = _to_number(value.strip()[:-1] if is_percent else value)
+        if number is None:
+            return value, f"{name} 应为 {'/'.join(rule['choices'])} 或数字，实际为 {value!r}"
+        # 与原实现一致，任何数字都按阈值映射：大于1（如 75、"80%"）按百分比处理，超出范围的截断到0-1
+        if is_percent or number > 1:
+            number /= 100
+        number = min(max(number, 0.0), 1.0)
+        return ('HIGH' if number >= 0.7 else 'MEDIUM' if number >= 0.4 else 'LOW'), None
+    if kind == 'text':
+        if value is None or isinstance(value, (dict, list)):
+            return value, f"{name} 应为文本，实际为 {type(value).__name__}"
+        return str(value), None
+
+    number = _to_number(value)
+    if number is None:
+        return value, f"{name} 应为数字，实际为 {value!r}"
+    if kind == 'integer':
+        # 与交易执行器原有处理一致：小数按 int() 取整后再检查范围（如 10.5 -> 10）
+        number = int(number)
+    if 'min' in rule and (number <= rule['min'] if rule.get('exclusive_min') else number < rule['min']):
+        return value, f"{name} 应{'大于' if rule.get('exclusive_min') else '不小于'} {rule['min']}，实际为 {value!r}"
+    if 'max' in rule and number > rule['max']:
+        return value, f"{name} 应不大于 {rule['max']}，实际为 {value!r}"
+    return number, None
+
+
+def validate_signal(data, schema=None):
+    """统一新旧字段名并按schema校验、转换信号字段
+
+    必需字段缺失或无效时记为错误；可选字段（quantity、leverage）无效时移除该字段并记为警告，
+    由交易执行阶段按缺少字段处理。
+
+    Args:
+        data: 从AI回复中解析出的信号字典
+        schema: 校验规则，默认 SIGNAL_SCHEMA
+
+    Returns:
+        tuple: (规范化后的信号字典（保留额外字段）, 错误列表, 警告列表)；错误列表为空表示校验通过
+    """
+    if not isinstance(data, dict):
+        return data, [f"信号应为JSON对象，实际为 {type(data).__name__}"], []
+    schema = schema or SIGNAL_SCHEMA
+    signal = dict(data)
+    for alias, field in FIELD_ALIASES.items():
+        if alias in signal and field not in signal:
+            signal[field] = signal[alias]
+
+    errors = []
+    warnings = []
+    for name, rule in schema.items():
+        if name not in signal or signal[name] is None:
+            if rule['required']:
+                errors.append(f"缺少必需字段 {name}")
+            continue
+        value, error = _check_field(name, signal[name], rule)
+        if error is None:
+            signal[name] = value
+        elif rule['required']:
+            errors.append(error)
+        else:
+            del signal[name]
+            warnings.append(error)
+    return signal, errors, warnings
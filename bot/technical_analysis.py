@@ -1,5 +1,6 @@
 """技术指标分析模块"""
 import pandas as pd
+from .indicator_registry import indicator_registry, adopt_technical_indicators
 
 
 def calculate_technical_indicators(df):
@@ -42,7 +43,8 @@ def calculate_technical_indicators(df):
         # 填充NaN值
         df = df.bfill().ffill()
 
-        return df
+        # 登记已计算的指标列，后续序列/提示词直接复用
+        return adopt_technical_indicators(df)
     except Exception as e:
         print(f"技术指标计算失败: {e}")
         return df
@@ -148,14 +150,9 @@ def generate_technical_analysis_text(price_data):
 
 
 def calculate_rsi_series(df, period=14):
-    """计算RSI序列"""
+    """计算RSI序列（同一版本的K线只计算一次，见indicator_registry）"""
     try:
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi.fillna(50).tolist()  # 填充NaN为50（中性）
+        return indicator_registry.series(df, 'rsi', fill=50, period=period).tolist()  # 填充NaN为50（中性）
     except Exception as e:
         print(f"RSI序列计算失败: {e}")
         return [50] * len(df)
@@ -164,8 +161,7 @@ def calculate_rsi_series(df, period=14):
 def calculate_ema_series(df, period=20):
     """计算EMA序列"""
     try:
-        ema = df['close'].ewm(span=period, adjust=False).mean()
-        return ema.fillna(df['close']).tolist()
+        return indicator_registry.series(df, 'ema', fill=df['close'], span=period, adjust=False).tolist()
     except Exception as e:
         print(f"EMA序列计算失败: {e}")
         return df['close'].tolist()
@@ -174,10 +170,7 @@ def calculate_ema_series(df, period=20):
 def calculate_macd_series(df):
     """计算MACD序列"""
     try:
-        ema_12 = df['close'].ewm(span=12).mean()
-        ema_26 = df['close'].ewm(span=26).mean()
-        macd = ema_12 - ema_26
-        return macd.fillna(0).tolist()
+        return indicator_registry.series(df, 'macd', fill=0).tolist()
     except Exception as e:
         print(f"MACD序列计算失败: {e}")
         return [0] * len(df)
@@ -186,13 +179,8 @@ def calculate_macd_series(df):
 def calculate_atr_series(df, period=14):
     """计算ATR序列"""
     try:
-        high_low = df['high'] - df['low']
-        high_close = abs(df['high'] - df['close'].shift())
-        low_close = abs(df['low'] - df['close'].shift())
-        tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        atr = tr.rolling(period).mean()
-        return atr.fillna(tr).tolist()
+        tr = indicator_registry.series(df, 'tr')
+        return indicator_registry.series(df, 'atr', fill=tr, period=period).tolist()
     except Exception as e:
         print(f"ATR序列计算失败: {e}")
         return [0] * len(df)
-
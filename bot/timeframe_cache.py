@@ -0,0 +1,184 @@
+"""多时间框架K线缓存模块
+
+高周期K线（如4h）每根收盘前内容不变，没必要每个3分钟周期都重新拉取。
+缓存按K线收盘时间失效：已收盘K线及其指标常驻内存，只有未收盘的K线
+在每个周期用基础周期K线（如3m）本地重采样刷新，必要时退回到ticker。
+"""
+import ccxt
+import pandas as pd
+
+from .indicator_registry import indicator_registry
+
+
+def _calculate_closed_indicators(df, timeframe=None):
+    """计算已收盘K线的指标（与原_get_4h_data算法一致，经指标注册表计算）"""
+    indicator_registry.ensure(df, 'ema', timeframe=timeframe, span=20, adjust=False)
+    indicator_registry.ensure(df, 'ema', timeframe=timeframe, span=50, adjust=False)
+    indicator_registry.ensure(df, 'macd', timeframe=timeframe)
+    indicator_registry.ensure(df, 'rsi', timeframe=timeframe, period=14)
+    indicator_registry.ensure(df, 'atr', timeframe=timeframe, period=3)
+    indicator_registry.ensure(df, 'atr', timeframe=timeframe, period=14)
+
+    return df.bfill().ffill().fillna(0)
+
+
+def _adjusted_ewm_state(closes, span):
+    """计算adjust=True指数加权均值的累积状态（分子、分母），用于O(1)推算下一根K线"""
+    decay = 1 - 2 / (span + 1)
+    numerator = 0.0
+    denominator = 0.0
+    for close in closes:
+        numerator = close + decay * numerator
+        denominator = 1 + decay * denominator
+    return numerator, denominator
+
+
+def _next_adjusted_ewm(state, close, span):
+    """在已收盘状态上推算未收盘K线的adjust=True指数加权均值"""
+    decay = 1 - 2 / (span + 1)
+    numerator, denominator = state
+    return (close + decay * numerator) / (1 + decay * denominator)
+
+
+class TimeframeCache:
+    """高周期K线与指标缓存（按收盘时间失效）"""
+
+    def __init__(self):
+        # (symbol, timeframe) -> 缓存条目
+        self._entries = {}
+
+    def _refresh_closed(self, exchange, symbol, timeframe, limit):
+        """确保已收盘K线是最新的：只有在当前未收盘K线收盘后才重新拉取"""
+        key = (symbol, timeframe)
+        entry = self._entries.get(key)
+        now_ms = exchange.milliseconds()
+        if entry is not None and now_ms < entry['close_time']:
+            return entry
+
+        tf_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        if not ohlcv:
+            raise ValueError(f"未能获取{timeframe}K线数据")
+
+        # 拆分已收盘K线与未收盘K线（交易所可能尚未生成新K线）
+        last = ohlcv[-1]
+        if last[0] + tf_ms > now_ms:
+            closed, forming = ohlcv[:-1], list(last)
+        else:
+            closed, forming = ohlcv, None
+        forming_open = forming[0] if forming else last[0] + tf_ms
+
+        closed_df = pd.DataFrame(closed, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        closed_df = _calculate_closed_indicators(closed_df, timeframe)
+        closes = closed_df['close'].tolist()
+
+        entry = {
+            'timeframe': timeframe,
+            'tf_ms': tf_ms,
+            'closed': closed_df,
+            'forming': forming,
+            'forming_open': forming_open,
+            'close_time': forming_open + tf_ms,
+            'ewm_state': {
+                12: _adjusted_ewm_state(closes, 12),
+                26: _adjusted_ewm_state(closes, 26),
+            },
+        }
+        self._entries[key] = entry
+        print(f"✓ {timeframe}K线缓存已刷新: {len(closed)} 根已收盘K线，下次收盘 "
+              f"{pd.to_datetime(entry['close_time'], unit='ms')} UTC")
+        return entry
+
+    def prefetch(self, exchange, symbol, timeframe='4h', limit=60):
+        """只执行网络部分：确保已收盘K线缓存是最新的（可与其他请求并发执行）"""
+        self._refresh_closed(exchange, symbol, timeframe, limit)
+
+    def _build_forming_bar(self, exchange, symbol, entry, base_df):
+        """构建未收盘K线：优先用基础周期K线本地重采样，否则用ticker刷新"""
+        forming_open = entry['forming_open']
+        if base_df is not None and not base_df.empty:
+            open_time = pd.to_datetime(forming_open, unit='ms')
+            if base_df['timestamp'].iloc[0] <= open_time:
+                rows = base_df[base_df['timestamp'] >= open_time]
+                if not rows.empty:
+                    return [
+                        forming_open,
+                        float(rows['open'].iloc[0]),
+                        float(rows['high'].max()),
+                        float(rows['low'].min()),
+                        float(rows['close'].iloc[-1]),
+                        float(rows['volume'].sum()),
+                    ]
+
+        # 基础周期K线无法覆盖整根高周期K线时，用ticker最新价刷新
+        ticker = exchange.fetch_ticker(symbol)
+        last_price = float(ticker['last'])
+        forming = entry['forming']
+        if forming is None:
+            prev_close = float(entry['closed']['close'].iloc[-1])
+            forming = [forming_open, prev_close, prev_close, prev_close, prev_close, 0.0]
+        return [
+            forming_open,
+            forming[1],
+            max(forming[2], last_price),
+            min(forming[3], last_price),
+            last_price,
+            forming[5],
+        ]
+
+    def get_context(self, exchange, symbol, timeframe='4h', limit=60, base_df=None, tail=10):
+        """获取高周期上下文数据（字段与原_get_4h_data返回值一致）
+
+        Args:
+            exchange: ccxt交易所实例
+            symbol: 交易对
+            timeframe: 高周期（默认4h）
+            limit: 首次/收盘后拉取的K线数量
+            base_df: 基础周期K线DataFrame（timestamp列为datetime），用于重采样未收盘K线
+            tail: 序列字段返回的长度
+        """
+        entry = self._refresh_closed(exchange, symbol, timeframe, limit)
+        closed = entry['closed']
+        forming = self._build_forming_bar(exchange, symbol, entry, base_df)
+        _, _, high, low, close, volume = forming
+
+        # 在已收盘指标上O(1)推算未收盘K线的指标
+        prev = closed.iloc[-1]
+        ema20 = prev['ema_20'] + (2 / 21) * (close - prev['ema_20'])
+        ema50 = prev['ema_50'] + (2 / 51) * (close - prev['ema_50'])
+        macd = (_next_adjusted_ewm(entry['ewm_state'][12], close, 12)
+                - _next_adjusted_ewm(entry['ewm_state'][26], close, 26))
+
+        closes = closed['close'].tail(14).tolist() + [close]
+        deltas = [b - a for a, b in zip(closes[:-1], closes[1:])]
+        gain = sum(d for d in deltas if d > 0) / 14
+        loss = sum(-d for d in deltas if d < 0) / 14
+        if loss > 0:
+            rsi14 = 100 - 100 / (1 + gain / loss)
+        elif gain > 0:
+            rsi14 = 100.0
+        else:
+            rsi14 = float(prev['rsi_14'])
+
+        prev_close = float(prev['close'])
+        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        trs = closed['tr'].tolist()
+        atr3 = (sum(trs[-2:]) + tr) / 3
+        atr14 = (sum(trs[-13:]) + tr) / 14
+
+        volumes = closed['volume'].tail(19).tolist() + [volume]
+
+        return {
+            'ema20_4h': float(ema20),
+            'ema50_4h': float(ema50),
+            'atr3_4h': float(atr3),
+            'atr14_4h': float(atr14),
+            'current_volume_4h': float(volume),
+            'avg_volume_4h': float(sum(volumes) / len(volumes)),
+            'macd_4h': closed['macd'].tail(tail - 1).fillna(0).tolist() + [float(macd)],
+            'rsi14_4h': closed['rsi_14'].tail(tail - 1).fillna(50).tolist() + [float(rsi14)],
+        }
+
+
+# 全局多时间框架缓存实例
+timeframe_cache = TimeframeCache()
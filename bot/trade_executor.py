@@ -1,15 +1,125 @@
 """交易执行模块"""
 import time
 from datetime import datetime
-from .config import exchange, TRADE_CONFIG
-from .position_manager import get_current_position
+import ccxt
+from .config import TRADE_CONFIG
+from .position_manager import get_current_position, get_contract_spec, get_max_market_amount
+from .cycle_context import cycle_context
+from .leverage_cache import leverage_cache
+from .order_tracker import order_tracker, average_fill_price
+from .protective_orders import protective_orders
+from .risk_watchdog import risk_watchdog
 from data_manager import save_trade_record
 
 
-def execute_intelligent_trade(signal_data, price_data):
-    """执行智能交易 - OKX版本（支持同方向加仓减仓）"""
+def _place_order(symbol, side, amount, params, fills):
+    """下市价单并等待成交确认，成交结果追加到fills"""
+    fill = order_tracker.market_order(symbol, side, amount, params=params)
+    fills.append(fill)
+    return fill
 
-    current_position = get_current_position()
+
+def _log_reversal(method, started, fills, side, reference_price):
+    """打印反手耗时和相对下单前行情价的滑点（正值表示成交价不利）"""
+    elapsed = time.perf_counter() - started
+    average = average_fill_price(fills)
+    if average and reference_price:
+        direction = 1 if side == 'buy' else -1
+        slippage_bps = (average - reference_price) / reference_price * 10000 * direction
+        print(f"🔁 反手完成（{method}）: 耗时 {elapsed:.2f}s，成交均价 {average:.2f}，"
+              f"滑点 {slippage_bps:+.1f}bp（参考价 {reference_price:.2f}）")
+    else:
+        print(f"🔁 反手完成（{method}）: 耗时 {elapsed:.2f}s，成交价未知")
+
+
+def _reverse_position(symbol, current_position, position_size, side, fills, reference_price):
+    """反手：单向持仓模式下用一笔 当前持仓+目标仓位 的市价单完成平仓并开新仓
+
+    持仓模式不是单向、反手总量超过单笔市价单上限、交易所拒绝该订单，或重新读取的持仓与周期开始时
+    的快照不一致（如已被交易所止盈止损部分/全部平掉）时，退回先平（reduceOnly）后开两笔订单。
+    调用方持有 risk_watchdog.trade_lock，看门狗不会同时平仓。
+
+    Args:
+        symbol: 交易对
+        current_position: 周期开始时的持仓快照（与新方向相反）
+        position_size: 新方向的目标仓位（张）
+        side: 新方向的下单方向 'buy' / 'sell'
+        fills: 成交结果列表
+        reference_price: 下单前的行情价（用于计算滑点）
+    """
+    started = time.perf_counter()
+    # 按最新持仓计算反手总量，避免旧仓已平时开出约两倍目标仓位
+    cycle_context.invalidate('positions')
+    latest_position = get_current_position(symbol)
+    total_size = round(current_position['size'] + position_size, 2)
+    max_amount = get_max_market_amount(symbol)
+
+    if (latest_position is None or latest_position['side'] != current_position['side']
+            or abs(latest_position['size'] - current_position['size']) >= 0.01):
+        latest = f"{latest_position['side']} {latest_position['size']:.2f} 张" if latest_position else "无持仓"
+        reason = f"持仓已变化（快照: {current_position['side']} {current_position['size']:.2f} 张，最新: {latest}）"
+    elif not TRADE_CONFIG.get('reversal', {}).get('single_order', True):
+        reason = "已关闭单笔反手"
+    elif not TRADE_CONFIG.get('net_mode', False):
+        reason = "未确认单向持仓模式"
+    elif max_amount is not None and total_size > max_amount:
+        reason = f"反手总量 {total_size:.2f} 张超过单笔市价单上限 {max_amount:.2f} 张"
+    else:
+        reason = None
+        try:
+            fill = _place_order(symbol, side, total_size, {'tag': '60bb4a8d3416BCDE'}, fills)
+        except ccxt.InvalidOrder as e:
+            # 交易所拒绝（如超过数量限制）：订单未提交，改用两笔订单
+            reason = f"交易所拒绝单笔反手订单: {e}"
+        else:
+            if not fill.is_filled:
+                print(f"⚠️ 单笔反手订单未确认完全成交（状态: {fill.status}，已成交 {fill.filled}/{fill.amount}）")
+            _log_reversal('单笔订单', started, fills, side, reference_price)
+            return
+
+    print(f"⚠️ {reason}，使用先平后开两笔订单")
+    # 平掉最新读取到的旧方向持仓（已不存在时跳过），确认成交后立即开仓
+    if latest_position and latest_position['side'] == current_position['side']:
+        close_fill = _place_order(
+            symbol,
+            side,
+            latest_position['size'],
+            {'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'},
+            fills
+        )
+        if not close_fill.is_filled:
+            raise RuntimeError(f"平{'空' if side == 'buy' else '多'}仓未确认成交（状态: {close_fill.status}），不开新仓")
+    _place_order(
+        symbol,
+        side,
+        position_size,
+        {'tag': '60bb4a8d3416BCDE'},
+        fills
+    )
+    _log_reversal('先平后开', started, fills, side, reference_price)
+
+
+def execute_intelligent_trade(signal_data, price_data, symbol=None):
+    """执行智能交易 - OKX版本（支持同方向加仓减仓）
+
+    执行期间风控看门狗不会平仓，避免按交易前的持仓下单。
+
+    Args:
+        signal_data: 交易信号
+        price_data: 价格数据
+        symbol: 交易对，默认TRADE_CONFIG['symbol']（多币种模式下传入各币种）
+    """
+    with risk_watchdog.trade_lock:
+        return _execute_intelligent_trade(signal_data, price_data, symbol)
+
+
+def _execute_intelligent_trade(signal_data, price_data, symbol=None):
+    symbol = symbol or TRADE_CONFIG['symbol']
+    contract_size, min_contracts = get_contract_spec(symbol)
+    # 周期开始时缓存的持仓可能已过期（分析期间交易所止盈止损或风控看门狗已平仓），
+    # 计算下单数量前重新读取（执行期间持有 risk_watchdog.trade_lock，看门狗不会同时平仓）
+    cycle_context.invalidate('positions')
+    current_position = get_current_position(symbol)
 
     # 防止频繁反转的逻辑保持不变
     if current_position and signal_data['signal'] != 'HOLD':
@@ -88,8 +198,6 @@ def execute_intelligent_trade(signal_data, price_data):
         
         # AI返回的quantity是币的数量（如BTC数量），需要转换为合约张数
         # 合约张数 = 币的数量 / 合约乘数
-        contract_size = TRADE_CONFIG.get('contract_size', 0.01)  # 默认0.01（1张=0.01 BTC）
-        
         # 将币数量转换为合约张数
         position_size_coins = float(ai_quantity)
         position_size = position_size_coins / contract_size
@@ -106,18 +214,16 @@ def execute_intelligent_trade(signal_data, price_data):
         position_size = round(position_size, 2)
         
         # 确保最小交易量
-        min_contracts = TRADE_CONFIG.get('min_amount', 0.01)
         if position_size < min_contracts:
             print(f"⚠️ AI返回的仓位({position_size:.2f}张)小于最小值({min_contracts}张)，调整为最小值")
             position_size = min_contracts
         
         # 验证账户余额是否足够支付保证金
         try:
-            balance = exchange.fetch_balance()
+            balance = cycle_context.fetch_balance()
             available_balance = float(balance['USDT'].get('free', 0))  # 可用余额
             
             # 计算合约价值（开仓方向调整仓位时，只计算新增部分的保证金）
-            contract_size = TRADE_CONFIG.get('contract_size', 0.01)
             current_price = price_data['price']
             
             # 如果已有同方向持仓，计算需要调整的仓位
@@ -198,14 +304,12 @@ def execute_intelligent_trade(signal_data, price_data):
             traceback.print_exc()
             return
         
-        # 设置AI返回的杠杆（在开仓前设置）
+        # 设置AI返回的杠杆（在开仓前设置；与已生效的杠杆相同时跳过私有接口调用）
         try:
-            exchange.set_leverage(
-                ai_leverage,
-                TRADE_CONFIG['symbol'],
-                {'mgnMode': 'cross'}  # 全仓模式
-            )
-            print(f"✅ 使用AI返回的杠杆倍数: {ai_leverage}x")
+            if leverage_cache.ensure(symbol, ai_leverage, 'cross'):  # 全仓模式
+                print(f"✅ 使用AI返回的杠杆倍数: {ai_leverage}x")
+            else:
+                print(f"✅ 使用AI返回的杠杆倍数: {ai_leverage}x（已生效，无需设置）")
         except Exception as e:
             print(f"❌ AI策略执行失败：设置杠杆失败: {e}")
             print(f"   交易信号: {signal_data['signal']}")
@@ -221,6 +325,8 @@ def execute_intelligent_trade(signal_data, price_data):
 
     # 完全使用AI返回的策略，包括低信心信号（AI已经在策略中考虑了风险）
 
+    # 本次下单的成交结果（交易记录使用实际成交价）
+    fills = []
     try:
         # 执行交易逻辑 - 支持同方向加仓减仓
         if signal_data['signal'] == 'BUY':
@@ -228,28 +334,16 @@ def execute_intelligent_trade(signal_data, price_data):
                 # 先检查空头持仓是否真实存在且数量正确
                 if current_position['size'] > 0:
                     print(f"平空仓 {current_position['size']:.2f} 张并开多仓 {position_size:.2f} 张...")
-                    # 平空仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
-                        'buy',
-                        current_position['size'],
-                        params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
-                    )
-                    time.sleep(1)
-                    # 开多仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
-                        'buy',
-                        position_size,
-                        params={'tag': '60bb4a8d3416BCDE'}
-                    )
+                    # 单向持仓模式下一笔订单完成平空开多
+                    _reverse_position(symbol, current_position, position_size, 'buy', fills, price_data['price'])
                 else:
                     print("⚠️ 检测到空头持仓但数量为0，直接开多仓")
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    _place_order(
+                        symbol,
                         'buy',
                         position_size,
-                        params={'tag': '60bb4a8d3416BCDE'}
+                        {'tag': '60bb4a8d3416BCDE'},
+                        fills
                     )
 
             elif current_position and current_position['side'] == 'long':
@@ -262,22 +356,24 @@ def execute_intelligent_trade(signal_data, price_data):
                         add_size = round(size_diff, 2)
                         print(
                             f"多仓加仓 {add_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        _place_order(
+                            symbol,
                             'buy',
                             add_size,
-                            params={'tag': '60bb4a8d3416BCDE'}
+                            {'tag': '60bb4a8d3416BCDE'},
+                            fills
                         )
                     else:
                         # 减仓
                         reduce_size = round(abs(size_diff), 2)
                         print(
                             f"多仓减仓 {reduce_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        _place_order(
+                            symbol,
                             'sell',
                             reduce_size,
-                            params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
+                            {'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'},
+                            fills
                         )
                 else:
                     print(
@@ -285,11 +381,12 @@ def execute_intelligent_trade(signal_data, price_data):
             else:
                 # 无持仓时开多仓
                 print(f"开多仓 {position_size:.2f} 张...")
-                exchange.create_market_order(
-                    TRADE_CONFIG['symbol'],
+                _place_order(
+                    symbol,
                     'buy',
                     position_size,
-                    params={'tag': '60bb4a8d3416BCDE'}
+                    {'tag': '60bb4a8d3416BCDE'},
+                    fills
                 )
 
         elif signal_data['signal'] == 'SELL':
@@ -297,28 +394,16 @@ def execute_intelligent_trade(signal_data, price_data):
                 # 先检查多头持仓是否真实存在且数量正确
                 if current_position['size'] > 0:
                     print(f"平多仓 {current_position['size']:.2f} 张并开空仓 {position_size:.2f} 张...")
-                    # 平多仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
-                        'sell',
-                        current_position['size'],
-                        params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
-                    )
-                    time.sleep(1)
-                    # 开空仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
-                        'sell',
-                        position_size,
-                        params={'tag': '60bb4a8d3416BCDE'}
-                    )
+                    # 单向持仓模式下一笔订单完成平多开空
+                    _reverse_position(symbol, current_position, position_size, 'sell', fills, price_data['price'])
                 else:
                     print("⚠️ 检测到多头持仓但数量为0，直接开空仓")
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    _place_order(
+                        symbol,
                         'sell',
                         position_size,
-                        params={'tag': '60bb4a8d3416BCDE'}
+                        {'tag': '60bb4a8d3416BCDE'},
+                        fills
                     )
 
             elif current_position and current_position['side'] == 'short':
@@ -331,22 +416,24 @@ def execute_intelligent_trade(signal_data, price_data):
                         add_size = round(size_diff, 2)
                         print(
                             f"空仓加仓 {add_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        _place_order(
+                            symbol,
                             'sell',
                             add_size,
-                            params={'tag': '60bb4a8d3416BCDE'}
+                            {'tag': '60bb4a8d3416BCDE'},
+                            fills
                         )
                     else:
                         # 减仓
                         reduce_size = round(abs(size_diff), 2)
                         print(
                             f"空仓减仓 {reduce_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        _place_order(
+                            symbol,
                             'buy',
                             reduce_size,
-                            params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
+                            {'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'},
+                            fills
                         )
                 else:
                     print(
@@ -354,59 +441,68 @@ def execute_intelligent_trade(signal_data, price_data):
             else:
                 # 无持仓时开空仓
                 print(f"开空仓 {position_size:.2f} 张...")
-                exchange.create_market_order(
-                    TRADE_CONFIG['symbol'],
+                _place_order(
+                    symbol,
                     'sell',
                     position_size,
-                    params={'tag': '60bb4a8d3416BCDE'}
+                    {'tag': '60bb4a8d3416BCDE'},
+                    fills
                 )
 
         elif signal_data['signal'] == 'HOLD':
             print("建议观望，不执行交易")
+            # 持仓不变，但新信号的止损止盈价可能变化
+            protective_orders.sync(symbol, current_position, signal_data, price_data['price'])
+            risk_watchdog.sync(symbol, current_position, signal_data, price_data['price'])
             return
         
         elif signal_data['signal'] == 'CLOSE':
-            # CLOSE信号：完全平掉当前持仓（如果有）
+            # CLOSE信号：完全平掉当前持仓（如果有，持仓已在执行开始时重新读取）
             if current_position and current_position['size'] > 0:
                 print(f"CLOSE信号：平仓 {current_position['size']:.2f} 张 ({current_position['side']})")
                 try:
-                    # 平仓：与当前持仓方向相反的下单
-                    if current_position['side'] == 'long':
-                        # 平多仓：下卖单
-                        order = exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
-                            'sell',
-                            current_position['size'],
-                            None,
-                            None,
-                            {'tdMode': 'cross'}  # 全仓模式
-                        )
-                    else:  # short
-                        # 平空仓：下买单
-                        order = exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
-                            'buy',
-                            current_position['size'],
-                            None,
-                            None,
-                            {'tdMode': 'cross'}  # 全仓模式
-                        )
+                    # 平仓：与当前持仓方向相反的下单（平多仓下卖单，平空仓下买单）
+                    close_side = 'sell' if current_position['side'] == 'long' else 'buy'
+                    order = _place_order(
+                        symbol,
+                        close_side,
+                        current_position['size'],
+                        {'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'},  # 只减仓，持仓已平时不会反向开仓
+                        fills
+                    )
                     print(f"✅ 平仓成功: {order}")
                 except Exception as e:
                     print(f"❌ 平仓失败: {e}")
                     import traceback
                     traceback.print_exc()
                     return
+                finally:
+                    # 下单后账户和持仓已变化，使本周期缓存失效
+                    cycle_context.invalidate('balance', 'positions')
             else:
                 print("CLOSE信号：当前无持仓，无需操作")
+            # 持仓已平，撤销交易所止盈止损委托
+            protective_orders.sync(symbol, None, signal_data, price_data['price'])
+            risk_watchdog.sync(symbol, None, signal_data, price_data['price'])
             return
 
         print("智能交易执行成功")
-        time.sleep(2)
+        # 订单已确认成交，使本周期缓存的余额和持仓失效
+        cycle_context.invalidate('balance', 'positions')
         # 获取交易后的持仓状态，用于比较和计算盈亏
-        updated_position = get_current_position()
+        updated_position = get_current_position(symbol)
         print(f"更新后持仓: {updated_position}")
         
+        # 实际成交价（反手时第一笔为平仓、最后一笔为开仓）；没有成交价时使用下单前的行情价
+        close_price = fills[0].average if fills and fills[0].average else price_data['price']
+        open_price = fills[-1].average if fills and fills[-1].average else price_data['price']
+        fill_price = average_fill_price(fills, price_data['price'])
+
+        # 按交易后的持仓挂出或修改交易所止盈止损（反手后撤销旧方向的委托）
+        protective_orders.sync(symbol, updated_position, signal_data, open_price)
+        # 风控看门狗按新持仓和止损止盈价继续监控
+        risk_watchdog.sync(symbol, updated_position, signal_data, open_price)
+        
         # 保存交易记录
         try:
             # 计算实际盈亏（如果有持仓）和识别仓位操作类型
@@ -420,17 +516,17 @@ def execute_intelligent_trade(signal_data, price_data):
                     position_action = 'close'
                     position_side = current_position['side']
                     if current_position['side'] == 'long':
-                        pnl = (price_data['price'] - current_position['entry_price']) * current_position['size'] * TRADE_CONFIG.get('contract_size', 0.01)
+                        pnl = (close_price - current_position['entry_price']) * current_position['size'] * contract_size
                     else:
-                        pnl = (current_position['entry_price'] - price_data['price']) * current_position['size'] * TRADE_CONFIG.get('contract_size', 0.01)
+                        pnl = (current_position['entry_price'] - close_price) * current_position['size'] * contract_size
                 # 情况2: 方向改变（平仓并开新仓）
                 elif current_position['side'] != updated_position.get('side'):
                     position_action = 'close'  # 当前操作是平仓
                     position_side = current_position['side']
                     if current_position['side'] == 'long':
-                        pnl = (price_data['price'] - current_position['entry_price']) * current_position['size'] * TRADE_CONFIG.get('contract_size', 0.01)
+                        pnl = (close_price - current_position['entry_price']) * current_position['size'] * contract_size
                     else:
-                        pnl = (current_position['entry_price'] - price_data['price']) * current_position['size'] * TRADE_CONFIG.get('contract_size', 0.01)
+                        pnl = (current_position['entry_price'] - close_price) * current_position['size'] * contract_size
             else:
                 # 情况3: 从无持仓到有持仓（开仓）
                 if updated_position:
@@ -442,8 +538,9 @@ def execute_intelligent_trade(signal_data, price_data):
                 # 先保存平仓记录
                 close_record = {
                     'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'notes': symbol,  # 交易对（多币种模式下区分币种）
                     'signal': signal_data['signal'],
-                    'price': price_data['price'],
+                    'price': close_price,
                     'amount': current_position['size'],
                     'confidence': signal_data['confidence'],
                     'reason': signal_data['reason'],
@@ -456,8 +553,9 @@ def execute_intelligent_trade(signal_data, price_data):
                 # 再保存开仓记录（新仓位）
                 open_record = {
                     'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'notes': symbol,  # 交易对（多币种模式下区分币种）
                     'signal': signal_data['signal'],
-                    'price': price_data['price'],
+                    'price': open_price,
                     'amount': position_size,
                     'confidence': signal_data['confidence'],
                     'reason': signal_data['reason'],
@@ -474,8 +572,9 @@ def execute_intelligent_trade(signal_data, price_data):
                 
                 trade_record = {
                     'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'notes': symbol,  # 交易对（多币种模式下区分币种）
                     'signal': signal_data['signal'],
-                    'price': price_data['price'],
+                    'price': fill_price,
                     'amount': amount_to_record,
                     'confidence': signal_data['confidence'],
                     'reason': signal_data['reason'],
@@ -493,28 +592,33 @@ def execute_intelligent_trade(signal_data, price_data):
 
     except Exception as e:
         print(f"交易执行失败: {e}")
+        cycle_context.invalidate('balance', 'positions')
 
         # 如果是持仓不存在的错误，尝试直接开新仓
         if "don't have any positions" in str(e):
             print("尝试直接开新仓...")
             try:
                 if signal_data['signal'] == 'BUY':
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    _place_order(
+                        symbol,
                         'buy',
                         position_size,
-                        params={'tag': '60bb4a8d3416BCDE'}
+                        {'tag': '60bb4a8d3416BCDE'},
+                        fills
                     )
                 elif signal_data['signal'] == 'SELL':
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    _place_order(
+                        symbol,
                         'sell',
                         position_size,
-                        params={'tag': '60bb4a8d3416BCDE'}
+                        {'tag': '60bb4a8d3416BCDE'},
+                        fills
                     )
                 print("直接开仓成功")
             except Exception as e2:
                 print(f"直接开仓也失败: {e2}")
+            finally:
+                cycle_context.invalidate('balance', 'positions')
 
         import traceback
         traceback.print_exc()
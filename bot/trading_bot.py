@@ -2,35 +2,68 @@
 import time
 from datetime import datetime
 from .config import exchange, TRADE_CONFIG
+from .cycle_context import cycle_context
 from .exchange_setup import setup_exchange
-from .market_data import get_btc_ohlcv_enhanced
-from .position_manager import get_current_position
-from .ai_analyzer import analyze_with_deepseek_with_retry
+from .market_snapshot import gather_market_snapshot
+from .position_manager import get_current_position, get_positions
+from .ai_analyzer import analyze_with_deepseek_with_retry, analyze_universe_with_deepseek
+from .decision_cache import decision_cache
+from .ensemble import ensemble_enabled, analyze_with_ensemble
+from .prebuild import speculative_prebuilder
+from .universe import get_universe_symbols, gather_universe_data
 from .trade_executor import execute_intelligent_trade
+from .risk_watchdog import risk_watchdog
 from .utils import wait_for_next_period
 from data_manager import update_system_status, save_ai_analysis_record
 
 
 def trading_bot():
     """主交易机器人函数"""
-    # 等待到整点再执行
+    # 等待到整点再执行（整点前lead秒开始预构建本周期输入）
     wait_seconds = wait_for_next_period(TRADE_CONFIG['interval_minutes'])
+    lead = speculative_prebuilder.lead_seconds()
     if wait_seconds > 0:
         print(f"⏰ 等待 {wait_seconds} 秒到下一个整点...")
         # 分段等待，避免长时间阻塞导致进程退出
         while wait_seconds > 0:
-            chunk = min(wait_seconds, 30)  # 每次最多等待30秒
+            if lead and wait_seconds <= lead:
+                speculative_prebuilder.start()
+                chunk = wait_seconds
+            else:
+                chunk = min(wait_seconds - lead if lead else wait_seconds, 30)  # 每次最多等待30秒
             time.sleep(chunk)
             wait_seconds -= chunk
-            if wait_seconds > 0:
+            if wait_seconds > lead:
                 print(f"⏰ 剩余等待时间: {wait_seconds} 秒...")
 
     print("\n" + "=" * 60)
     print(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
 
-    # 1. 获取增强版K线数据
-    price_data = get_btc_ohlcv_enhanced()
+    # 本周期内的余额/持仓/ticker读取只请求一次交易所，在整个流程中共享
+    cycle_context.begin()
+    prebuilt = speculative_prebuilder.take()
+    if prebuilt is not None:
+        speculative_prebuilder.apply(prebuilt)
+    try:
+        return _run_trading_cycle(prebuilt)
+    finally:
+        cycle_context.end()
+
+
+def _run_trading_cycle(prebuilt=None):
+    """执行一个交易周期：获取数据 → AI分析 → 保存记录 → 执行交易
+
+    Args:
+        prebuilt: 整点前预构建的输入（余额、资金费率已填入周期上下文）
+    """
+    symbols = get_universe_symbols()
+    if len(symbols) > 1:
+        return _run_universe_cycle(symbols)
+
+    # 1. 并发获取K线、账户、持仓、OI/资金费率和4h数据
+    snapshot = gather_market_snapshot(oi_data=prebuilt.oi_data if prebuilt else None)
+    price_data = snapshot.price_data
     if not price_data:
         print("❌ 获取K线数据失败，跳过本次执行")
         return False  # 返回False表示本次执行失败，但进程继续运行
@@ -39,40 +72,109 @@ def trading_bot():
     print(f"数据周期: {TRADE_CONFIG['timeframe']}")
     print(f"价格变化: {price_data['price_change']:+.2f}%")
 
+    # 快照中已并发获取的数据随price_data传给AI分析，避免重复请求
+    if snapshot.oi_data:
+        price_data['oi_data'] = snapshot.oi_data
+    if snapshot.data_4h:
+        price_data['data_4h'] = snapshot.data_4h
+
     # 2. 获取账户信息
     try:
-        balance = exchange.fetch_balance()
-        # OKX返回的数据：
-        # free: 可用余额（已扣除保证金）
-        # total: 账户总值（包含未实现盈亏）
-        # used: 占用保证金（部分交易所提供）
-        account_info = {
-            'balance': float(balance['USDT'].get('total', 0)),  # 使用total作为基础余额（总资产）
-            'equity': float(balance['USDT'].get('total', 0)),   # 账户净值（OKX的total已包含未实现盈亏）
-            'available_cash': float(balance['USDT'].get('free', 0)),  # 可用余额
-            'leverage': TRADE_CONFIG['leverage']
-        }
+        account_info = _build_account_info(snapshot.balance or cycle_context.fetch_balance())
     except Exception as e:
         print(f"获取账户信息失败: {e}")
         account_info = None
 
     # 3. 获取当前持仓
-    current_position = get_current_position()
-    position_info = None
-    if current_position:
-        position_info = {
-            'side': current_position['side'],
-            'size': current_position['size'],
-            'entry_price': current_position['entry_price'],
-            'unrealized_pnl': current_position['unrealized_pnl']
-        }
+    current_position = snapshot.position
+    position_info = _build_position_info(current_position)
 
-    # 4. 使用DeepSeek分析（带重试）
-    signal_data = analyze_with_deepseek_with_retry(price_data)
+    # 4. 使用DeepSeek分析（带重试；启用多模型集成时并发投票）；市场无重大变化时复用上次决策
+    signal_data = decision_cache.lookup(price_data, position_info)
+    if signal_data is None:
+        if ensemble_enabled():
+            signal_data = analyze_with_ensemble(price_data)
+        else:
+            signal_data = analyze_with_deepseek_with_retry(price_data)
+        decision_cache.record(price_data, position_info, signal_data)
 
     if signal_data.get('is_fallback', False):
         print("⚠️ 使用备用交易信号")
 
+    _record_and_execute(signal_data, price_data, account_info, current_position, position_info)
+
+
+def _run_universe_cycle(symbols):
+    """多币种交易周期：批量获取行情 → 一次AI分析 → 按交易对保存记录并执行交易"""
+    # 1. 批量获取所有交易对的行情（一次fetch_tickers + 并发K线）
+    price_data_map = gather_universe_data(symbols)
+    if not price_data_map:
+        print("❌ 获取K线数据失败，跳过本次执行")
+        return False
+
+    for symbol, price_data in price_data_map.items():
+        print(f"{symbol} 当前价格: ${price_data['price']:,.2f} ({price_data['price_change']:+.2f}%)")
+
+    # 2. 获取账户信息
+    try:
+        account_info = _build_account_info(cycle_context.fetch_balance())
+    except Exception as e:
+        print(f"获取账户信息失败: {e}")
+        account_info = None
+
+    # 3. 一次请求获取所有交易对的持仓
+    positions_map = get_positions(list(price_data_map)) or {}
+
+    # 4. 一次DeepSeek请求获取所有交易对的信号
+    signals = analyze_universe_with_deepseek(price_data_map, positions_map)
+
+    # 5-7. 按交易对保存记录并执行交易（Web界面状态只展示第一个交易对）
+    for index, (symbol, signal_data) in enumerate(signals.items()):
+        print(f"\n----- {symbol} -----")
+        if signal_data.get('is_fallback', False):
+            print("⚠️ 使用备用交易信号")
+        current_position = positions_map.get(symbol)
+        _record_and_execute(
+            signal_data, price_data_map[symbol], account_info,
+            current_position, _build_position_info(current_position),
+            symbol=symbol, update_status=(index == 0)
+        )
+
+
+def _build_account_info(balance):
+    """由交易所余额构建账户信息"""
+    # OKX返回的数据：
+    # free: 可用余额（已扣除保证金）
+    # total: 账户总值（包含未实现盈亏）
+    # used: 占用保证金（部分交易所提供）
+    return {
+        'balance': float(balance['USDT'].get('total', 0)),  # 使用total作为基础余额（总资产）
+        'equity': float(balance['USDT'].get('total', 0)),   # 账户净值（OKX的total已包含未实现盈亏）
+        'available_cash': float(balance['USDT'].get('free', 0)),  # 可用余额
+        'leverage': TRADE_CONFIG['leverage']
+    }
+
+
+def _build_position_info(current_position):
+    """由持仓构建Web界面展示用的持仓信息"""
+    if not current_position:
+        return None
+    return {
+        'side': current_position['side'],
+        'size': current_position['size'],
+        'entry_price': current_position['entry_price'],
+        'unrealized_pnl': current_position['unrealized_pnl']
+    }
+
+
+def _record_and_execute(signal_data, price_data, account_info, current_position, position_info,
+                        symbol=None, update_status=True):
+    """保存AI分析记录、更新Web界面状态并执行交易（同步与异步运行时共用）
+
+    Args:
+        symbol: 交易对（多币种模式），默认TRADE_CONFIG['symbol']
+        update_status: 是否更新Web界面状态
+    """
     # 5. 保存AI分析历史记录（包含完整提示词和响应）
     try:
         analysis_record = {
@@ -89,54 +191,57 @@ def trading_bot():
             # 保存完整提示词和响应
             'system_prompt': signal_data.get('system_prompt', ''),
             'user_prompt': signal_data.get('user_prompt', ''),
-            'ai_response': signal_data.get('ai_response', '')
+            'ai_response': signal_data.get('ai_response', ''),
+            'cached': signal_data.get('is_cached', False),
+            # 多模型集成：每个模型的耗时、信号和一致度
+            'ensemble': signal_data.get('ensemble')
         }
+        if symbol:
+            analysis_record['symbol'] = symbol
         save_ai_analysis_record(analysis_record)
         print("✅ AI分析记录已保存（包含完整提示词和响应）")
     except Exception as e:
         print(f"保存AI分析记录失败: {e}")
 
     # 6. 更新系统状态到Web界面
-    try:
-        update_system_status(
-            status='running',
-            account_info=account_info,
-            btc_info={
-                'price': price_data['price'],
-                'change': price_data['price_change'],
-                'timeframe': TRADE_CONFIG['timeframe'],
-                'mode': '全仓-单向'
-            },
-            position=position_info,
-            ai_signal={
-                'signal': signal_data['signal'],
-                'confidence': signal_data['confidence'],
-                'reason': signal_data['reason'],
-                'stop_loss': signal_data['stop_loss'],
-                'take_profit': signal_data['take_profit']
-            }
-        )
-        print("✅ 系统状态已更新到Web界面")
-    except Exception as e:
-        print(f"更新系统状态失败: {e}")
+    if update_status:
+        try:
+            update_system_status(
+                status='running',
+                account_info=account_info,
+                btc_info={
+                    'price': price_data['price'],
+                    'change': price_data['price_change'],
+                    'timeframe': TRADE_CONFIG['timeframe'],
+                    'mode': '全仓-单向'
+                },
+                position=position_info,
+                ai_signal={
+                    'signal': signal_data['signal'],
+                    'confidence': signal_data['confidence'],
+                    'reason': signal_data['reason'],
+                    'stop_loss': signal_data['stop_loss'],
+                    'take_profit': signal_data['take_profit']
+                }
+            )
+            print("✅ 系统状态已更新到Web界面")
+        except Exception as e:
+            print(f"更新系统状态失败: {e}")
 
     # 7. 执行智能交易
-    execute_intelligent_trade(signal_data, price_data)
+    execute_intelligent_trade(signal_data, price_data, symbol=symbol)
 
 
-def main():
-    """主函数"""
-    print("BTC/USDT OKX自动交易机器人启动成功！")
-    print("融合技术指标策略 + OKX实盘接口")
-    print("实盘交易模式，请谨慎操作！")
-
-    print(f"交易周期: {TRADE_CONFIG['timeframe']}")
-    print("已启用完整技术指标分析和持仓跟踪功能")
+def _initialize():
+    """设置交易所并初始化Web界面数据（同步与异步运行时共用）
 
+    Returns:
+        bool: 交易所初始化失败时返回False
+    """
     # 设置交易所
     if not setup_exchange():
         print("交易所初始化失败，程序退出")
-        return
+        return False
     
     # 初始化Web界面数据文件
     print("🌐 初始化Web界面数据...")
@@ -189,6 +294,23 @@ def main():
         print(f"⚠️ Web界面数据初始化失败: {e}")
         print("继续运行，将在首次交易时创建数据")
 
+    # 启动风控看门狗：两次AI分析之间（包括执行失败后的等待期间）按秒检查止损止盈和最大回撤
+    risk_watchdog.start()
+    return True
+
+
+def main():
+    """主函数"""
+    print("BTC/USDT OKX自动交易机器人启动成功！")
+    print("融合技术指标策略 + OKX实盘接口")
+    print("实盘交易模式，请谨慎操作！")
+
+    print(f"交易周期: {TRADE_CONFIG['timeframe']}")
+    print("已启用完整技术指标分析和持仓跟踪功能")
+
+    if not _initialize():
+        return
+
     print(f"执行频率: 每{TRADE_CONFIG['interval_minutes']}分钟整点执行")
 
     # 循环执行（简化逻辑，避免冲突）
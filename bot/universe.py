@@ -0,0 +1,91 @@
+"""多币种交易模块 - 批量获取多个交易对的行情数据
+
+启用 TRADE_CONFIG['universe'] 后，每个周期只用一次 fetch_tickers 获取所有交易对的ticker，
+各交易对的K线、资金费率和4h数据并发获取，指标按交易对分别计算，
+随后所有币种的数据区块在一次DeepSeek请求中发送。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .config import exchange, TRADE_CONFIG
+from .cycle_context import cycle_context
+from .market_data import _fetch_ohlcv, _build_price_data
+from .timeframe_cache import timeframe_cache
+from .ai_analyzer import _get_oi_and_funding_rate, _get_4h_data
+
+# 常驻线程池，避免每个周期重复创建线程
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='universe')
+
+
+def get_universe_symbols():
+    """获取交易的交易对列表（未启用多币种时只有TRADE_CONFIG['symbol']）"""
+    config = TRADE_CONFIG.get('universe', {})
+    if config.get('enabled') and config.get('symbols'):
+        return list(config['symbols'])
+    return [TRADE_CONFIG['symbol']]
+
+
+def _fetch_symbol_price_data(symbol):
+    """获取单个交易对的K线并计算技术指标"""
+    ohlcv = _fetch_ohlcv(exchange, symbol)
+    if not ohlcv:
+        raise ValueError(f"未能获取{symbol}的K线数据")
+    price_data = _build_price_data(ohlcv, symbol)
+    price_data['symbol'] = symbol
+    return price_data
+
+
+def gather_universe_data(symbols=None, timeout=None):
+    """批量获取所有交易对的行情数据
+
+    Args:
+        symbols: 交易对列表，默认 get_universe_symbols()
+        timeout: 单个请求的超时时间（秒），默认读取 TRADE_CONFIG['fetch_timeout_seconds']
+
+    Returns:
+        dict: 交易对 -> price_data（附带oi_data和data_4h），获取K线失败的交易对不包含在内
+    """
+    symbols = symbols or get_universe_symbols()
+    if timeout is None:
+        timeout = TRADE_CONFIG.get('fetch_timeout_seconds', 10)
+    started = time.perf_counter()
+
+    # 所有交易对的ticker一次请求获取，其余按交易对并发
+    futures = {('tickers', None): _executor.submit(exchange.fetch_tickers, symbols)}
+    for symbol in symbols:
+        futures[('price_data', symbol)] = _executor.submit(_fetch_symbol_price_data, symbol)
+        futures[('funding_rate', symbol)] = _executor.submit(cycle_context.fetch_funding_rate, symbol)
+        futures[('4h', symbol)] = _executor.submit(timeframe_cache.prefetch, exchange, symbol, '4h', 60)
+
+    results = {}
+    for key, future in futures.items():
+        # 所有请求同时发出，因此每个请求的截止时间都从同一起点计算
+        remaining = max(0.0, timeout - (time.perf_counter() - started))
+        try:
+            results[key] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            print(f"⚠️ 多币种请求 {key[0]} {key[1] or ''} 失败: 超时（>{timeout}秒）")
+        except Exception as e:
+            print(f"⚠️ 多币种请求 {key[0]} {key[1] or ''} 失败: {e}")
+
+    # 批量ticker填入周期上下文，OI读取时不再逐个请求
+    tickers = results.get(('tickers', None)) or {}
+    for symbol in symbols:
+        if symbol in tickers:
+            cycle_context.seed('ticker', tickers[symbol], symbol)
+
+    price_data_map = {}
+    for symbol in symbols:
+        price_data = results.get(('price_data', symbol))
+        if not price_data:
+            print(f"❌ {symbol} K线数据获取失败，本周期跳过该交易对")
+            continue
+        price_data['oi_data'] = _get_oi_and_funding_rate(symbol)
+        if ('4h', symbol) in results:
+            # 4h已收盘K线已预取，未收盘K线用3m K线在本地重采样（无网络请求）
+            price_data['data_4h'] = _get_4h_data(symbol, base_df=price_data.get('full_data'))
+        price_data_map[symbol] = price_data
+
+    print(f"⚡ 多币种行情获取完成: {len(price_data_map)}/{len(symbols)} 个交易对, "
+          f"总耗时 {time.perf_counter() - started:.2f}s")
+    return price_data_map
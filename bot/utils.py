@@ -1,25 +1,18 @@
 """工具函数模块"""
 import json
-import re
 from datetime import datetime
 
+from .signal_parser import loads_lenient
+
 
 def safe_json_parse(json_str):
-    """安全解析JSON，处理格式不规范的情况"""
+    """安全解析JSON，处理格式不规范的情况（只修复字符串之外的写法，不改动字符串内容）"""
     try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        try:
-            # 修复常见的JSON格式问题
-            json_str = json_str.replace("'", '"')
-            json_str = re.sub(r'(\w+):', r'"\1":', json_str)
-            json_str = re.sub(r',\s*}', '}', json_str)
-            json_str = re.sub(r',\s*]', ']', json_str)
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"JSON解析失败，原始内容: {json_str}")
-            print(f"错误详情: {e}")
-            return None
+        return loads_lenient(json_str)
+    except json.JSONDecodeError as e:
+        print(f"JSON解析失败，原始内容: {json_str}")
+        print(f"错误详情: {e}")
+        return None
 
 
 def create_fallback_signal(price_data):
@@ -9,7 +9,8 @@ load_dotenv()
 # 初始化DeepSeek客户端（共享使用，不影响模拟交易）
 deepseek_client = OpenAI(
     api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url="https://api.deepseek.com"
+    # 可指向本地替身服务器（benchmarks/mock_deepseek_server.py）做离线测试
+    base_url=os.getenv('DEEPSEEK_BASE_URL', "https://api.deepseek.com")
 )
 
 # 交易参数配置 - 复用真实交易的配置
@@ -31,6 +32,11 @@ TRADE_CONFIG = {
         'low_confidence_multiplier': 0.5,
         'max_position_ratio': 0.1,  # 单次最大仓位比例（10%）
         'trend_strength_multiplier': 1.2
+    },
+    # 模拟止盈止损（与实盘交易所OCO委托语义相同，按挂单后的K线最高/最低价触发）
+    'protective_orders': {
+        'enabled': True,
+        'min_change_ratio': 0.0005,  # 新信号的止损止盈价变化小于该比例时不修改委托
     }
 }
 
@@ -0,0 +1,125 @@
+"""模拟止盈止损模块 - 与实盘 bot.protective_orders 语义相同的本地模拟委托
+
+实盘在开仓后挂持仓级OCO委托，由交易所在价格触及止损/止盈时立即平仓。
+模拟盘没有交易所，改为每个周期开始时用挂单之后的K线最高/最低价判断是否触发：
+1. 挂单所在K线只看挂单之后创出的新高/新低（挂单前的价格不算）；
+2. 同一根K线同时触及止损和止盈时按止损处理（保守估计）；
+3. 触发价按市价成交，K线开盘即跳空越过触发价时按开盘价成交；
+4. 开仓/加仓后挂单，新信号改变止损止盈价时修改，CLOSE或持仓已平时撤销。
+"""
+from bot.protective_orders import DEFAULT_SETTINGS, protective_levels
+from .config import TRADE_CONFIG
+
+
+def _settings():
+    return {**DEFAULT_SETTINGS, **TRADE_CONFIG.get('protective_orders', {})}
+
+
+def _candle_start(kline):
+    """K线开始时间（毫秒）"""
+    return int(kline['timestamp'].timestamp() * 1000)
+
+
+class SimProtectiveOrders:
+    """模拟OCO止盈止损委托（单交易对）"""
+
+    def __init__(self):
+        self._order = None
+
+    def get(self):
+        """当前挂着的模拟委托，没有时返回None"""
+        return dict(self._order) if self._order else None
+
+    def _watermark(self, price_data):
+        """记录当前K线的开始时间和已出现的最高/最低价，之后只检查新出现的价格"""
+        kline = price_data['kline_data'][-1]
+        self._order.update(since=_candle_start(kline), high=float(kline['high']), low=float(kline['low']))
+
+    def place(self, side, stop_loss, take_profit, price_data):
+        """为模拟持仓挂止盈止损委托"""
+        self._order = {'side': side, 'stop_loss': stop_loss, 'take_profit': take_profit}
+        self._watermark(price_data)
+        print(f"[模拟] 🛡️ 已挂模拟止盈止损: {side}仓 止损 {stop_loss:.2f} / 止盈 {take_profit:.2f}")
+
+    def amend(self, stop_loss, take_profit, price_data):
+        """修改模拟委托的触发价"""
+        if self._order is None:
+            return
+        self._order.update(stop_loss=stop_loss, take_profit=take_profit)
+        self._watermark(price_data)
+        print(f"[模拟] 🛡️ 已修改模拟止盈止损: 止损 {stop_loss:.2f} / 止盈 {take_profit:.2f}")
+
+    def cancel(self):
+        """撤销模拟委托"""
+        if self._order is not None:
+            self._order = None
+            print("[模拟] 🛡️ 已撤销模拟止盈止损")
+
+    def sync(self, position, signal_data, reference_price, price_data):
+        """按交易后的模拟持仓和最新信号挂出、修改或撤销委托（与实盘 sync 相同）"""
+        settings = _settings()
+        if not settings['enabled']:
+            return
+        if not position or not position.get('size'):
+            self.cancel()
+            return
+        side = position['side']
+        if self._order and self._order['side'] != side:
+            self.cancel()
+        if self._order and signal_data.get('is_fallback', False):
+            return
+        levels = protective_levels(side, signal_data, reference_price)
+        if levels is None:
+            if self._order is None:
+                print(f"[模拟] ⚠️ 信号的止损止盈价对{side}仓无效（止损 {signal_data.get('stop_loss')}，"
+                      f"止盈 {signal_data.get('take_profit')}，参考价 {reference_price}），未挂模拟止盈止损")
+            return
+        stop_loss, take_profit = levels
+        if self._order is None:
+            self.place(side, stop_loss, take_profit, price_data)
+        elif (abs(stop_loss - self._order['stop_loss']) > self._order['stop_loss'] * settings['min_change_ratio']
+              or abs(take_profit - self._order['take_profit']) > self._order['take_profit'] * settings['min_change_ratio']):
+            self.amend(stop_loss, take_profit, price_data)
+
+    def check(self, price_data):
+        """用挂单之后的K线判断委托是否触发
+
+        Returns:
+            dict: 触发时返回 {'kind': 'stop_loss'/'take_profit', 'side', 'price'}（委托随之失效），否则None
+        """
+        if self._order is None or not price_data.get('kline_data'):
+            return None
+        order = self._order
+        for kline in price_data['kline_data']:
+            start = _candle_start(kline)
+            if start < order['since']:
+                continue
+            high, low, open_price = float(kline['high']), float(kline['low']), float(kline['open'])
+            gap = start > order['since']
+            if not gap:
+                # 挂单所在K线：只有挂单后创出的新高/新低才可能触发
+                high = high if high > order['high'] else None
+                low = low if low < order['low'] else None
+
+            if order['side'] == 'long':
+                stop_hit = low is not None and low <= order['stop_loss']
+                take_hit = high is not None and high >= order['take_profit']
+                stop_price = min(order['stop_loss'], open_price) if gap else order['stop_loss']
+                take_price = max(order['take_profit'], open_price) if gap else order['take_profit']
+            else:
+                stop_hit = high is not None and high >= order['stop_loss']
+                take_hit = low is not None and low <= order['take_profit']
+                stop_price = max(order['stop_loss'], open_price) if gap else order['stop_loss']
+                take_price = min(order['take_profit'], open_price) if gap else order['take_profit']
+
+            if stop_hit or take_hit:
+                self._order = None
+                kind = 'stop_loss' if stop_hit else 'take_profit'
+                return {'kind': kind, 'side': order['side'], 'price': stop_price if stop_hit else take_price}
+
+        self._watermark(price_data)
+        return None
+
+
+# 全局模拟止盈止损实例
+sim_protective_orders = SimProtectiveOrders()
@@ -4,6 +4,7 @@ import json
 from datetime import datetime
 from .config import TRADE_CONFIG
 from .position_manager import get_current_position
+from .protective_orders import sim_protective_orders
 from sim_data_manager import sim_data_manager
 
 
@@ -354,6 +355,9 @@ def execute_intelligent_trade(signal_data, price_data):
         # 获取交易后的持仓状态
         updated_position = get_current_position()
         print(f"[模拟] 更新后持仓: {updated_position}")
+
+        # 按交易后的模拟持仓挂出、修改或撤销模拟止盈止损（与实盘交易所委托语义相同）
+        sim_protective_orders.sync(updated_position, signal_data, current_price, price_data)
         
         # 更新模拟账户余额（根据盈亏）
         if pnl != 0:
@@ -440,6 +444,51 @@ def execute_intelligent_trade(signal_data, price_data):
         traceback.print_exc()
 
 
+def check_protective_orders(price_data):
+    """检查模拟止盈止损是否在两次分析之间触发，触发时按成交价平掉整个模拟持仓
+
+    Returns:
+        dict: 触发信息 {'kind', 'side', 'price', 'pnl'}，未触发时返回None
+    """
+    triggered = sim_protective_orders.check(price_data)
+    if triggered is None:
+        return None
+    current_position = get_current_position()
+    if not current_position or current_position['side'] != triggered['side']:
+        return None
+
+    label = '止损' if triggered['kind'] == 'stop_loss' else '止盈'
+    print(f"[模拟] 🛡️ 模拟{label}触发: 平{current_position['side']}仓 {current_position['size']:.2f} 张 "
+          f"@ {triggered['price']:.2f}")
+    try:
+        pnl = _update_sim_position('close', current_position['side'], current_position['size'], triggered['price'])
+        triggered['pnl'] = pnl
+
+        if pnl != 0:
+            sim_balance = sim_data_manager.get_sim_balance()
+            new_balance = sim_balance['balance'] + pnl
+            sim_data_manager.update_sim_balance(new_balance, new_balance)
+            print(f"[模拟] 账户余额更新: {sim_balance['balance']:.2f} → {new_balance:.2f} USDT (盈亏: {pnl:+.2f} USDT)")
+
+        sim_data_manager.save_trade_record({
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'signal': 'CLOSE',
+            'price': triggered['price'],
+            'amount': current_position['size'],
+            'pnl': pnl,
+            'position_action': 'close',
+            'position_side': current_position['side'],
+            'trade_type': triggered['kind'],
+            'notes': json.dumps({'mode': 'simulation', 'trigger': triggered['kind']}, ensure_ascii=False)
+        })
+        print(f"[模拟] ✅ {label}平仓记录已保存")
+    except Exception as e:
+        print(f"[模拟] {label}平仓失败: {e}")
+        import traceback
+        traceback.print_exc()
+    return triggered
+
+
 def _update_sim_position(action, side, amount, price):
     """更新模拟持仓到数据库（内部函数）
     
@@ -5,9 +5,11 @@ from .config import TRADE_CONFIG, deepseek_client
 # 注意：不导入exchange和setup_exchange，因为模拟交易不需要真实交易所连接
 from bot.market_data import get_btc_ohlcv_enhanced  # 共享市场数据获取
 from bot.ai_analyzer import analyze_with_deepseek_with_retry  # 共享AI分析
+from bot.decision_cache import decision_cache  # 共享AI决策缓存
+from bot.ensemble import ensemble_enabled, analyze_with_ensemble  # 共享多模型集成分析
 from bot.utils import wait_for_next_period  # 共享工具函数
 from .position_manager import get_current_position
-from .trade_executor import execute_intelligent_trade
+from .trade_executor import execute_intelligent_trade, check_protective_orders
 from sim_data_manager import sim_data_manager
 
 
@@ -39,6 +41,37 @@ def trading_bot():
     print(f"[模拟] 数据周期: {TRADE_CONFIG['timeframe']}")
     print(f"[模拟] 价格变化: {price_data['price_change']:+.2f}%")
 
+    # 2-3. 获取模拟账户信息和持仓（从数据库）
+    current_position, position_info, sim_account_info = _get_sim_account_state(price_data)
+
+    # 4. 使用DeepSeek分析（共享AI分析，带重试）
+    # 传递模拟持仓和账户数据给AI分析器，以便在提示词中正确显示
+    # 市场无重大变化时复用上次决策，跳过DeepSeek调用
+    signal_data = decision_cache.lookup(price_data, position_info)
+    if signal_data is None:
+        analyze = analyze_with_ensemble if ensemble_enabled() else analyze_with_deepseek_with_retry
+        signal_data = analyze(
+            price_data, 
+            position_data=position_info,
+            account_data=sim_account_info
+        )
+        decision_cache.record(price_data, position_info, signal_data)
+
+    if signal_data.get('is_fallback', False):
+        print("[模拟] ⚠️ 使用备用交易信号")
+
+    _record_and_execute(signal_data, price_data, current_position)
+
+
+def _get_sim_account_state(price_data):
+    """获取模拟账户与持仓状态（同步与异步运行时共用）
+
+    Returns:
+        tuple: (current_position, position_info, sim_account_info) - 持仓、持仓展示信息、传给AI的账户数据
+    """
+    # 先按本周期K线检查模拟止盈止损是否已触发（实盘由交易所在两次分析之间执行）
+    check_protective_orders(price_data)
+
     # 2. 获取模拟账户信息（从数据库）
     try:
         sim_balance = sim_data_manager.get_sim_balance()
@@ -102,26 +135,18 @@ def trading_bot():
         account_info['used_margin'] = used_margin
         print(f"[模拟] 账户净值: {equity:.2f} USDT, 可用余额: {available_cash:.2f} USDT")
 
-    # 4. 使用DeepSeek分析（共享AI分析，带重试）
-    # 传递模拟持仓和账户数据给AI分析器，以便在提示词中正确显示
     sim_account_info = {
         'balance': base_balance,
         'equity': equity,
         'available_cash': available_cash,
         'used_margin': used_margin
     } if account_info else None
-    
-    position_info_for_ai = position_info if position_info else None
-    
-    signal_data = analyze_with_deepseek_with_retry(
-        price_data, 
-        position_data=position_info_for_ai,
-        account_data=sim_account_info
-    )
 
-    if signal_data.get('is_fallback', False):
-        print("[模拟] ⚠️ 使用备用交易信号")
+    return current_position, position_info, sim_account_info
+
 
+def _record_and_execute(signal_data, price_data, current_position):
+    """保存AI分析记录、执行模拟交易并更新Web界面状态（同步与异步运行时共用）"""
     # 5. 保存AI分析历史记录（模拟系统，包含完整提示词和响应）
     try:
         analysis_record = {
@@ -139,7 +164,10 @@ def trading_bot():
             # 保存完整提示词和响应
             'system_prompt': signal_data.get('system_prompt', ''),
             'user_prompt': signal_data.get('user_prompt', ''),
-            'ai_response': signal_data.get('ai_response', '')
+            'ai_response': signal_data.get('ai_response', ''),
+            'cached': signal_data.get('is_cached', False),
+            # 多模型集成：每个模型的耗时、信号和一致度
+            'ensemble': signal_data.get('ensemble')
         }
         sim_data_manager.save_ai_analysis_record(analysis_record)
         print("[模拟] ✅ AI分析记录已保存（包含完整提示词和响应）")
@@ -226,16 +254,8 @@ def trading_bot():
         print(f"[模拟] 更新系统状态失败: {e}")
 
 
-def main():
-    """模拟交易主函数"""
-    print("=" * 60)
-    print("BTC/USDT 模拟交易机器人启动成功！")
-    print("融合技术指标策略 + 完全模拟交易系统")
-    print("=" * 60)
-    print("[模拟] 当前为模拟模式，不会真实下单")
-    print(f"[模拟] 交易周期: {TRADE_CONFIG['timeframe']}")
-    print("[模拟] 已启用完整技术指标分析和持仓跟踪功能")
-
+def _initialize():
+    """初始化模拟账户和Web界面数据（同步与异步运行时共用）"""
     # 初始化模拟账户（如果不存在）
     sim_balance = sim_data_manager.get_sim_balance()
     print(f"[模拟] 模拟账户余额: {sim_balance['balance']:.2f} USDT")
@@ -286,6 +306,19 @@ def main():
         print(f"[模拟] ⚠️ Web界面数据初始化失败: {e}")
         print("[模拟] 继续运行，将在首次交易时创建数据")
 
+
+def main():
+    """模拟交易主函数"""
+    print("=" * 60)
+    print("BTC/USDT 模拟交易机器人启动成功！")
+    print("融合技术指标策略 + 完全模拟交易系统")
+    print("=" * 60)
+    print("[模拟] 当前为模拟模式，不会真实下单")
+    print(f"[模拟] 交易周期: {TRADE_CONFIG['timeframe']}")
+    print("[模拟] 已启用完整技术指标分析和持仓跟踪功能")
+
+    _initialize()
+
     print(f"[模拟] 执行频率: 每{TRADE_CONFIG['interval_minutes']}分钟整点执行")
     print("[模拟] 开始模拟交易循环...")
 
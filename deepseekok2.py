@@ -1,5 +1,6 @@
 """
-主入口文件 - 根据TEST_MODE环境变量切换真实交易或模拟交易
+主入口文件 - 根据TEST_MODE环境变量切换真实交易或模拟交易，
+根据ASYNC_MODE环境变量切换同步或asyncio运行时
 """
 import os
 from dotenv import load_dotenv
@@ -8,6 +9,8 @@ load_dotenv()
 
 # 检查TEST_MODE环境变量
 test_mode = os.getenv('TEST_MODE', 'false').lower() == 'true'
+# 检查ASYNC_MODE环境变量
+async_mode = os.getenv('ASYNC_MODE', 'false').lower() == 'true'
 
 if test_mode:
     # 模拟交易模式
@@ -22,5 +25,13 @@ else:
     print("=" * 60)
     from bot.trading_bot import main
 
+if async_mode:
+    # asyncio运行时（数据获取、AI分析、交易执行均以协程调度）
+    print("⚡ 使用asyncio运行时")
+    from bot.async_runtime import main as async_main
+
+    def main():
+        async_main(simulation=test_mode)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,6 +2,7 @@
 import sqlite3
 import json
 import os
+import threading
 from datetime import datetime
 from typing import Optional, Dict, List
 
@@ -11,23 +12,28 @@ class SimDataManager:
     def __init__(self, db_path: str = "data/trading_data.db"):
         self.db_path = db_path
         self.data_dir = os.path.dirname(db_path) if os.path.dirname(db_path) else "data"
-        
-        # 确保数据目录存在
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
-        
-        # 初始化数据库
-        self._init_database()
+        # 数据目录和表结构在首次访问数据库时创建（导入模块时不产生文件）
+        self._initialized = False
+        self._init_lock = threading.Lock()
     
-    def _get_connection(self):
-        """获取数据库连接"""
+    def _connect(self):
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row  # 使返回结果为字典形式
         return conn
     
+    def _get_connection(self):
+        """获取数据库连接（首次调用时创建数据目录并初始化数据库）"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(self.data_dir, exist_ok=True)
+                    self._init_database()
+                    self._initialized = True
+        return self._connect()
+    
     def _init_database(self):
         """初始化模拟交易数据库表结构（使用sim_前缀）"""
-        conn = self._get_connection()
+        conn = self._connect()
         cursor = conn.cursor()
         
         # 1. 模拟系统状态表（单行记录）